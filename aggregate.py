@@ -0,0 +1,271 @@
+from typing import Dict, List, Optional, Tuple
+
+from database import Row, Table
+from storage import ColumnarStorage, DictionaryColumn
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Table.aggregate: counts, sums, averages, minimums and maximums, optionally
+# per group of one or more columns. Aggregates skip empty cells; a group with
+# no values gets None (0 for count). Groups come back ordered by their
+# values, with empty cells last.
+#
+# With NumPy installed columns are materialized into arrays once per table
+# version (integer and real values, a presence mask for empty cells, and
+# integer codes for grouping columns) and every aggregate runs vectorized.
+# Without it the same results come from plain loops over the columns.
+
+FUNCTIONS = ("count", "sum", "avg", "min", "max")
+NUMERIC_TYPES = ("integer", "real")
+
+
+def _check(table: Table, group_by: List[str], aggs: Dict[str, Tuple[str, str]]):
+    for column in group_by:
+        if column not in table.schema:
+            raise ValueError(f"Column {column} does not exist")
+    for name, (function, column) in aggs.items():
+        if function not in FUNCTIONS:
+            raise ValueError(f"Unknown aggregate {function}")
+        if column == "*":
+            if function != "count":
+                raise ValueError(f"{function}(*) is not supported")
+        elif column not in table.schema:
+            raise ValueError(f"Column {column} does not exist")
+        elif function != "count" and table.schema[column].type not in NUMERIC_TYPES:
+            raise ValueError(f"{function} needs an integer or real column, {column} is {table.schema[column].type}")
+        if name in group_by:
+            raise ValueError(f"Aggregate {name} shadows a group column")
+
+
+def _group_order(key: tuple) -> tuple:
+    return tuple((value is None, 0 if value is None else value) for value in key)
+
+
+def aggregate(table: Table, group_by: Optional[List[str]], aggs: Dict[str, Tuple[str, str]]) -> List[Row]:
+    group_by = list(group_by or [])
+    _check(table, group_by, aggs)
+    with table._lock:
+        if numpy is not None:
+            groups = _aggregate_arrays(table, group_by, aggs)
+        else:
+            groups = _aggregate_loops(table, group_by, aggs)
+    if not group_by and not groups:
+        # Like SQL, aggregating nothing still gives one row
+        groups = {(): {name: 0 if function == "count" else None for name, (function, _) in aggs.items()}}
+    return [Row({**dict(zip(group_by, key)), **groups[key]}) for key in sorted(groups, key=_group_order)]
+
+
+def _aggregate_loops(table: Table, group_by: List[str], aggs: Dict[str, Tuple[str, str]]) -> Dict[tuple, dict]:
+    if group_by:
+        keys = list(zip(*(_live_list(table, column) for column in group_by)))
+    else:
+        keys = [()] * table.row_count
+    groups = {key: {} for key in keys}
+    for name, (function, column) in aggs.items():
+        if column == "*":
+            counts = dict.fromkeys(groups, 0)
+            for key in keys:
+                counts[key] += 1
+            for key, count in counts.items():
+                groups[key][name] = count
+            continue
+        values = _live_list(table, column)
+        if function == "count":
+            counts = dict.fromkeys(groups, 0)
+            for key, value in zip(keys, values):
+                if value is not None:
+                    counts[key] += 1
+            for key, count in counts.items():
+                groups[key][name] = count
+        elif function in ("sum", "avg"):
+            totals, counts = {}, {}
+            for key, value in zip(keys, values):
+                if value is not None:
+                    if key in totals:
+                        totals[key] += value
+                        counts[key] += 1
+                    else:
+                        totals[key] = value
+                        counts[key] = 1
+            for key, group in groups.items():
+                total = totals.get(key)
+                if function == "avg" and total is not None:
+                    total = total / counts[key]
+                group[name] = total
+        else:
+            better = min if function == "min" else max
+            results = {}
+            for key, value in zip(keys, values):
+                if value is not None:
+                    current = results.get(key)
+                    results[key] = value if current is None else better(current, value)
+            for key, group in groups.items():
+                group[name] = results.get(key)
+    return groups
+
+
+def _live_list(table: Table, column: str) -> list:
+    return [value for _, value in table._live_values(column)]
+
+
+def _cached(table: Table, key: tuple, build):
+    # Arrays derived from the table, dropped as soon as its data changes
+    if table._arrays_version != table._version:
+        table._arrays.clear()
+        table._arrays_version = table._version
+    result = table._arrays.get(key)
+    if result is None:
+        result = table._arrays[key] = build()
+    return result
+
+
+def _live_mask(table: Table):
+    # Boolean mask of live slots, or None when no slot is deleted
+    if not table._tombstones:
+        return None
+    mask = numpy.ones(len(table._storage), dtype=bool)
+    mask[numpy.array(table._tombstones, dtype=numpy.int64)] = False
+    return mask
+
+
+def _numbers(table: Table, column: str):
+    # (values, present) over the live rows; present is None without empty cells
+    def build():
+        dtype = numpy.int64 if table.schema[column].type == "integer" else numpy.float64
+        storage = table._storage
+        if isinstance(storage, ColumnarStorage):
+            source = storage._columns[column]
+            # Copy: an array exporting its buffer can't grow any more
+            values = numpy.frombuffer(source._data, dtype=dtype).copy()
+            present = None
+            if source._nulls is not None:
+                present = numpy.frombuffer(source._nulls, dtype=numpy.uint8) == 0
+            live = _cached(table, ("live",), lambda: _live_mask(table))
+            if live is not None:
+                values = values[live]
+                present = None if present is None else present[live]
+        else:
+            cells = _live_list(table, column)
+            present = numpy.fromiter((cell is not None for cell in cells), dtype=bool, count=len(cells))
+            values = numpy.fromiter((0 if cell is None else cell for cell in cells), dtype=dtype, count=len(cells))
+        if present is not None and present.all():
+            present = None
+        return values, present
+    return _cached(table, ("numbers", column), build)
+
+
+def _codes(table: Table, column: str):
+    # (codes, labels) over the live rows: labels[codes[i]] is row i's value.
+    # The last label is always None, for empty cells.
+    def build():
+        storage = table._storage
+        source = storage._columns[column] if isinstance(storage, ColumnarStorage) else None
+        if isinstance(source, DictionaryColumn):
+            codes = numpy.frombuffer(source._data, dtype=source.typecode).astype(numpy.int64)
+            labels = list(source._values) + [None]
+            if source._nulls is not None:
+                codes[numpy.frombuffer(source._nulls, dtype=numpy.uint8) != 0] = len(labels) - 1
+            live = _cached(table, ("live",), lambda: _live_mask(table))
+            return (codes if live is None else codes[live]), labels
+        if table.schema[column].type in NUMERIC_TYPES:
+            values, present = _numbers(table, column)
+            labels, codes = numpy.unique(values if present is None else values[present], return_inverse=True)
+            labels = labels.tolist()
+            if present is not None:
+                full = numpy.full(len(values), len(labels), dtype=numpy.int64)
+                full[present] = codes
+                codes = full
+            return codes.astype(numpy.int64), labels + [None]
+        positions = {}
+        cells = _live_list(table, column)
+        codes = numpy.fromiter((-1 if cell is None else positions.setdefault(cell, len(positions)) for cell in cells),
+                               dtype=numpy.int64, count=len(cells))
+        codes[codes < 0] = len(positions)
+        return codes, list(positions) + [None]
+    return _cached(table, ("codes", column), build)
+
+
+def _groups(table: Table, group_by: List[str]):
+    # (key, label_rows): one integer per live row naming its group, combining
+    # the columns' codes, and the values of every group number
+    def build():
+        key = numpy.zeros(table.row_count, dtype=numpy.int64)
+        label_rows = [()]
+        for column in group_by:
+            codes, labels = _codes(table, column)
+            width = len(labels)
+            key = key * width + codes
+            if len(label_rows) * width > len(key):
+                # Too many combinations to count directly; number the ones that occur
+                used, key = numpy.unique(key, return_inverse=True)
+                label_rows = [label_rows[group // width] + (labels[group % width],) for group in used.tolist()]
+            else:
+                label_rows = [row + (label,) for row in label_rows for label in labels]
+        return key, label_rows
+    return _cached(table, ("groups", *group_by), build)
+
+
+def _sum(group_of, values, size: int):
+    # Per-group sums. bincount adds in float64, which is exact for integers
+    # as long as no partial sum can reach 2 ** 53
+    if values.dtype.kind == "f":
+        return numpy.bincount(group_of, weights=values, minlength=size)
+    if not len(values) or int(numpy.abs(values).max()) * len(values) < 2 ** 53:
+        return numpy.rint(numpy.bincount(group_of, weights=values, minlength=size)).astype(numpy.int64)
+    sums = numpy.zeros(size, dtype=numpy.int64)
+    numpy.add.at(sums, group_of, values)
+    return sums
+
+
+def _aggregate_arrays(table: Table, group_by: List[str], aggs: Dict[str, Tuple[str, str]]) -> Dict[tuple, dict]:
+    if table.row_count == 0:
+        return {}
+    key, label_rows = _groups(table, group_by)
+    size = len(label_rows)
+    sizes = numpy.bincount(key, minlength=size)
+    occupied = numpy.flatnonzero(sizes)
+
+    results = {}
+    for name, (function, column) in aggs.items():
+        if column == "*":
+            results[name] = sizes[occupied].tolist()
+            continue
+        if function == "count" and table.schema[column].type not in NUMERIC_TYPES:
+            codes, labels = _codes(table, column)
+            values, present = None, codes != len(labels) - 1
+        else:
+            values, present = _numbers(table, column)
+        group_of = key if present is None else key[present]
+        counts = numpy.bincount(group_of, minlength=size)
+        if function == "count":
+            results[name] = counts[occupied].tolist()
+            continue
+        selected = values if present is None else values[present]
+        if function in ("sum", "avg"):
+            reduced = _sum(group_of, selected, size)
+            if function == "avg":
+                reduced = reduced / numpy.maximum(counts, 1)
+            reduced = reduced[occupied].tolist()
+        else:
+            # Rows ordered by group (computed once per grouping) make every
+            # group one run of values for reduceat
+            order = _cached(table, ("order", *group_by), lambda: numpy.argsort(key, kind="stable"))
+            if present is not None:
+                order = order[present[order]]
+            sorted_groups = key[order]
+            starts = numpy.flatnonzero(numpy.r_[True, sorted_groups[1:] != sorted_groups[:-1]]) \
+                if len(order) else numpy.zeros(0, dtype=numpy.int64)
+            reduce = numpy.minimum if function == "min" else numpy.maximum
+            found = dict(zip(sorted_groups[starts].tolist(), reduce.reduceat(values[order], starts).tolist()))
+            reduced = [found.get(group) for group in occupied.tolist()]
+        # Groups without values get None
+        empty = counts[occupied] == 0
+        if empty.any():
+            reduced = [None if missing else value for value, missing in zip(reduced, empty.tolist())]
+        results[name] = reduced
+
+    return {label_rows[group]: {name: values[position] for name, values in results.items()}
+            for position, group in enumerate(occupied.tolist())}
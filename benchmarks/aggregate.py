@@ -0,0 +1,70 @@
+# Table.aggregate against the equivalent loop over row dicts.
+# Run from the repository root: python -m benchmarks.aggregate --rows 1000000
+# "first" materializes the column arrays, "warm" reuses them. Without NumPy
+# installed aggregate falls back to plain loops and there is nothing to cache.
+import argparse
+
+import aggregate
+from database import Database
+from benchmarks.common import print_table, sample_rows, sample_schema, timer
+
+AGGS = {
+    "rows": ("count", "*"),
+    "total_age": ("sum", "age"),
+    "avg_score": ("avg", "score"),
+    "min_score": ("min", "score"),
+    "max_age": ("max", "age"),
+}
+
+
+def by_hand(table, group_by):
+    groups = {}
+    for row in table.rows:
+        data = row.data
+        key = tuple(data[column] for column in group_by)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {"rows": 0, "total_age": 0, "score": 0.0, "min_score": None, "max_age": None}
+        group["rows"] += 1
+        group["total_age"] += data["age"]
+        group["score"] += data["score"]
+        if group["min_score"] is None or data["score"] < group["min_score"]:
+            group["min_score"] = data["score"]
+        if group["max_age"] is None or data["age"] > group["max_age"]:
+            group["max_age"] = data["age"]
+    return groups
+
+
+def run(count: int, storage: str):
+    db = Database()
+    db.create_table("people", sample_schema(), storage)
+    table = db.tables["people"]
+    table.add_rows(sample_rows(count))
+
+    report = []
+    for group_by in ([], ["status"], ["status", "grade"], ["age"]):
+        results = {}
+        with timer(results, "by hand"):
+            expected = by_hand(table, group_by)
+        with timer(results, "first"):
+            table.aggregate(group_by, AGGS)
+        with timer(results, "warm"):
+            rows = table.aggregate(group_by, AGGS)
+        assert len(rows) == len(expected)
+        for row in rows:
+            group = expected[tuple(row.data[column] for column in group_by)]
+            assert row.data["rows"] == group["rows"] and row.data["total_age"] == group["total_age"]
+        report.append([", ".join(group_by) or "(none)", len(rows), f"{results['by hand'] * 1000:.0f}",
+                       f"{results['first'] * 1000:.0f}", f"{results['warm'] * 1000:.0f}",
+                       f"{results['by hand'] / results['warm']:.1f}x"])
+    engine = "numpy" if aggregate.numpy is not None else "python loops"
+    print(f"{count:,} rows, {storage} storage, {engine}")
+    print_table(["group by", "groups", "by hand ms", "first ms", "warm ms", "speedup"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--storage", default="columnar", choices=["rows", "columnar"])
+    args = parser.parse_args()
+    run(args.rows, args.storage)
@@ -0,0 +1,49 @@
+# File size, save time and open time of the JSON and binary formats.
+# Run from the repository root: python -m benchmarks.binary --rows 200000
+import argparse
+import os
+import tempfile
+
+from database import Database
+from benchmarks.common import print_table, sample_rows, sample_schema, timer
+
+
+def run(count: int, storage: str):
+    db = Database()
+    db.create_table("people", sample_schema(), storage)
+    for row in sample_rows(count):
+        db.tables["people"].add_row(row)
+
+    report = []
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in (".json", ".dmbs"):
+            filepath = os.path.join(directory, "db" + extension)
+            results = {}
+            with timer(results, "save"):
+                db.save_to_disk(filepath)
+            loaded = Database()
+            with timer(results, "open"):
+                loaded.load_from_disk(filepath)
+            with timer(results, "first_access"):
+                loaded.tables["people"].row_count
+            with timer(results, "find"):
+                loaded.tables["people"].find_rows("inactive")
+            report.append([
+                extension,
+                f"{os.path.getsize(filepath) / 2 ** 20:.1f}",
+                f"{results['save']:.2f}",
+                f"{results['open'] * 1000:.1f}",
+                f"{results['first_access'] * 1000:.1f}",
+                f"{results['find'] * 1000:.1f}",
+            ])
+            del loaded
+    print(f"{count:,} rows, {storage} storage")
+    print_table(["format", "MiB", "save s", "open ms", "first access ms", "find ms"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--storage", default="columnar", choices=["rows", "columnar"])
+    args = parser.parse_args()
+    run(args.rows, args.storage)
@@ -0,0 +1,44 @@
+# Rows per second of Table.add_rows against a loop of add_row calls.
+# Run from the repository root: python -m benchmarks.bulk --rows 200000
+import argparse
+
+from database import Database
+from benchmarks.common import print_table, sample_rows, sample_schema, timer
+
+
+def run(count: int, batch_size: int):
+    rows = sample_rows(count)
+    names = [field.name for field in sample_schema()]
+    inputs = {
+        "dicts": lambda: [dict(row) for row in rows],
+        "tuples": lambda: [tuple(row[name] for name in names) for row in rows],
+        "columns": lambda: {name: [row[name] for row in rows] for name in names},
+    }
+    report = []
+    for storage in ("rows", "columnar"):
+        results = {}
+        db = Database()
+        db.create_table("people", sample_schema(), storage)
+        copies = [dict(row) for row in rows]
+        with timer(results, "add_row"):
+            for row in copies:
+                db.tables["people"].add_row(row)
+        report.append([storage, "add_row loop", f"{count / results['add_row']:,.0f}", "1.0x"])
+        for name, make in inputs.items():
+            db = Database()
+            db.create_table("people", sample_schema(), storage)
+            data = make()
+            with timer(results, name):
+                db.tables["people"].add_rows(data, batch_size=batch_size)
+            report.append([storage, f"add_rows({name})", f"{count / results[name]:,.0f}",
+                           f"{results['add_row'] / results[name]:.1f}x"])
+    print(f"{count:,} rows, batch_size={batch_size:,}")
+    print_table(["storage", "method", "rows/s", "speedup"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+    run(args.rows, args.batch_size)
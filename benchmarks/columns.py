@@ -0,0 +1,42 @@
+# Adding and dropping a column on a large table. On row storage both only
+# record the change; the rows are rewritten by the next compaction or save,
+# timed here as "settle". Reads in between fill in the added columns.
+# Run from the repository root: python -m benchmarks.columns --rows 1000000
+import argparse
+
+from database import Database, Field
+from benchmarks.common import print_table, sample_rows, sample_schema, timer
+
+
+def run(count: int):
+    rows = sample_rows(count)
+    report = []
+    for storage in ("rows", "columnar"):
+        db = Database()
+        db.create_table("people", sample_schema(), storage)
+        table = db.tables["people"]
+        table.add_rows(rows)
+        results = {}
+        with timer(results, "add"):
+            table.add_column(Field("level", "integer", default=1))
+        with timer(results, "drop"):
+            table.delete_column("email")
+        with timer(results, "read"):
+            for row in table.rows:
+                pass
+        with timer(results, "settle"):
+            table._storage.settle()
+        with timer(results, "read settled"):
+            for row in table.rows:
+                pass
+        report.append([storage] + [f"{results[key] * 1000:.1f}"
+                                   for key in ("add", "drop", "read", "settle", "read settled")])
+    print(f"{count:,} rows")
+    print_table(["storage", "add ms", "drop ms", "read ms", "settle ms", "read settled ms"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    run(args.rows)
@@ -0,0 +1,92 @@
+import random
+import string
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List
+
+from database import Field
+
+STATUSES = ["active", "inactive", "pending", "banned"]
+
+
+def sample_schema() -> List[Field]:
+    return [
+        Field("name", "string"),
+        Field("age", "integer"),
+        Field("score", "real"),
+        Field("grade", "char"),
+        Field("email", "email"),
+        Field("status", "enum", enum_values=STATUSES),
+    ]
+
+
+def sample_rows(count: int, seed: int = 42) -> List[Dict]:
+    rng = random.Random(seed)
+    letters = string.ascii_lowercase
+    rows = []
+    for _ in range(count):
+        name = "".join(rng.choice(letters) for _ in range(rng.randint(5, 12)))
+        rows.append({
+            "name": name.capitalize(),
+            "age": rng.randint(18, 90),
+            "score": round(rng.uniform(0, 100), 2),
+            "grade": rng.choice("ABCDF"),
+            "email": f"{name}@example.com",
+            "status": rng.choice(STATUSES),
+        })
+    return rows
+
+
+def sample_columns(count: int, seed: int = 42) -> Dict[str, list]:
+    # The same kind of data as sample_rows as one list per column, which
+    # takes far less memory at millions of rows
+    rng = random.Random(seed)
+    letters = string.ascii_lowercase
+    names = ["".join(rng.choices(letters, k=rng.randint(5, 12))) for _ in range(count)]
+    return {
+        "name": [name.capitalize() for name in names],
+        "age": [rng.randint(18, 90) for _ in range(count)],
+        "score": [round(rng.uniform(0, 100), 2) for _ in range(count)],
+        "grade": rng.choices("ABCDF", k=count),
+        "email": [f"{name}@example.com" for name in names],
+        "status": rng.choices(STATUSES, k=count),
+    }
+
+
+@contextmanager
+def timer(results: Dict, key: str):
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
+
+
+@contextmanager
+def traced_memory(results: Dict, key: str):
+    # Records bytes still allocated when the block ends (i.e. what the block kept alive)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    try:
+        yield
+    finally:
+        results[key] = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+
+@contextmanager
+def peak_memory(results: Dict, key: str):
+    # Records the most bytes allocated at once while the block ran
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    try:
+        yield
+    finally:
+        results[key] = tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+
+
+def print_table(headers: List[str], rows: List[List]):
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    for line in [headers] + rows:
+        print("  ".join(str(cell).rjust(width) for cell, width in zip(line, widths)))
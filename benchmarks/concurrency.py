@@ -0,0 +1,90 @@
+# Throughput under mixed load: writer threads edit, add and delete rows while
+# reader threads read the whole table, either holding the table lock for the
+# whole read or through a snapshot. Readers also check that no row shows a
+# half-applied edit (age and score always change together).
+# Run from the repository root: python -m benchmarks.concurrency --rows 100000
+import argparse
+import random
+import threading
+import time
+
+from database import Database
+from benchmarks.common import print_table, sample_rows, sample_schema
+
+
+def consistent(data: dict) -> bool:
+    return data["score"] == float(data["age"])
+
+
+def run_mode(mode: str, count: int, storage: str, writers: int, readers: int, seconds: float):
+    db = Database()
+    db.create_table("people", sample_schema(), storage)
+    table = db.tables["people"]
+    rows = sample_rows(count)
+    for row in rows:
+        row["score"] = float(row["age"])
+    table.add_rows(rows)
+
+    stop = time.perf_counter() + seconds
+    writes = [0] * writers
+    reads = [0] * readers
+    torn = []
+
+    def write(number: int):
+        rng = random.Random(number)
+        template = dict(rows[0])
+        while time.perf_counter() < stop:
+            action = rng.random()
+            try:
+                if action < 0.6:
+                    age = rng.randint(18, 90)
+                    table.edit_by_id(rng.randrange(1, table._auto_increment_value),
+                                     {**template, "age": age, "score": float(age)})
+                elif action < 0.9:
+                    table.add_row(dict(template))
+                else:
+                    table.delete_by_id(rng.randrange(1, table._auto_increment_value))
+            except ValueError:
+                # Picked a deleted row
+                pass
+            writes[number] += 1
+
+    def read(number: int):
+        while time.perf_counter() < stop:
+            if mode == "snapshot":
+                with table.snapshot() as snapshot:
+                    seen = [row.data for row in snapshot]
+            else:
+                with table._lock:
+                    seen = [row.data for row in table.rows]
+            if not all(map(consistent, seen)):
+                torn.append(number)
+            reads[number] += len(seen)
+
+    threads = [threading.Thread(target=write, args=(number,)) for number in range(writers)]
+    threads += [threading.Thread(target=read, args=(number,)) for number in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(writes) / seconds, sum(reads) / seconds, len(torn)
+
+
+def run(count: int, storage: str, writers: int, readers: int, seconds: float):
+    report = []
+    for mode in ("locked", "snapshot"):
+        writes, reads, torn = run_mode(mode, count, storage, writers, readers, seconds)
+        report.append([mode, f"{writes:,.0f}", f"{reads:,.0f}", torn])
+    print(f"{count:,} rows, {storage} storage, {writers} writers, {readers} readers, {seconds:g}s")
+    print_table(["reads", "writes/s", "rows read/s", "torn reads"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--storage", default="columnar", choices=["rows", "columnar"])
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    run(args.rows, args.storage, args.writers, args.readers, args.seconds)
@@ -0,0 +1,93 @@
+# Memory of a table loaded from JSON with and without dictionary encoding
+# (columnar) and string interning (rows), plus equality search on the
+# low-cardinality columns. "off" sets storage.DICTIONARY_LIMIT to 0, which
+# leaves enum and char columns dictionary-encoded in columnar tables but
+# stores string columns as plain strings.
+# Run from the repository root: python -m benchmarks.dictionary --rows 2000000
+import argparse
+import os
+import random
+import tempfile
+
+import storage
+from database import Database, Field
+from benchmarks.common import STATUSES, print_table, sample_columns, sample_schema, timer, traced_memory
+
+LAYOUTS = ("rows", "columnar")
+COUNTRIES = [
+    "Argentina", "Australia", "Austria", "Belgium", "Brazil", "Canada", "Chile", "China", "Colombia", "Czechia",
+    "Denmark", "Egypt", "Finland", "France", "Germany", "Greece", "Hungary", "India", "Indonesia", "Ireland",
+    "Israel", "Italy", "Japan", "Kenya", "Mexico", "Netherlands", "New Zealand", "Nigeria", "Norway", "Peru",
+    "Poland", "Portugal", "Romania", "South Africa", "South Korea", "Spain", "Sweden", "Switzerland", "Turkey",
+    "Ukraine", "United Kingdom", "United States", "Vietnam",
+]
+
+
+def schema():
+    return sample_schema() + [Field("country", "string")]
+
+
+def write_file(count: int, layout: str, directory: str) -> str:
+    columns = sample_columns(count)
+    rng = random.Random(7)
+    columns["country"] = rng.choices(COUNTRIES, k=count)
+    db = Database()
+    db.create_table("people", schema(), layout)
+    db.tables["people"].add_rows(columns)
+    filepath = os.path.join(directory, f"{layout}.json")
+    db.save_to_disk(filepath)
+    return filepath
+
+
+def load(filepath: str) -> Database:
+    db = Database()
+    db.load_from_disk(filepath)
+    return db
+
+
+def run(count: int):
+    default = storage.DICTIONARY_LIMIT
+    report = []
+    with tempfile.TemporaryDirectory() as directory:
+        for layout in LAYOUTS:
+            filepath = write_file(count, layout, directory)
+            for mode, limit in (("off", 0), ("on", default)):
+                storage.DICTIONARY_LIMIT = limit
+                results = {}
+                # Timed and traced separately: tracemalloc slows every allocation down
+                with timer(results, "load"):
+                    db = load(filepath)
+                del db
+                with traced_memory(results, "memory"):
+                    db = load(filepath)
+                table = db.tables["people"]
+                with timer(results, "status"):
+                    table.where("status", "=", STATUSES[0])
+                with timer(results, "country"):
+                    table.where("country", "=", "Norway")
+                with timer(results, "not_country"):
+                    table.where("country", "!=", "Norway")
+                with timer(results, "find"):
+                    table.find_rows("Norway")
+                report.append([
+                    layout, mode,
+                    f"{results['memory'] / 2 ** 20:,.1f}",
+                    f"{results['load']:.2f}",
+                    f"{results['status'] * 1000:,.0f}",
+                    f"{results['country'] * 1000:,.0f}",
+                    f"{results['not_country'] * 1000:,.0f}",
+                    f"{results['find'] * 1000:,.0f}",
+                ])
+                del table, db
+    storage.DICTIONARY_LIMIT = default
+
+    print(f"{count:,} rows, {len(COUNTRIES)} countries, {len(STATUSES)} statuses")
+    print_table(["layout", "dictionary", "MiB", "load s", "status = ms", "country = ms", "country != ms",
+                 "find ms"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    args = parser.parse_args()
+    run(args.rows)
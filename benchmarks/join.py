@@ -0,0 +1,82 @@
+# Database.join strategies on an orders -> customers foreign key, against
+# nested loops (timed on a sample of the left side and scaled up).
+# Run from the repository root: python -m benchmarks.join --left 1000000 --right 100000
+import argparse
+import random
+import time
+
+from database import Database, Field
+from benchmarks.common import STATUSES, print_table, timer
+
+NESTED_SAMPLE = 50
+
+
+def build(left_count: int, right_count: int, storage: str) -> Database:
+    rng = random.Random(42)
+    db = Database()
+    db.create_table("customers", [Field("number", "integer"), Field("status", "enum", enum_values=STATUSES)],
+                    storage)
+    db.create_table("orders", [Field("customer", "integer"), Field("amount", "real")], storage)
+    db.tables["customers"].add_rows({
+        "number": list(range(1, right_count + 1)),
+        "status": [rng.choice(STATUSES) for _ in range(right_count)],
+    })
+    db.tables["orders"].add_rows({
+        # A few orders point at customers that don't exist
+        "customer": [rng.randint(1, right_count + right_count // 100) for _ in range(left_count)],
+        "amount": [round(rng.uniform(1, 500), 2) for _ in range(left_count)],
+    })
+    return db
+
+
+def consume(rows) -> int:
+    count = 0
+    for _ in rows:
+        count += 1
+    return count
+
+
+def run(left_count: int, right_count: int, storage: str):
+    db = build(left_count, right_count, storage)
+    orders, customers = db.tables["orders"], db.tables["customers"]
+
+    # Nested loops: every order against every customer
+    sample = [row.data["customer"] for row in orders.rows[:NESTED_SAMPLE]]
+    numbers = [row.data["id"] for row in customers.rows]
+    start = time.perf_counter()
+    for value in sample:
+        [number for number in numbers if number == value]
+    nested = (time.perf_counter() - start) / NESTED_SAMPLE * left_count
+
+    report = [["nested loops (estimated)", "", f"{nested:.1f}", ""]]
+    cases = [
+        ("hash on customers.id", ("customer", "id"), None, None),
+        ("hash, built", ("customer", "number"), "hash", None),
+        ("merge, sorting both sides", ("customer", "number"), "merge", None),
+        ("merge on sorted indexes", ("customer", "number"), None, "sorted"),
+    ]
+    results = {}
+    for name, on, algorithm, index in cases:
+        if index is not None:
+            with timer(results, "index"):
+                orders.create_index(on[0], index)
+                customers.create_index(on[1], index)
+        with timer(results, name):
+            count = consume(db.join("orders", "customers", on, "inner", algorithm))
+        report.append([name, f"{count:,}", f"{results[name]:.2f}", f"{nested / results[name]:,.0f}x"])
+    with timer(results, "left"):
+        count = consume(db.join("orders", "customers", ("customer", "id"), "left"))
+    report.append(["left join, hash on customers.id", f"{count:,}", f"{results['left']:.2f}",
+                   f"{nested / results['left']:,.0f}x"])
+    print(f"{left_count:,} orders x {right_count:,} customers, {storage} storage "
+          f"(sorted indexes took {results['index']:.2f}s to build)")
+    print_table(["strategy", "rows", "seconds", "vs nested"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--left", type=int, default=1_000_000)
+    parser.add_argument("--right", type=int, default=100_000)
+    parser.add_argument("--storage", default="columnar", choices=["rows", "columnar"])
+    args = parser.parse_args()
+    run(args.left, args.right, args.storage)
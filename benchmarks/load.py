@@ -0,0 +1,80 @@
+# Peak memory and speed of load_from_disk against parsing the whole file with json.load.
+# Run from the repository root: python -m benchmarks.load --rows 200000
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from database import Database, Table
+from benchmarks.common import print_table, sample_rows, sample_schema
+
+
+def load_whole(filepath: str):
+    # The previous loader: json.load the document, then copy rows into tables
+    with open(filepath, "r") as f:
+        data = json.load(f)
+    db = Database()
+    for table_name, table_data in data.items():
+        table = Table(table_name, sample_schema(), table_data.get("storage", "rows"))
+        for row_data in table_data["rows"]:
+            table._append(row_data)
+        db.tables[table_name] = table
+    return db
+
+
+def load_streaming(filepath: str):
+    db = Database()
+    db.load_from_disk(filepath)
+    return db
+
+
+def measure(loader, filepath: str):
+    # Timed and traced separately: tracemalloc slows every allocation down
+    started = time.perf_counter()
+    db = loader(filepath)
+    elapsed = time.perf_counter() - started
+    del db
+    tracemalloc.start()
+    db = loader(filepath)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del db
+    return elapsed, current, peak
+
+
+def run(count: int, storage: str):
+    db = Database()
+    db.create_table("people", sample_schema(), storage)
+    for row in sample_rows(count):
+        db.tables["people"].add_row(row)
+    fd, filepath = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        db.save_to_disk(filepath)
+        del db
+        size = os.path.getsize(filepath)
+        report = []
+        for name, loader in (("json.load", load_whole), ("streaming", load_streaming)):
+            elapsed, current, peak = measure(loader, filepath)
+            report.append([
+                name,
+                f"{elapsed:.2f}",
+                f"{count / elapsed:,.0f}",
+                f"{current / 2 ** 20:.1f}",
+                f"{peak / 2 ** 20:.1f}",
+                f"{peak / current:.2f}",
+            ])
+        print(f"{count:,} rows, {storage} storage, file {size / 2 ** 20:.1f} MiB")
+        print_table(["loader", "seconds", "rows/s", "final MiB", "peak MiB", "peak/final"], report)
+    finally:
+        os.remove(filepath)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--storage", default="columnar", choices=["rows", "columnar"])
+    args = parser.parse_args()
+    run(args.rows, args.storage)
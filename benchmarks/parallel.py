@@ -0,0 +1,49 @@
+# Scaling of ScanExecutor with worker count against the in-process scan.
+# Run from the repository root: python -m benchmarks.parallel --rows 1000000
+# "first" includes exporting the table to shared memory, "warm" reuses the export.
+import argparse
+import os
+
+from database import Database
+from parallel import ScanExecutor
+from benchmarks.common import print_table, sample_rows, sample_schema, timer
+
+QUERIES = [
+    ("find_rows", lambda table, executor: table.find_rows("xyz.*@example", executor)),
+    ("where", lambda table, executor: table.where("score", ">", 99.0, executor)),
+]
+
+
+def run(count: int, storage: str, worker_counts):
+    db = Database()
+    db.create_table("people", sample_schema(), storage)
+    table = db.tables["people"]
+    table.add_rows(sample_rows(count))
+
+    report = []
+    for name, query in QUERIES:
+        results = {}
+        with timer(results, "sequential"):
+            expected = query(table, None)
+        report.append([name, "in-process", f"{results['sequential']:.2f}", "", "1.0x"])
+        for workers in worker_counts:
+            with ScanExecutor(workers, threshold=0) as executor:
+                with timer(results, "first"):
+                    query(table, executor)
+                with timer(results, "warm"):
+                    rows = query(table, executor)
+            assert [row.data for row in rows] == [row.data for row in expected]
+            report.append([name, f"{workers} workers", f"{results['first']:.2f}", f"{results['warm']:.2f}",
+                           f"{results['sequential'] / results['warm']:.1f}x"])
+    print(f"{count:,} rows, {storage} storage, {os.cpu_count()} cores")
+    print_table(["query", "executor", "first s", "warm s", "speedup"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--storage", default="columnar", choices=["rows", "columnar"])
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({2, 4, os.cpu_count() or 1} - {1}) or [2])
+    args = parser.parse_args()
+    run(args.rows, args.storage, args.workers)
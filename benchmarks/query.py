@@ -0,0 +1,58 @@
+# Database.query against filtering and sorting Table.rows by hand, without
+# and with indexes on the filtered and ordered columns.
+# Run from the repository root: python -m benchmarks.query --rows 500000
+import argparse
+
+from database import Database
+from benchmarks.common import print_table, sample_rows, sample_schema, timer
+
+# (name, query, equivalent over row dicts)
+QUERIES = [
+    ("point", "SELECT name FROM people WHERE age = 42 AND status = 'active'",
+     lambda rows: [{"name": row["name"]} for row in rows if row["age"] == 42 and row["status"] == "active"]),
+    ("range", "SELECT name, score FROM people WHERE score > 99.5",
+     lambda rows: [{"name": row["name"], "score": row["score"]} for row in rows if row["score"] > 99.5]),
+    ("top 10", "SELECT name, score FROM people ORDER BY score DESC LIMIT 10",
+     lambda rows: [{"name": row["name"], "score": row["score"]}
+                   for row in sorted(rows, key=lambda row: row["score"], reverse=True)[:10]]),
+    ("filtered top 20", "SELECT name, age FROM people WHERE status = 'banned' ORDER BY age LIMIT 20",
+     lambda rows: [{"name": row["name"], "age": row["age"]}
+                   for row in sorted((row for row in rows if row["status"] == "banned"),
+                                     key=lambda row: row["age"])[:20]]),
+]
+
+
+def run(count: int, storage: str):
+    db = Database()
+    db.create_table("people", sample_schema(), storage)
+    table = db.tables["people"]
+    table.add_rows(sample_rows(count))
+
+    results = {}
+    for name, query, by_hand in QUERIES:
+        with timer(results, (name, "by hand")):
+            expected = by_hand(row.data for row in table.rows)
+        with timer(results, (name, "scan")):
+            rows = db.query(query)
+        assert [row.data for row in rows] == expected, name
+    table.create_index("age", "sorted")
+    table.create_index("score", "sorted")
+    table.create_index("status", "hash")
+    report = []
+    for name, query, _ in QUERIES:
+        with timer(results, (name, "indexed")):
+            db.query(query)
+        plan = db.explain(query).splitlines()
+        report.append([name, f"{results[name, 'by hand'] * 1000:.1f}", f"{results[name, 'scan'] * 1000:.1f}",
+                       f"{results[name, 'indexed'] * 1000:.1f}",
+                       f"{results[name, 'by hand'] / results[name, 'indexed']:.0f}x", plan[-1].strip()])
+    print(f"{count:,} rows, {storage} storage")
+    print_table(["query", "by hand ms", "scan ms", "indexed ms", "speedup", "access path"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--storage", default="columnar", choices=["rows", "columnar"])
+    args = parser.parse_args()
+    run(args.rows, args.storage)
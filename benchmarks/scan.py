@@ -0,0 +1,76 @@
+# Peak memory (tracemalloc) and time of reading a whole table through
+# Table.scan against building the full list first, and of saving to JSON by
+# streaming the rows against dumping one document.
+# Run from the repository root: python -m benchmarks.scan --rows 200000
+import argparse
+import json
+import os
+import tempfile
+
+from database import Database
+from benchmarks.common import peak_memory, print_table, sample_rows, sample_schema, timer
+
+
+def dump_document(db: Database, path: str):
+    # Database._write_json before it streamed
+    data = {
+        name: {
+            "schema": [field.to_dict() for field in table.schema.values()],
+            "storage": table.storage,
+            "indexes": [{"column": column, "kind": kind} for column, kind in table.indexes.items()],
+            "text_index": table.text_indexed,
+            "rows": [row.data for row in table.rows],
+            "auto_increment_value": table._auto_increment_value
+        }
+        for name, table in db.tables.items()
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def consume(rows) -> int:
+    count = 0
+    for _ in rows:
+        count += 1
+    return count
+
+
+def run(count: int, storage: str):
+    db = Database()
+    db.create_table("people", sample_schema(), storage)
+    table = db.tables["people"]
+    table.add_rows(sample_rows(count))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "people.json")
+
+        cases = [
+            ("all rows", "list of row.data", lambda: len([row.data for row in table.rows])),
+            ("all rows", "scan()", lambda: consume(table.scan())),
+            ("2 columns", "list comprehension", lambda: len([{"name": row.data["name"], "age": row.data["age"]}
+                                                             for row in table.rows])),
+            ("2 columns", "scan(columns)", lambda: consume(table.scan(columns=["name", "age"]))),
+            ("search", "find_rows()", lambda: len(table.find_rows("a"))),
+            ("search", "scan(pattern)", lambda: consume(table.scan(pattern="a"))),
+            ("50 rows at 50,000", "rows[...] slice", lambda: len(table.rows[50_000:50_050])),
+            ("50 rows at 50,000", "scan(offset, limit)", lambda: consume(table.scan(offset=50_000, limit=50))),
+            ("save JSON", "one document", lambda: dump_document(db, path)),
+            ("save JSON", "streamed", lambda: db.save_to_disk(path)),
+        ]
+        report = []
+        for task, method, work in cases:
+            results = {}
+            with timer(results, "time"):
+                work()
+            with peak_memory(results, "peak"):
+                work()
+            report.append([task, method, f"{results['time']:.2f}", f"{results['peak'] / 2 ** 20:.1f}"])
+    print(f"{count:,} rows, {storage} storage")
+    print_table(["task", "method", "seconds", "peak MiB"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--storage", default="columnar", choices=["rows", "columnar"])
+    args = parser.parse_args()
+    run(args.rows, args.storage)
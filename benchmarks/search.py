@@ -0,0 +1,53 @@
+# find_rows with and without the trigram index.
+# Run from the repository root: python -m benchmarks.search --rows 10000 100000 1000000
+import argparse
+
+from database import Table
+from benchmarks.common import print_table, sample_rows, sample_schema, timer
+
+PATTERNS = [
+    "inactive",             # enum value
+    "qwe",                  # short literal inside names
+    r"xyz.*@example\.com",  # mostly literal regex
+    r"^\d+$",               # nothing to decompose, falls back to scanning
+]
+
+
+def run(sizes, storage: str):
+    report = []
+    for count in sizes:
+        table = Table("people", sample_schema(), storage=storage)
+        for row in sample_rows(count):
+            table.add_row(row)
+
+        results = {}
+        with timer(results, "build"):
+            table.create_text_index()
+        for pattern in PATTERNS:
+            index = table._text_index
+            table._text_index = None
+            with timer(results, "scan"):
+                expected = table.find_rows(pattern)
+            table._text_index = index
+            with timer(results, "indexed"):
+                found = table.find_rows(pattern)
+            assert [row.data for row in found] == [row.data for row in expected]
+            report.append([
+                f"{count:,}",
+                pattern,
+                len(found),
+                f"{results['scan'] * 1000:.1f}",
+                f"{results['indexed'] * 1000:.1f}",
+                f"{results['scan'] / max(results['indexed'], 1e-9):.1f}x",
+                f"{results['build']:.2f}",
+            ])
+        del table
+    print_table(["rows", "pattern", "hits", "scan ms", "indexed ms", "speedup", "build s"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--storage", default="rows", choices=["rows", "columnar"])
+    args = parser.parse_args()
+    run(args.rows, args.storage)
@@ -0,0 +1,52 @@
+# Saving a database of several tables after a small change: the single-file
+# binary format rewrites everything, the segmented format only the chunks
+# that changed (see segments.py).
+# Run from the repository root: python -m benchmarks.segments --tables 5 --rows 200000
+import argparse
+import os
+import tempfile
+
+import segments
+from database import Database
+from benchmarks.common import print_table, sample_rows, sample_schema, timer
+
+
+def run(tables: int, count: int, storage: str):
+    db = Database()
+    rows = sample_rows(count)
+    for number in range(tables):
+        db.create_table(f"people{number}", sample_schema(), storage)
+        db.tables[f"people{number}"].add_rows(rows)
+    first = db.tables["people0"]
+    with tempfile.TemporaryDirectory() as directory:
+        binary_path = os.path.join(directory, "full.dmbs")
+        manifest_path = os.path.join(directory, "db.dmbm")
+
+        changes = [
+            ("first save", lambda: None),
+            ("nothing changed", lambda: None),
+            ("edit 1 row", lambda: first.edit_by_id(count // 2, dict(rows[0]))),
+            ("add 1,000 rows", lambda: first.add_rows(rows[:1000])),
+            ("delete 100 rows", lambda: [first.delete_by_id(row_id) for row_id in range(1, count, count // 100)]),
+        ]
+        report = []
+        for name, change in changes:
+            change()
+            results = {}
+            with timer(results, "binary"):
+                db.save_to_disk(binary_path)
+            with timer(results, "segments"):
+                written = segments.save(db, manifest_path)
+            report.append([name, f"{results['binary'] * 1000:.0f}", f"{results['segments'] * 1000:.0f}", written,
+                           f"{results['binary'] / results['segments']:.1f}x"])
+    print(f"{tables} tables x {count:,} rows, {storage} storage, {first.CHUNK_ROWS:,} slots per chunk")
+    print_table(["change", "binary ms", "segments ms", "chunks written", "speedup"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--storage", default="columnar", choices=["rows", "columnar"])
+    args = parser.parse_args()
+    run(args.tables, args.rows, args.storage)
@@ -0,0 +1,133 @@
+# Load test for the database server: starts `main.py --serve` on a Unix
+# socket (or uses --address), fills a table, then runs a mix of lookups and
+# edits from many concurrent clients for a fixed time at each client count.
+# Clients are threads spread over several processes, each process sharing
+# one connection pool. Reports requests per second and latency percentiles;
+# with --depth N each client sends N requests at a time, pipelined or as one
+# batch request, and a latency is the time one group took.
+# Run from the repository root:
+#   python -m benchmarks.server --clients 1 8 32 --mode single pipeline batch --depth 16
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import Pool
+from typing import List
+
+from client import RemoteDatabase
+from benchmarks.common import print_table, sample_columns, sample_schema
+
+
+def _client(address, threads: int, mode: str, depth: int, duration: float, rows: int,
+            write_ratio: float, seed: int) -> List[float]:
+    db = RemoteDatabase(address, pool_size=threads)
+    latencies: List[float] = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def run(thread_seed: int):
+        rng = random.Random(thread_seed)
+        mine = []
+        while True:
+            started = time.perf_counter()
+            if started >= deadline:
+                break
+            if mode == "single":
+                target = db.table("people")
+            else:
+                group = db.pipeline() if mode == "pipeline" else db.batch()
+                target = group.table("people")
+            for _ in range(1 if mode == "single" else depth):
+                row_id = rng.randint(1, rows)
+                if rng.random() < write_ratio:
+                    target.edit_by_id(row_id, {"name": "Edited", "age": 30, "score": 1.5, "grade": "A",
+                                               "email": "edited@example.com", "status": "active"})
+                else:
+                    target.get_by_id(row_id)
+            if mode != "single":
+                group.execute()
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=run, args=(seed * 1000 + number,)) for number in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    db.close()
+    return latencies
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(address, clients: List[int], modes: List[str], depth: int, duration: float, rows: int,
+        write_ratio: float, processes: int):
+    db = RemoteDatabase(address)
+    if "people" in db.tables:
+        db.delete_table("people")
+    db.create_table("people", sample_schema())
+    db.table("people").add_rows(sample_columns(rows))
+    db.close()
+
+    report = []
+    for mode in modes:
+        for count in clients:
+            workers = min(count, processes)
+            threads = [count // workers + (number < count % workers) for number in range(workers)]
+            with Pool(workers) as pool:
+                results = pool.starmap(_client, [(address, threads[number], mode, depth, duration, rows,
+                                                  write_ratio, number) for number in range(workers)])
+            latencies = sorted(latency for result in results for latency in result)
+            per_group = 1 if mode == "single" else depth
+            requests = len(latencies) * per_group
+            report.append([mode, count, f"{requests:,}", f"{requests / duration:,.0f}",
+                           f"{_percentile(latencies, 0.5) * 1000:.2f}", f"{_percentile(latencies, 0.99) * 1000:.2f}",
+                           f"{_percentile(latencies, 0.999) * 1000:.2f}", f"{latencies[-1] * 1000:.2f}"])
+    print(f"{rows:,} rows, {write_ratio:.0%} writes, {duration:g} s per run"
+          + ("" if modes == ["single"] else f", {depth} requests per pipeline/batch"))
+    print_table(["mode", "clients", "requests", "req/s", "p50 ms", "p99 ms", "p99.9 ms", "max ms"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--address", help="host:port or Unix socket path of a running server; "
+                                          "one is started if not given")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--mode", nargs="+", default=["single", "pipeline", "batch"],
+                        choices=["single", "pipeline", "batch"])
+    parser.add_argument("--depth", type=int, default=16, help="requests per pipeline or batch")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="client processes the clients are spread over")
+    args = parser.parse_args()
+
+    server = None
+    if args.address is None:
+        address = os.path.join(tempfile.mkdtemp(), "server.sock")
+        server = subprocess.Popen([sys.executable, "main.py", "--serve", "--socket", address],
+                                  stdout=subprocess.DEVNULL)
+        while not os.path.exists(address):
+            if server.poll() is not None:
+                sys.exit("server failed to start")
+            time.sleep(0.05)
+    elif ":" in args.address:
+        host, port = args.address.rsplit(":", 1)
+        address = (host, int(port))
+    else:
+        address = args.address
+    try:
+        run(address, args.clients, args.mode, args.depth, args.duration, args.rows, args.write_ratio,
+            args.processes)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,59 @@
+# Memory and throughput of the dict-per-row layout vs the columnar one.
+# Run from the repository root: python -m benchmarks.storage --rows 100000
+import argparse
+
+from database import Table
+from benchmarks.common import print_table, sample_rows, sample_schema, timer, traced_memory
+
+LAYOUTS = ("rows", "columnar")
+
+
+def run(count: int):
+    source = sample_rows(count)
+    report = []
+    for layout in LAYOUTS:
+        results = {}
+        table = Table("people", sample_schema(), storage=layout)
+        with timer(results, "insert"):
+            for row in source:
+                table.add_row(dict(row))
+
+        # Memory is measured on a separate build so tracing doesn't skew the timings.
+        # Fresh rows are generated inside the block, like values parsed from a file would be.
+        del table
+        with traced_memory(results, "memory"):
+            table = Table("people", sample_schema(), storage=layout)
+            for row in sample_rows(count):
+                table.add_row(row)
+
+        with timer(results, "scan"):
+            for row in table.rows:
+                row.data["age"]
+        with timer(results, "find"):
+            table.find_rows("inactive")
+        with timer(results, "find_regex"):
+            table.find_rows(r"^[a-c].*@example")
+        with timer(results, "edit"):
+            for i in range(0, len(table.rows), max(1, count // 1000)):
+                table.edit_row(i, dict(source[i]))
+
+        report.append([
+            layout,
+            f"{results['memory'] / 2 ** 20:.1f}",
+            f"{count / results['insert']:,.0f}",
+            f"{results['scan']:.3f}",
+            f"{results['find']:.3f}",
+            f"{results['find_regex']:.3f}",
+            f"{results['edit']:.3f}",
+        ])
+        del table
+
+    print(f"{count:,} rows")
+    print_table(["layout", "MiB", "inserts/s", "scan s", "find s", "regex s", "1k edits s"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+    run(args.rows)
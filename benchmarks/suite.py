@@ -0,0 +1,193 @@
+# Every Database/Table operation at several table sizes, on seeded data
+# covering all field types. Each operation is timed, then run again under
+# tracemalloc for its peak memory (tracing slows allocation down too much to
+# time the same run). Runs headless; results can be written as JSON and two
+# result files compared.
+# Run from the repository root:
+#   python -m benchmarks.suite --scales 1000 100000 1000000 --output before.json
+#   python -m benchmarks.suite --compare before.json after.json --threshold 0.2
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from database import Database, Field
+from benchmarks.common import peak_memory, print_table, sample_columns, sample_rows, sample_schema
+
+DEFAULT_SCALES = [1_000, 10_000, 100_000]
+# Calls of the single-row operations per measurement
+SAMPLE_OPS = 1000
+PATTERNS = ["Smith", "@example", "^Ab", "ending$"]
+FORMATS = {"binary": ".dmbs", "segments": ".dmbm", "json": ".json"}
+
+
+def operations(db: Database, count: int, seed: int, directory: str) -> Dict[str, Callable[[], int]]:
+    # name -> function doing one measurement's worth of work and returning
+    # how many operations that was. Each is called twice, so the mutating
+    # ones draw fresh rows and positions every time.
+    table = db.tables["people"]
+    rng = random.Random(seed)
+    extra = sample_rows(SAMPLE_OPS, seed + 1)
+    sample = min(count, SAMPLE_OPS)
+
+    def add_row():
+        for row in extra:
+            table.add_row(dict(row))
+        return len(extra)
+
+    def edit_row():
+        for row in extra[:sample]:
+            table.edit_row(rng.randrange(table.row_count), dict(row))
+        return sample
+
+    def delete_row():
+        for _ in range(sample):
+            table.delete_row(rng.randrange(table.row_count))
+        return sample
+
+    def find_rows():
+        for pattern in PATTERNS:
+            table.find_rows(pattern)
+        return len(PATTERNS)
+
+    def add_column():
+        table.add_column(Field("extra", "integer", default=0))
+        table.delete_column("extra")
+        return 1
+
+    ops = {
+        "add_row": add_row,
+        "edit_row": edit_row,
+        "delete_row": delete_row,
+        "find_rows": find_rows,
+        "add_column+delete_column": add_column,
+    }
+    for file_format, extension in FORMATS.items():
+        path = os.path.join(directory, f"people-{count}{extension}")
+
+        def save(path=path, file_format=file_format):
+            db.save_to_disk(path, file_format)
+            return 1
+
+        def load(path=path):
+            loaded = Database()
+            loaded.load_from_disk(path)
+            # Binary tables are read on first use
+            for loaded_table in loaded.tables.values():
+                loaded_table.row_count
+            return 1
+
+        ops[f"save_to_disk ({file_format})"] = save
+        ops[f"load_from_disk ({file_format})"] = load
+    return ops
+
+
+def run(scales: List[int], storages: List[str], seed: int) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for count in scales:
+            for storage in storages:
+                columns = sample_columns(count, seed)
+                db = Database()
+                db.create_table("people", sample_schema(), storage)
+                table = db.tables["people"]
+                started = time.perf_counter()
+                table.add_rows(columns)
+                elapsed = time.perf_counter() - started
+                # Traced separately on a scratch table: tracemalloc slows every allocation down
+                memory = {}
+                scratch = Database()
+                scratch.create_table("people", sample_schema(), storage)
+                with peak_memory(memory, "add_rows"):
+                    scratch.tables["people"].add_rows(columns)
+                del columns, scratch
+                measurements = [("add_rows", count, elapsed, memory["add_rows"])]
+                for name, operation in operations(db, count, seed, directory).items():
+                    started = time.perf_counter()
+                    ops = operation()
+                    elapsed = time.perf_counter() - started
+                    with peak_memory(memory, name):
+                        operation()
+                    measurements.append((name, ops, elapsed, memory[name]))
+                for name, ops, elapsed, peak in measurements:
+                    results.append({"operation": name, "storage": storage, "rows": count, "ops": ops,
+                                    "seconds": elapsed, "ops_per_second": ops / elapsed if elapsed > 0 else None,
+                                    "peak_bytes": peak})
+                print(f"{count:,} rows, {storage} storage", file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": seed,
+            "sample_ops": SAMPLE_OPS,
+        },
+        "results": results,
+    }
+
+
+def report(data: dict):
+    rows = []
+    for result in data["results"]:
+        peak = result["peak_bytes"]
+        rows.append([result["operation"], result["storage"], f"{result['rows']:,}",
+                     f"{result['seconds'] * 1000:.1f}", f"{result['ops_per_second'] or 0:,.0f}",
+                     "" if peak is None else f"{peak / 2 ** 20:.1f}"])
+    print_table(["operation", "storage", "rows", "ms", "ops/s", "peak MiB"], rows)
+
+
+def compare(before: dict, after: dict, threshold: float) -> int:
+    # Prints both runs side by side and returns the number of regressions:
+    # operations whose time per op or peak memory grew by more than threshold
+    def key(result):
+        return result["operation"], result["storage"], result["rows"]
+
+    old = {key(result): result for result in before["results"]}
+    rows = []
+    regressions = 0
+    for result in after["results"]:
+        previous = old.get(key(result))
+        if previous is None:
+            continue
+        time_change = (result["seconds"] / result["ops"]) / (previous["seconds"] / previous["ops"]) - 1
+        memory_change = None
+        if result["peak_bytes"] and previous["peak_bytes"]:
+            memory_change = result["peak_bytes"] / previous["peak_bytes"] - 1
+        regressed = time_change > threshold or (memory_change is not None and memory_change > threshold)
+        regressions += regressed
+        rows.append([result["operation"], result["storage"], f"{result['rows']:,}",
+                     f"{previous['seconds'] * 1000:.1f}", f"{result['seconds'] * 1000:.1f}", f"{time_change:+.0%}",
+                     "" if memory_change is None else f"{memory_change:+.0%}", "REGRESSION" if regressed else ""])
+    print_table(["operation", "storage", "rows", "before ms", "after ms", "time", "memory", ""], rows)
+    print(f"{regressions} regression(s) beyond {threshold:.0%}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                        help="table sizes to run, e.g. 1000 100000 5000000")
+    parser.add_argument("--storage", nargs="+", default=["rows", "columnar"], choices=["rows", "columnar"])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown or memory growth flagged as a regression")
+    args = parser.parse_args()
+    if args.compare:
+        with open(args.compare[0]) as f:
+            before = json.load(f)
+        with open(args.compare[1]) as f:
+            after = json.load(f)
+        sys.exit(1 if compare(before, after, args.threshold) else 0)
+    data = run(args.scales, args.storage, args.seed)
+    report(data)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2)
@@ -0,0 +1,67 @@
+# A batch of edits, adds and deletes made one call at a time against the same
+# batch inside db.transaction(), on a table with a sorted index, in memory and
+# with a write-ahead log (one fsync per change unless batched).
+# Run from the repository root: python -m benchmarks.transaction --rows 200000 --changes 20000
+import argparse
+import os
+import random
+import tempfile
+
+from database import Database
+from benchmarks.common import print_table, sample_rows, sample_schema, timer
+
+
+def build(count: int, storage: str, path=None) -> Database:
+    db = Database()
+    if path is not None:
+        db.open(path, sync_every=1)
+    db.create_table("people", sample_schema(), storage)
+    table = db.tables["people"]
+    table.add_rows(sample_rows(count))
+    table.create_index("age", "sorted")
+    return db
+
+
+def apply_changes(table, changes: int, rows):
+    rng = random.Random(7)
+    ids = rng.sample(range(1, table._auto_increment_value), changes)
+    edits, deletes = ids[:changes * 8 // 10], ids[changes * 8 // 10:]
+    for row_id in edits:
+        table.edit_by_id(row_id, {**rows[row_id - 1], "age": rng.randint(18, 90)})
+    for row_id in deletes:
+        table.delete_by_id(row_id)
+    for row in rows[:changes // 10]:
+        table.add_row(dict(row))
+
+
+def run(count: int, changes: int, storage: str):
+    rows = sample_rows(count)
+    report = []
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("memory", "wal"):
+            results = {}
+            for batched in (False, True):
+                path = os.path.join(directory, f"{mode}-{batched}.dmbs") if mode == "wal" else None
+                db = build(count, storage, path)
+                table = db.tables["people"]
+                key = "transaction" if batched else "one by one"
+                with timer(results, key):
+                    if batched:
+                        with db.transaction():
+                            apply_changes(table, changes, rows)
+                    else:
+                        apply_changes(table, changes, rows)
+                db.close()
+            report.append([mode, f"{results['one by one']:.2f}", f"{results['transaction']:.2f}",
+                           f"{results['one by one'] / results['transaction']:.1f}x"])
+    print(f"{count:,} rows, {changes:,} edits/deletes + {changes // 10:,} adds, {storage} storage")
+    print_table(["journal", "one by one s", "transaction s", "speedup"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--changes", type=int, default=20_000)
+    parser.add_argument("--storage", default="columnar", choices=["rows", "columnar"])
+    args = parser.parse_args()
+    run(args.rows, args.changes, args.storage)
@@ -0,0 +1,61 @@
+# Per-type validation cost: the former if/elif Field.validate against the
+# compiled per-value validator and the per-column check add_rows uses.
+# Run from the repository root: python -m benchmarks.validation --values 200000
+import argparse
+import re
+import timeit
+
+from database import Field, Table
+from benchmarks.common import STATUSES, print_table, sample_rows, sample_schema
+
+
+def legacy_validate(field: Field, value) -> bool:
+    # Field.validate before validators were compiled
+    if value is None and field.auto_increment:
+        return True
+    if field.type == "integer":
+        return isinstance(value, int)
+    elif field.type == "real":
+        return isinstance(value, float)
+    elif field.type == "char":
+        return isinstance(value, str) and len(value) == 1
+    elif field.type == "string":
+        return isinstance(value, str)
+    elif field.type == "email":
+        return isinstance(value, str) and re.match(r"[^@]+@[^@]+\.[^@]+", value) is not None
+    elif field.type == "enum":
+        return value in field.enum_values
+    return False
+
+
+def best(statement, repeat: int = 3) -> float:
+    return min(timeit.repeat(statement, number=1, repeat=repeat))
+
+
+def run(count: int):
+    rows = sample_rows(count)
+    report = []
+    for field in sample_schema():
+        values = [row[field.name] for row in rows]
+        assert all(legacy_validate(field, value) for value in values)
+        legacy = best(lambda: all(legacy_validate(field, value) for value in values))
+        compiled = best(lambda: all(map(field.validate, values)))
+        column = best(lambda: field.validate_column(values))
+        report.append([field.type, f"{legacy / count * 1e9:.0f}", f"{compiled / count * 1e9:.0f}",
+                       f"{column / count * 1e9:.0f}", f"{legacy / column:.1f}x"])
+
+    table = Table("people", sample_schema())
+    legacy = best(lambda: [legacy_validate(field, row[name]) for row in rows for name, field in table.schema.items()
+                           if name in row])
+    compiled = best(lambda: [table._validate_row(row) for row in rows])
+    report.append(["whole row", f"{legacy / count * 1e9:.0f}", f"{compiled / count * 1e9:.0f}", "",
+                   f"{legacy / compiled:.1f}x"])
+    print(f"{count:,} values per type, ns per value (enum values: {', '.join(STATUSES)})")
+    print_table(["type", "if/elif", "compiled", "column", "speedup"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--values", type=int, default=200_000)
+    args = parser.parse_args()
+    run(args.values)
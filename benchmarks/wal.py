@@ -0,0 +1,151 @@
+# Write-ahead log: crash recovery and group-commit throughput.
+# Run from the repository root:
+#   python -m benchmarks.wal recovery --trials 20
+#   python -m benchmarks.wal throughput --ops 5000
+#
+# recovery starts a child process that writes to a logged database (with a
+# background checkpointer running) and SIGKILLs it at a random moment. The
+# child prints a line after every write returns; the reopened database must
+# hold every acknowledged write, i.e. match the same seeded sequence of writes
+# cut after the acknowledged count (or one more, if the kill landed between
+# logging a write and acknowledging it).
+import argparse
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from database import Database
+from benchmarks.common import print_table, sample_rows, sample_schema
+
+
+def writes(db: Database, seed: int):
+    # Endless seeded mix of adds, edits and deletes; yields after each one
+    rng = random.Random(seed)
+    rows = sample_rows(1000, seed)
+    if "people" not in db.tables:
+        db.create_table("people", sample_schema(), "columnar")
+    table = db.tables["people"]
+    while True:
+        choice = rng.random()
+        if choice < 0.6 or table.row_count < 10:
+            table.add_row(dict(rng.choice(rows)))
+        elif choice < 0.85:
+            table.edit_row(rng.randrange(table.row_count), dict(rng.choice(rows)))
+        else:
+            table.delete_row(rng.randrange(table.row_count))
+        yield
+
+
+def child(filepath: str, seed: int):
+    Database.CHECKPOINT_SIZE = 64 << 10
+    db = Database()
+    db.open(filepath, sync_every=1, checkpoint_interval=0.05)
+    for _ in writes(db, seed):
+        sys.stdout.write("ok\n")
+        sys.stdout.flush()
+
+
+def expected_state(seed: int, count: int):
+    db = Database()
+    steps = writes(db, seed)
+    for _ in range(count):
+        next(steps)
+    return [row.data for row in db.tables["people"].rows] if "people" in db.tables else []
+
+
+def recovery(trials: int, seed: int):
+    rng = random.Random(seed)
+    report = []
+    failures = 0
+    for trial in range(trials):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "db.dmbs")
+            write_seed = rng.randrange(1 << 30)
+            process = subprocess.Popen([sys.executable, "-m", "benchmarks.wal", "child", filepath, str(write_seed)],
+                                       stdout=subprocess.PIPE, text=True)
+            acknowledged = 0
+
+            # Read acknowledgements on a thread so the kill lands mid-stream
+            def count():
+                nonlocal acknowledged
+                for _ in process.stdout:
+                    acknowledged += 1
+
+            reader = threading.Thread(target=count)
+            reader.start()
+            time.sleep(rng.uniform(0.2, 1.5))
+            process.send_signal(signal.SIGKILL)
+            process.wait()
+            reader.join()
+
+            started = time.perf_counter()
+            db = Database()
+            db.open(filepath)
+            recovery_time = time.perf_counter() - started
+            recovered = [row.data for row in db.tables["people"].rows] if "people" in db.tables else []
+            log_size = db._wal.size
+            db.close()
+
+            ok = recovered in (expected_state(write_seed, acknowledged), expected_state(write_seed, acknowledged + 1))
+            failures += not ok
+            report.append([trial, acknowledged, len(recovered), f"{log_size / 1024:.0f}",
+                           f"{recovery_time * 1000:.1f}", "ok" if ok else "LOST WRITES"])
+    print_table(["trial", "acknowledged", "rows", "log KiB", "recovery ms", "result"], report)
+    if failures:
+        sys.exit(f"{failures} of {trials} trials lost acknowledged writes")
+
+
+def throughput(ops: int, threads: int):
+    # Writers on separate tables share fsyncs when sync_every=1 (group commit)
+    report = []
+    rows = sample_rows(1000)
+    for sync_every, writers in ((1, 1), (1, threads), (64, 1), (0, 1)):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "db.dmbs")
+            db = Database()
+            db.open(filepath, sync_every=sync_every)
+            for i in range(writers):
+                db.create_table(f"t{i}", sample_schema(), "columnar")
+
+            def write(table, count):
+                for i in range(count):
+                    table.add_row(dict(rows[i % len(rows)]))
+
+            workers = [threading.Thread(target=write, args=(db.tables[f"t{i}"], ops // writers)) for i in range(writers)]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            db._wal.sync()
+            elapsed = time.perf_counter() - started
+            db.close()
+            report.append([sync_every, writers, f"{ops / elapsed:,.0f}"])
+    print(f"{ops:,} add_row calls")
+    print_table(["sync_every", "writers", "ops/s"], report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    recovery_parser = commands.add_parser("recovery")
+    recovery_parser.add_argument("--trials", type=int, default=20)
+    recovery_parser.add_argument("--seed", type=int, default=42)
+    throughput_parser = commands.add_parser("throughput")
+    throughput_parser.add_argument("--ops", type=int, default=5000)
+    throughput_parser.add_argument("--threads", type=int, default=4)
+    child_parser = commands.add_parser("child")
+    child_parser.add_argument("filepath")
+    child_parser.add_argument("seed", type=int)
+    args = parser.parse_args()
+    if args.command == "recovery":
+        recovery(args.trials, args.seed)
+    elif args.command == "throughput":
+        throughput(args.ops, args.threads)
+    else:
+        child(args.filepath, args.seed)
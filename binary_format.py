@@ -0,0 +1,285 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional
+
+import storage
+from storage import ColumnarStorage, DictionaryColumn, IntegerColumn, RealColumn, RowStorage, StringColumn, as_bytes
+
+# File layout:
+#   prefix   magic, format version, footer offset, footer length
+#   sections column data, each starting on an 8-byte boundary
+#   footer   JSON with the schema of every table and where its sections are
+# The footer is written last so columns can be streamed out one at a time.
+MAGIC = b"DMBS"
+# 2 added the one- and two-byte dictionary encodings
+VERSION = 2
+EXTENSION = ".dmbs"
+_PREFIX = struct.Struct("<4sH2xQQ")
+_ALIGN = 8
+# Dictionary encodings by the typecode of their codes
+_DICT_ENCODINGS = {"B": "dict8", "H": "dict16", "i": "dict"}
+_DICT_TYPECODES = {encoding: typecode for typecode, encoding in _DICT_ENCODINGS.items()}
+
+
+def is_binary_file(filepath: str) -> bool:
+    with open(filepath, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class _SectionWriter:
+    def __init__(self, f):
+        self._f = f
+        self._offset = _PREFIX.size
+        f.write(bytes(_PREFIX.size))
+
+    def write(self, data) -> List[int]:
+        padding = -self._offset % _ALIGN
+        if padding:
+            self._f.write(bytes(padding))
+            self._offset += padding
+        length = memoryview(data).nbytes
+        self._f.write(data)
+        offset = self._offset
+        self._offset += length
+        return [offset, length]
+
+    def finish(self, footer: dict):
+        encoded = json.dumps(footer).encode("utf-8")
+        offset = self._offset
+        self._f.write(encoded)
+        self._f.seek(0)
+        self._f.write(_PREFIX.pack(MAGIC, VERSION, offset, len(encoded)))
+
+
+def _string_sections(strings) -> (array, bytearray):
+    offsets = array("q", [0])
+    heap = bytearray()
+    for text in strings:
+        if not isinstance(text, str):
+            raise TypeError(f"expected str, got {type(text).__name__}")
+        heap += text.encode("utf-8")
+        offsets.append(len(heap))
+    return offsets, heap
+
+
+def _encode_values(field, values: list) -> (str, Dict[str, object]):
+    # Encodes a column of Python values; values the typed encodings can't
+    # hold (e.g. a string in an integer column of a dict-per-row table)
+    # send the whole column to the JSON fallback
+    try:
+        if field.type == "integer":
+            return "int64", {"data": array("q", (0 if value is None else value for value in values))}
+        if field.type == "real":
+            return "float64", {"data": array("d", (0.0 if value is None else value for value in values))}
+        if field.type in ("char", "enum") or storage.DICTIONARY_LIMIT:
+            # String columns too, unless they turn out to have too many distinct values
+            limit = None if field.type in ("char", "enum") else storage.DICTIONARY_LIMIT
+            encoded = _dictionary_encode(values, limit)
+            if encoded is not None:
+                return encoded
+        offsets, heap = _string_sections("" if value is None else value for value in values)
+        return "utf8", {"offsets": offsets, "heap": heap}
+    except (TypeError, OverflowError):
+        offsets, heap = _string_sections(json.dumps(value) for value in values)
+        return "json", {"offsets": offsets, "heap": heap}
+
+
+def _dictionary_encode(values: list, limit: Optional[int]) -> Optional[tuple]:
+    codes = {}
+    data = []
+    for value in values:
+        if value is None:
+            data.append(0)
+            continue
+        code = codes.get(value)
+        if code is None:
+            if not isinstance(value, str):
+                raise TypeError(f"expected str, got {type(value).__name__}")
+            if limit is not None and len(codes) == limit:
+                return None
+            code = codes[value] = len(codes)
+        data.append(code)
+    typecode = storage.code_type(len(codes))
+    offsets, heap = _string_sections(codes)
+    return _DICT_ENCODINGS[typecode], {"data": array(typecode, data), "dict_offsets": offsets, "dict_heap": heap}
+
+
+def _encode_column(column, start: int, stop: int) -> Optional[tuple]:
+    # Columnar storage without tombstones can be written straight from its
+    # buffers; a slot range that isn't the whole column is sliced out of them
+    whole = start == 0 and stop == len(column)
+    if isinstance(column, (IntegerColumn, RealColumn)):
+        data = column._data if whole else column._data[start:stop]
+        return ("int64" if isinstance(column, IntegerColumn) else "float64"), {"data": data}
+    if isinstance(column, DictionaryColumn):
+        offsets, heap = _string_sections(column._values)
+        return _DICT_ENCODINGS[column.typecode], {"data": column._data if whole else column._data[start:stop],
+                        "dict_offsets": offsets, "dict_heap": heap}
+    if isinstance(column, StringColumn) and stop > start:
+        starts, ends = column._data[start:stop], column._ends[start:stop]
+        # Only when the heap holds the values back to back, in slot order
+        if starts[1:] == ends[:-1]:
+            first, last = starts[0], ends[-1]
+            offsets = array("q", [0])
+            if first == 0:
+                offsets.frombytes(as_bytes(ends))
+            else:
+                offsets.extend([end - first for end in ends])
+            heap = column._heap if first == 0 and last == len(column._heap) else column._heap[first:last]
+            return "utf8", {"offsets": offsets, "heap": heap}
+    return None
+
+
+def _write_table(writer: _SectionWriter, table, start: int, stop: int,
+                 progress: Optional[Callable[[int], None]] = None) -> dict:
+    # progress(rows) after each column, with the share of the rows written so far
+    dead = table._dead_slots(start, stop)
+    table_meta = {
+        "name": table.name,
+        "schema": [field.to_dict() for field in table.schema.values()],
+        "storage": table.storage,
+        "indexes": [{"column": column, "kind": kind} for column, kind in table.indexes.items()],
+        "text_index": table.text_indexed,
+        "auto_increment_value": table._auto_increment_value,
+        "row_count": stop - start - len(dead),
+        "columns": {},
+    }
+    direct = table.storage == "columnar" and not dead
+    for name, field in table.schema.items():
+        encoded = _encode_column(table._storage._columns[name], start, stop) if direct else None
+        if encoded is not None:
+            nulls = table._storage._columns[name]._nulls
+            if nulls is not None and (start, stop) != (0, len(nulls)):
+                nulls = nulls[start:stop]
+        else:
+            values = table._storage.values(name, start, stop)
+            if dead:
+                values = (value for slot, value in enumerate(values, start) if slot not in dead)
+            values = list(values)
+            encoded = _encode_values(field, values)
+            nulls = bytearray(value is None for value in values) if None in values else None
+        encoding, sections = encoded
+        column_meta = {"encoding": encoding}
+        if nulls is not None and encoding != "json":
+            column_meta["nulls"] = writer.write(nulls)
+        for section, data in sections.items():
+            column_meta[section] = writer.write(data)
+        table_meta["columns"][name] = column_meta
+        if progress is not None:
+            progress(table_meta["row_count"] * len(table_meta["columns"]) // len(table.schema))
+    return table_meta
+
+
+def write_database(tables: dict, f, metadata: Optional[dict] = None,
+                   progress: Optional[Callable[[int, int], None]] = None):
+    # progress(rows, bytes) is called after each column with the totals written so far
+    writer = _SectionWriter(f)
+    footer = {"byteorder": sys.byteorder, "tables": []}
+    if metadata:
+        footer["metadata"] = metadata
+    done = 0
+    for table in tables.values():
+        report = None if progress is None else lambda rows, done=done: progress(done + rows, writer._offset)
+        footer["tables"].append(_write_table(writer, table, 0, len(table._storage), report))
+        done += footer["tables"][-1]["row_count"]
+    writer.finish(footer)
+
+
+def write_slots(table, start: int, stop: int, f):
+    # Slots start..stop-1 of one table, as a file holding just those rows
+    writer = _SectionWriter(f)
+    writer.finish({"byteorder": sys.byteorder, "tables": [_write_table(writer, table, start, stop)]})
+
+
+class MappedFile:
+    # A binary database file mapped read-only into memory
+    def __init__(self, filepath: str):
+        with open(filepath, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._parse(memoryview(self._mmap), filepath)
+
+    @classmethod
+    def from_buffer(cls, buffer, name: str = "buffer") -> 'MappedFile':
+        # The same layout held in memory, e.g. a shared memory block
+        mapped = cls.__new__(cls)
+        mapped._mmap = None
+        mapped._parse(memoryview(buffer), name)
+        return mapped
+
+    def _parse(self, view: memoryview, name: str):
+        self._view = view
+        magic, version, footer_offset, footer_length = _PREFIX.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{name} is not a binary database file")
+        if version > VERSION:
+            raise ValueError(f"Unsupported binary database version {version}")
+        self.footer = json.loads(bytes(self._view[footer_offset:footer_offset + footer_length]))
+        self._swap = self.footer["byteorder"] != sys.byteorder
+
+    def section(self, ref: List[int], typecode: Optional[str] = None):
+        offset, length = ref
+        view = self._view[offset:offset + length]
+        if typecode is None:
+            return view
+        if self._swap:
+            data = array(typecode)
+            data.frombytes(view)
+            data.byteswap()
+            return data
+        return view.cast(typecode)
+
+    def _strings(self, meta: dict, offsets_key: str, heap_key: str) -> Iterator[str]:
+        offsets = self.section(meta[offsets_key], "q")
+        heap = self.section(meta[heap_key])
+        for i in range(len(offsets) - 1):
+            yield str(heap[offsets[i]:offsets[i + 1]], "utf-8")
+
+    def values(self, meta: dict) -> Iterator:
+        # Decodes a column into Python values
+        encoding = meta["encoding"]
+        if encoding == "json":
+            return (json.loads(text) for text in self._strings(meta, "offsets", "heap"))
+        if encoding in _DICT_TYPECODES:
+            dictionary = list(self._strings(meta, "dict_offsets", "dict_heap"))
+            codes = self.section(meta["data"], _DICT_TYPECODES[encoding])
+            values = (dictionary[code] if dictionary else None for code in codes)
+        elif encoding == "utf8":
+            values = self._strings(meta, "offsets", "heap")
+        else:
+            values = iter(self.section(meta["data"], "q" if encoding == "int64" else "d"))
+        if "nulls" not in meta:
+            return values
+        return (None if null else value for value, null in zip(values, self.section(meta["nulls"])))
+
+    def column(self, field, meta: dict, length: int):
+        # Builds a columnar-storage column on top of the mapped sections
+        encoding = meta["encoding"]
+        nulls = self.section(meta["nulls"]) if "nulls" in meta else None
+        if encoding == "int64" and field.type == "integer":
+            return IntegerColumn.mapped(self.section(meta["data"], "q"), nulls)
+        if encoding == "float64" and field.type == "real":
+            return RealColumn.mapped(self.section(meta["data"], "d"), nulls)
+        if encoding in _DICT_TYPECODES and field.type in ("char", "enum", "string", "email"):
+            dictionary = list(self._strings(meta, "dict_offsets", "dict_heap"))
+            limit = None if field.type in ("char", "enum") else storage.DICTIONARY_LIMIT
+            return DictionaryColumn.mapped(self.section(meta["data"], _DICT_TYPECODES[encoding]), nulls,
+                                           dictionary, limit)
+        if encoding == "utf8" and field.type in ("string", "email"):
+            offsets = self.section(meta["offsets"], "q")
+            return StringColumn.mapped(offsets[:length], nulls, offsets[1:], self.section(meta["heap"]))
+        raise ValueError(f"Column {field.name} can't be mapped from {encoding} data")
+
+    def storage(self, table_meta: dict, schema: dict):
+        length = table_meta["row_count"]
+        columns = table_meta["columns"]
+        if table_meta["storage"] == ColumnarStorage.kind:
+            return ColumnarStorage.from_columns(
+                {name: self.column(field, columns[name], length) for name, field in schema.items()}, length)
+        storage = RowStorage(schema.values())
+        names = list(schema)
+        for values in zip(*(self.values(columns[name]) for name in names)):
+            storage.append(dict(zip(names, values)))
+        return storage
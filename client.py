@@ -0,0 +1,374 @@
+import queue
+import socket
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import protocol
+from database import Field, Row
+
+# Client for server.py. RemoteDatabase and RemoteTable mirror the Database
+# and Table methods, sending each call to the server through a pool of
+# connections shared by the threads of a process (make the pool after
+# forking, not before). batch() and pipeline() send many calls with one
+# round trip:
+#   with db.batch(atomic=True) as batch:
+#       batch.table("people").add_row({...})
+#       batch.table("orders").delete_by_id(7)
+#   batch.results
+Address = Union[Tuple[str, int], str]
+
+
+def _to_rows(rows: list) -> List[Row]:
+    return [Row(data) for data in rows]
+
+
+class Connection:
+    # One socket; not thread-safe, see ConnectionPool
+    # Request bytes sent ahead of reading responses when pipelining. Kept
+    # below the socket buffers so neither side can block the other's writes.
+    PIPELINE_BYTES = 64 << 10
+
+    def __init__(self, address: Address = ("127.0.0.1", protocol.DEFAULT_PORT), timeout: Optional[float] = None):
+        # address: (host, port) or the path of a Unix socket
+        if isinstance(address, str):
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(timeout)
+            self._socket.connect(address)
+        else:
+            self._socket = socket.create_connection(address, timeout)
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._buffer = bytearray()
+        self._frames: List[bytes] = []
+        self._next_id = 0
+        self.closed = False
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._socket.close()
+
+    def _send(self, data: bytearray):
+        try:
+            self._socket.sendall(data)
+        except OSError:
+            self.close()
+            raise
+
+    def _receive(self) -> Tuple[int, int, object]:
+        while not self._frames:
+            try:
+                data = self._socket.recv(1 << 16)
+            except OSError:
+                self.close()
+                raise
+            if not data:
+                self.close()
+                raise ConnectionError("Server closed the connection")
+            self._buffer += data
+            frames, consumed = protocol.split_frames(self._buffer)
+            del self._buffer[:consumed]
+            self._frames = frames[::-1]
+        return protocol.parse_response(self._frames.pop())
+
+    def _request(self, op: str, table: Optional[str], args, out: bytearray) -> int:
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        protocol.request(self._next_id, op, table, args, out)
+        return self._next_id
+
+    def call(self, op: str, table: Optional[str] = None, *args):
+        out = bytearray()
+        request_id = self._request(op, table, args, out)
+        self._send(out)
+        response_id, status, value = self._receive()
+        if response_id != request_id:
+            self.close()
+            raise ConnectionError("Response out of order")
+        if status != protocol.OK:
+            raise ValueError(value)
+        return value
+
+    def call_many(self, requests: List[Tuple[str, Optional[str], tuple]]) -> List[Tuple[int, object]]:
+        # Pipelines the requests; returns (status, value) for each
+        results = []
+        out = bytearray()
+        pending = []
+        for position, (op, table, args) in enumerate(requests):
+            pending.append(self._request(op, table, args, out))
+            if len(out) >= self.PIPELINE_BYTES or position == len(requests) - 1:
+                self._send(out)
+                out = bytearray()
+                for request_id in pending:
+                    response_id, status, value = self._receive()
+                    if response_id != request_id:
+                        self.close()
+                        raise ConnectionError("Response out of order")
+                    results.append((status, value))
+                pending = []
+        return results
+
+
+class ConnectionPool:
+    # Hands out up to size connections at a time, opening them on first use;
+    # callers beyond that wait for one to be returned
+    def __init__(self, address: Address = ("127.0.0.1", protocol.DEFAULT_PORT), size: int = 8,
+                 timeout: Optional[float] = None):
+        self.address = address
+        self.timeout = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        self._slots.acquire()
+        try:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = Connection(self.address, self.timeout)
+            try:
+                yield connection
+            finally:
+                # A connection that failed mid-request is dropped
+                if not connection.closed:
+                    self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RemoteTable:
+    def __init__(self, database: 'RemoteDatabase', name: str):
+        self._database = database
+        self.name = name
+
+    def _call(self, op: str, *args, convert=None):
+        return self._database._call(op, self.name, args, convert)
+
+    def _describe(self) -> dict:
+        return self._call("describe")
+
+    @property
+    def schema(self) -> Dict[str, Field]:
+        return {field["name"]: Field.from_dict(field) for field in self._describe()["schema"]}
+
+    @property
+    def storage(self) -> str:
+        return self._describe()["storage"]
+
+    @property
+    def indexes(self) -> Dict[str, str]:
+        return self._describe()["indexes"]
+
+    @property
+    def text_indexed(self) -> bool:
+        return self._describe()["text_index"]
+
+    @property
+    def row_count(self) -> int:
+        return self._call("row_count")
+
+    @property
+    def rows(self) -> 'RemoteRows':
+        return RemoteRows(self)
+
+    def add_row(self, row: Dict[str, Union[int, float, str]]):
+        # Like Table.add_row, fills in row['id']
+        def assign(row_id):
+            row['id'] = row_id
+            return row_id
+        return self._call("add_row", row, convert=assign)
+
+    def add_rows(self, rows: Union[List[dict], Dict[str, list]]) -> int:
+        return self._call("add_rows", rows if isinstance(rows, dict) else list(rows))
+
+    def edit_row(self, row_id: int, new_data: Dict[str, Union[int, float, str]]):
+        return self._call("edit_row", row_id, new_data)
+
+    def delete_row(self, row_id: int):
+        return self._call("delete_row", row_id)
+
+    def get_by_id(self, row_id) -> Optional[Row]:
+        return self._call("get_by_id", row_id, convert=lambda data: None if data is None else Row(data))
+
+    def edit_by_id(self, row_id, new_data: Dict[str, Union[int, float, str]]):
+        return self._call("edit_by_id", row_id, new_data)
+
+    def delete_by_id(self, row_id):
+        return self._call("delete_by_id", row_id)
+
+    def find_rows(self, pattern: str) -> List[Row]:
+        return self._call("find_rows", pattern, convert=_to_rows)
+
+    def where(self, column: str, op: str, value) -> List[Row]:
+        return self._call("where", column, op, value, convert=_to_rows)
+
+    def aggregate(self, group_by: Optional[List[str]] = None,
+                  aggs: Optional[Dict[str, Tuple[str, str]]] = None) -> List[Row]:
+        return self._call("aggregate", group_by, aggs, convert=_to_rows)
+
+    def add_column(self, field: Field):
+        return self._call("add_column", field.to_dict())
+
+    def delete_column(self, field_name: str):
+        return self._call("delete_column", field_name)
+
+    def create_index(self, column: str, kind: str = "hash"):
+        return self._call("create_index", column, kind)
+
+    def drop_index(self, column: str):
+        return self._call("drop_index", column)
+
+    def create_text_index(self):
+        return self._call("create_text_index")
+
+    def drop_text_index(self):
+        return self._call("drop_text_index")
+
+    def compact(self):
+        return self._call("compact")
+
+
+class RemoteRows:
+    # Like TableRows; a slice is fetched in one request
+    def __init__(self, table: RemoteTable):
+        self._table = table
+
+    def __len__(self):
+        return self._table.row_count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1) or index.start is not None and index.start < 0 or \
+                    index.stop is not None and index.stop < 0:
+                return self[:][index]
+            return self._table._call("rows", index.start or 0, index.stop, convert=_to_rows)
+        if index < 0:
+            index += len(self)
+        rows = self._table._call("rows", index, index + 1, convert=_to_rows)
+        if not rows:
+            raise IndexError("Row ID out of range")
+        return rows[0]
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+class RemoteDatabase:
+    def __init__(self, address: Address = ("127.0.0.1", protocol.DEFAULT_PORT), pool_size: int = 8,
+                 timeout: Optional[float] = None, pool: Optional[ConnectionPool] = None):
+        self.pool = pool or ConnectionPool(address, pool_size, timeout)
+
+    def _call(self, op: str, table: Optional[str], args: tuple, convert=None):
+        with self.pool.connection() as connection:
+            result = connection.call(op, table, *args)
+        return result if convert is None else convert(result)
+
+    def close(self):
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def tables(self) -> Dict[str, RemoteTable]:
+        return {name: RemoteTable(self, name) for name in self._call("tables", None, ())}
+
+    def table(self, name: str) -> RemoteTable:
+        # Without asking the server whether it exists
+        return RemoteTable(self, name)
+
+    def create_table(self, name: str, schema: List[Field], storage: str = "rows"):
+        return self._call("create_table", None, (name, [field.to_dict() for field in schema], storage))
+
+    def delete_table(self, name: str):
+        return self._call("delete_table", None, (name,))
+
+    def query(self, text: str) -> List[Row]:
+        return self._call("query", None, (text,), _to_rows)
+
+    def explain(self, text: str) -> str:
+        return self._call("explain", None, (text,))
+
+    def join(self, left: str, right: str, on: Tuple[str, str], how: str = "inner",
+             algorithm: Optional[str] = None) -> Iterator[Row]:
+        return self._call("join", None, (left, right, list(on), how, algorithm), lambda rows: iter(_to_rows(rows)))
+
+    def save_to_disk(self, filepath: str, file_format: Optional[str] = None):
+        # filepath is on the server's machine
+        return self._call("save_to_disk", None, (filepath, file_format))
+
+    def checkpoint(self):
+        return self._call("checkpoint", None, ())
+
+    def batch(self, atomic: bool = False) -> 'Batch':
+        return Batch(self, atomic)
+
+    def pipeline(self) -> 'Pipeline':
+        return Pipeline(self)
+
+
+class Pipeline(RemoteDatabase):
+    # Queues the calls made on it and its table() proxies (which return
+    # None) and sends them back to back on one connection when the with
+    # block ends. results then holds each call's result in order; if any
+    # failed, the first failure is raised after all of them ran.
+    def __init__(self, database: RemoteDatabase):
+        self.pool = database.pool
+        self._queued = []
+        self.results = []
+
+    def _call(self, op: str, table: Optional[str], args: tuple, convert=None):
+        self._queued.append((op, table, args, convert))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.execute()
+
+    def _send(self, connection: Connection, queued: list) -> List[Tuple[int, object]]:
+        return connection.call_many([(op, table, args) for op, table, args, _ in queued])
+
+    def execute(self) -> list:
+        queued, self._queued = self._queued, []
+        self.results = []
+        if not queued:
+            return self.results
+        with self.pool.connection() as connection:
+            responses = self._send(connection, queued)
+        failure = None
+        for (_, _, _, convert), (status, value) in zip(queued, responses):
+            if status != protocol.OK:
+                failure = failure or ValueError(value)
+                self.results.append(None)
+            else:
+                self.results.append(value if convert is None else convert(value))
+        if failure is not None:
+            raise failure
+        return self.results
+
+    def close(self):
+        pass
+
+
+class Batch(Pipeline):
+    # A Pipeline sent as a single request. With atomic the row changes are
+    # applied in one transaction: all of them or, if any call fails, none.
+    def __init__(self, database: RemoteDatabase, atomic: bool = False):
+        super().__init__(database)
+        self.atomic = atomic
+
+    def _send(self, connection: Connection, queued: list) -> List[Tuple[int, object]]:
+        requests = [[op, table, list(args)] for op, table, args, _ in queued]
+        return [tuple(result) for result in connection.call("batch", None, requests, self.atomic)]
@@ -1,149 +1,1560 @@
 import re
+import os
 import json
-from typing import List, Dict, Union, Optional
+import operator
+import threading
+import time
+import uuid
+import weakref
+from bisect import bisect_left, bisect_right, insort
+from contextlib import ExitStack, contextmanager
+from itertools import islice, repeat
+from typing import Callable, Iterable, Iterator, List, Dict, Tuple, Union, Optional
+
+import binary_format
+import instrumentation
+from indexes import TrigramIndex, create_index
+from json_stream import JsonStream
+from storage import create_storage
+from wal import WriteAheadLog
+
+# Comparison operators accepted by Table.where
+OPERATORS = {
+    "=": operator.eq,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+
+def _type_mismatch(column: str, op: str, value) -> ValueError:
+    # For comparisons Python can't make, e.g. a string column against a number
+    return ValueError(f"Type mismatch: can't compare {column} {op} {value!r}")
+
+
+# Marks a value a bulk-inserted dict didn't supply
+_MISSING = object()
+
+# Holds the transaction open on the current thread, see Database.transaction
+_local = threading.local()
+
+EMAIL_PATTERN = re.compile(r"[^@]+@[^@]+\.[^@]+")
+
+
+def _type_validators(field: 'Field'):
+    # (check one value, check a list of values) for the field's type
+    if field.type in ("integer", "real", "string"):
+        kind = {"integer": int, "real": float, "string": str}[field.type]
+        return (lambda value: isinstance(value, kind)), (lambda values: all(map(isinstance, values, repeat(kind))))
+    if field.type == "char":
+        return ((lambda value: isinstance(value, str) and len(value) == 1),
+                (lambda values: all(map(isinstance, values, repeat(str))) and {1}.issuperset(map(len, values))))
+    if field.type == "email":
+        match = EMAIL_PATTERN.match
+        return ((lambda value: isinstance(value, str) and match(value) is not None),
+                # Each distinct address is matched once
+                (lambda values: all(map(isinstance, values, repeat(str))) and all(map(match, set(values)))))
+    if field.type == "enum":
+        if field.enum_values is None:
+            def undefined(_):
+                raise ValueError(f"Enum field '{field.name}' does not have defined values.")
+            return undefined, undefined
+        allowed = frozenset(field.enum_values)
+
+        def check(value):
+            try:
+                return value in allowed
+            except TypeError:
+                # Unhashable, so not one of the values
+                return False
+
+        def check_all(values):
+            try:
+                return allowed.issuperset(values)
+            except TypeError:
+                return False
+        return check, check_all
+    return (lambda value: False), (lambda values: not values)
+
 
 class Field:
-    def __init__(self, name: str, type_: str, enum_values: Optional[List[str]] = None, auto_increment: bool = False):
+    # default is what rows that don't give a value get, including the rows
+    # already in a table when the column is added to it
+    def __init__(self, name: str, type_: str, enum_values: Optional[List[str]] = None, auto_increment: bool = False,
+                 default=None):
         self.name = name
         self.type = type_
         self.enum_values = enum_values
         self.auto_increment = auto_increment
+        self.default = default
+        self.compile()
 
-    def validate(self, value):
-        if value is None and self.auto_increment:
-            return True
-        if self.type == "integer":
-            return isinstance(value, int)
-        elif self.type == "real":
-            return isinstance(value, float)
-        elif self.type == "char":
-            return isinstance(value, str) and len(value) == 1
-        elif self.type == "string":
-            return isinstance(value, str)
-        elif self.type == "email":
-            return isinstance(value, str) and re.match(r"[^@]+@[^@]+\.[^@]+", value) is not None
-        elif self.type == "enum":
-            if self.enum_values is None:
-                raise ValueError(f"Enum field '{self.name}' does not have defined values.")
-            return value in self.enum_values
+    def compile(self):
+        # Resolves validate(value) and validate_column(values) for the current
+        # type and enum values, so checking a value doesn't dispatch on the type
+        # name. Tables call this whenever their schema is created or changed.
+        check, check_all = _type_validators(self)
+        if self.auto_increment:
+            self.validate = lambda value: value is None or check(value)
+            self.validate_column = lambda values: check_all([value for value in values if value is not None]
+                                                            if None in values else values)
         else:
-            return False
+            self.validate = check
+            self.validate_column = check_all
+        if self.default is not None and not check(self.default):
+            raise ValueError(f"Invalid default for field {self.name}")
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "type": self.type,
+            "enum_values": self.enum_values,
+            "auto_increment": self.auto_increment,
+            "default": self.default
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Field':
+        return cls(
+            name=data["name"],
+            type_=data["type"],
+            enum_values=data.get("enum_values"),
+            auto_increment=data.get("auto_increment", False),
+            default=data.get("default")
+        )
 
 class Row:
     def __init__(self, data: Dict[str, Union[int, float, str]]):
         self.data = data
 
+class TableRows:
+    # Read-only sequence view over a table's live rows; Row objects are built on access
+    def __init__(self, table: 'Table'):
+        self._table = table
+
+    def __len__(self):
+        return self._table.row_count
+
+    def __getitem__(self, index):
+        table = self._table
+        with table._lock:
+            if isinstance(index, slice):
+                return [self[position] for position in range(*index.indices(table.row_count))]
+            if index < 0:
+                index += table.row_count
+            return Row(table._storage.get(table._slot_at(index)))
+
+    def __iter__(self):
+        # Iterates a snapshot, so changes made meanwhile don't show up half-way
+        table = self._table
+        with table._lock:
+            snapshot = Snapshot(table)
+        with snapshot:
+            yield from snapshot
+
+class Cursor:
+    # Reads a table's live rows in slot order, batch_size slots per hold of the
+    # table lock. Rows appended while reading are reached as well, and a
+    # compaction moves the position along with the rows, so paging with
+    # fetch() neither repeats nor skips rows. Rows changed behind the position
+    # are not revisited.
+    def __init__(self, table: 'Table', columns: Optional[List[str]], predicate: Optional[Callable[[dict], bool]],
+                 batch_size: int, offset: int, limit: Optional[int],
+                 matcher: Optional[Callable[[], Callable[[int, int], Iterable[int]]]] = None):
+        self._table = table
+        self._columns = columns
+        self._predicate = predicate
+        # Makes a function picking the candidate slots of a range, so they
+        # aren't all read; made again after a compaction renumbers the slots
+        self._make_matcher = matcher
+        self._matcher = None
+        self.batch_size = batch_size
+        self._slot = 0
+        self._skip = offset
+        self._remaining = limit
+        self._pending: List[Row] = []
+        table._cursors.add(self)
+
+    def __iter__(self) -> Iterator[Row]:
+        for batch in self.batches():
+            yield from batch
+
+    def batches(self) -> Iterator[List[Row]]:
+        # One list per batch_size slots read; a list may be empty
+        if self._pending:
+            pending, self._pending = self._pending, []
+            yield pending
+        while True:
+            rows = self._read()
+            if rows is None:
+                return
+            yield rows
+
+    def fetch(self, count: int) -> List[Row]:
+        # Up to count next rows; fewer only once the table is exhausted
+        rows = self._pending
+        while len(rows) < count:
+            more = self._read()
+            if more is None:
+                break
+            rows.extend(more)
+        self._pending = rows[count:]
+        return rows[:count]
+
+    def _moved(self, tombstones: List[int]):
+        # The table is dropping these slots; keep pointing at the same row
+        self._slot -= bisect_left(tombstones, self._slot)
+        self._matcher = None
+
+    def _read(self) -> Optional[List[Row]]:
+        if self._remaining == 0:
+            return None
+        table = self._table
+        with table._lock:
+            storage = table._storage
+            start = self._slot
+            stop = min(start + self.batch_size, len(storage))
+            if start >= stop:
+                return None
+            dead = table._dead_slots(start, stop)
+            predicate, columns = self._predicate, self._columns
+            if self._skip and predicate is None and self._make_matcher is None:
+                # Every live slot counts towards the offset; step over whole batches
+                live = stop - start - len(dead)
+                if self._skip >= live:
+                    self._skip -= live
+                    self._slot = stop
+                    return []
+            if self._make_matcher is None:
+                slots = range(start, stop)
+            else:
+                if self._matcher is None:
+                    self._matcher = self._make_matcher()
+                slots = self._matcher(start, stop)
+            value = storage.value
+            rows = []
+            for slot in slots:
+                if slot in dead:
+                    continue
+                if predicate is None and columns is not None:
+                    # Only read the columns asked for
+                    data = None
+                else:
+                    data = storage.get(slot)
+                    if predicate is not None and not predicate(data):
+                        continue
+                if self._skip:
+                    self._skip -= 1
+                    continue
+                if columns is not None:
+                    data = {column: value(slot, column) if data is None else data.get(column) for column in columns}
+                rows.append(Row(data))
+                if self._remaining is not None:
+                    self._remaining -= 1
+                    if not self._remaining:
+                        break
+            self._slot = stop
+        return rows
+
+
+class Snapshot:
+    # The live rows of a table as they were when the snapshot was taken.
+    # Writers keep going: before a row the snapshot can see is edited or
+    # deleted, the table hands the snapshot the row's old data, and while any
+    # snapshot is open the table isn't compacted, so slots keep their rows.
+    # Reading takes the table lock one batch at a time.
+    BATCH_ROWS = 1000
+
+    def __init__(self, table: 'Table'):
+        self._table = table
+        self.schema = table.schema
+        self.schema_version = table._schema_version
+        self.version = table._version
+        self._length = len(table._storage)
+        self._dead = set(table._tombstones)
+        # Slot -> data it had when the snapshot was taken, saved by the writer changing it
+        self._undo: Dict[int, dict] = {}
+        # Column name -> values of every slot, for columns deleted since
+        self._dropped: Dict[str, list] = {}
+        table._snapshots.add(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._table._snapshots.discard(self)
+
+    def __len__(self):
+        return self._length - len(self._dead)
+
+    def __iter__(self) -> Iterator[Row]:
+        for batch in self.batches():
+            yield from batch
+
+    def batches(self, batch_size: Optional[int] = None) -> Iterator[List[Row]]:
+        batch_size = batch_size or self.BATCH_ROWS
+        for start in range(0, self._length, batch_size):
+            with self._table._lock:
+                rows = [Row(self._data(slot)) for slot in range(start, min(start + batch_size, self._length))
+                        if slot not in self._dead]
+            yield rows
+
+    def get_by_id(self, row_id) -> Optional[Row]:
+        table = self._table
+        with table._lock:
+            slot = table._id_index.get(row_id)
+            if slot is None or slot >= self._length or slot in self._dead:
+                # Deleted since, if it was there at all
+                slot = next((slot for slot, data in self._undo.items() if data is not None
+                             and data.get('id') == row_id), None)
+                if slot is None or slot in self._dead:
+                    return None
+            return Row(self._data(slot))
+
+    def _data(self, slot: int) -> dict:
+        data = self._undo.get(slot)
+        if data is None:
+            data = self._table._storage.get(slot)
+            if self._table._schema_version == self.schema_version:
+                return data
+        # The row as the snapshot's schema has it
+        dropped = self._dropped
+        return {name: dropped[name][slot] if name in dropped else data.get(name) for name in self.schema}
+
+    def _save(self, slot: int, data: dict):
+        if slot < self._length and slot not in self._dead and slot not in self._undo:
+            self._undo[slot] = data
+
+    def _save_column(self, name: str, values: list):
+        if name in self.schema and name not in self._dropped:
+            self._dropped[name] = values
+
+
+class _TableChanges:
+    # What a transaction does to one table
+    def __init__(self, table: 'Table'):
+        self.schema_version = table._schema_version
+        # Rows to add, by id, in the order they were added
+        self.adds: Dict[object, dict] = {}
+        # Id -> new data, for rows already in the table
+        self.edits: Dict[object, dict] = {}
+        self.deletes = set()
+        # Auto-increment counter before the first id was reserved, and after the last
+        self.reserved: Optional[Tuple[int, int]] = None
+
+
+class _Collector:
+    # Stands in for a table's journal while a transaction is applied
+    def __init__(self):
+        self.records = []
+
+    def append(self, op: str, table: str, *args):
+        self.records.append([op, table, *args])
+
+
+class Transaction:
+    # Buffers the row changes the current thread makes to the database's
+    # tables and applies them together when the with block ends, or drops
+    # them if it raises. Changes are validated as they are made and checked
+    # again against the tables at commit; reads see committed data only.
+    # Auto-increment ids are reserved right away, so they are final.
+    # A large batch detaches the secondary indexes and rebuilds them once
+    # rather than updating them row by row.
+    REBUILD_RATIO = 16
+
+    def __init__(self, database: 'Database'):
+        self.database = database
+        self._changes: Dict['Table', _TableChanges] = {}
+
+    def __enter__(self):
+        if getattr(_local, "transaction", None) is not None:
+            raise ValueError("A transaction is already open")
+        _local.transaction = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.transaction = None
+        if exc_type is not None:
+            self.rollback()
+            return
+        try:
+            self.commit()
+        except BaseException:
+            self.rollback()
+            raise
+
+    def _table_changes(self, table: 'Table') -> _TableChanges:
+        changes = self._changes.get(table)
+        if changes is None:
+            changes = self._changes[table] = _TableChanges(table)
+        return changes
+
+    def _add_row(self, table: 'Table', row: dict, validate: bool = True):
+        with table._lock:
+            changes = self._table_changes(table)
+            before = table._auto_increment_value
+            row_id = row.get('id')
+            if row_id is None:
+                row['id'] = row_id = table._auto_increment_value
+            if validate:
+                table._validate_row(row)
+            if row_id in changes.adds or row_id in table._id_index:
+                raise ValueError(f"Duplicate id {row_id}")
+            if isinstance(row_id, int) and row_id >= table._auto_increment_value:
+                table._auto_increment_value = row_id + 1
+            if table._auto_increment_value != before:
+                first = before if changes.reserved is None else changes.reserved[0]
+                changes.reserved = (first, table._auto_increment_value)
+            changes.adds[row_id] = row
+
+    def _add_batch(self, table: 'Table', columns: Dict[str, list]) -> int:
+        # Already validated a column at a time
+        names = list(columns)
+        for values in zip(*columns.values()):
+            self._add_row(table, dict(zip(names, values)), validate=False)
+        return len(columns['id'])
+
+    def _edit(self, table: 'Table', row_id, new_data: dict):
+        with table._lock:
+            changes = self._table_changes(table)
+            new_data['id'] = row_id
+            if row_id in changes.adds:
+                table._validate_row(new_data)
+                changes.adds[row_id] = new_data
+                return
+            if row_id in changes.deletes:
+                raise ValueError(f"Row with id {row_id} does not exist")
+            table._slot_of(row_id)
+            table._validate_row(new_data)
+            changes.edits[row_id] = new_data
+
+    def _delete(self, table: 'Table', row_id):
+        with table._lock:
+            changes = self._table_changes(table)
+            if changes.adds.pop(row_id, None) is not None:
+                return
+            if row_id in changes.deletes:
+                raise ValueError(f"Row with id {row_id} does not exist")
+            table._slot_of(row_id)
+            changes.edits.pop(row_id, None)
+            changes.deletes.add(row_id)
+
+    def _check(self):
+        # Raises if anything changed under the transaction that stops it applying
+        for table, changes in self._changes.items():
+            if self.database.tables.get(table.name) is not table:
+                raise ValueError(f"Table {table.name} was deleted during the transaction")
+            if table._schema_version != changes.schema_version:
+                raise ValueError(f"Columns of table {table.name} changed during the transaction")
+            for row_id in changes.edits.keys() | changes.deletes:
+                table._slot_of(row_id)
+            if not table._id_index.keys().isdisjoint(changes.adds):
+                row_id = next(row_id for row_id in changes.adds if row_id in table._id_index)
+                raise ValueError(f"Duplicate id {row_id}")
+
+    def commit(self):
+        database = self.database
+        with ExitStack() as stack:
+            # In the order checkpoint takes the locks
+            stack.enter_context(database._lock)
+            for table in self._changes:
+                stack.enter_context(table._lock)
+            self._check()
+            collector = _Collector() if database._wal is not None else None
+            if collector is not None:
+                for table in self._changes:
+                    table._journal = collector
+            undo = []
+            detached = {}
+            try:
+                # Adds and edits first: they can still fail in the storage
+                # (an integer too large for a column array) and are undone
+                for table, changes in self._changes.items():
+                    if changes.adds:
+                        ids = list(changes.adds)
+                        table._add_batch(table._columns_from_dicts(list(changes.adds.values())))
+                        undo.append((table, "add", ids))
+                for table, changes in self._changes.items():
+                    if (len(changes.edits) + len(changes.deletes)) * self.REBUILD_RATIO > table.row_count:
+                        detached[table] = (table._indexes, table._text_index)
+                        table._indexes, table._text_index = {}, None
+                    for row_id, data in changes.edits.items():
+                        slot = table._id_index[row_id]
+                        old = table._storage.get(slot)
+                        table._edit_slot(slot, data)
+                        undo.append((table, "edit", (row_id, old)))
+                        table._log("edit_row", row_id, data)
+            except BaseException:
+                for table, kind, args in reversed(undo):
+                    if kind == "edit":
+                        table._edit_slot(table._id_index[args[0]], args[1])
+                    else:
+                        for row_id in args:
+                            table._delete_slot(table._id_index[row_id])
+                raise
+            else:
+                for table, changes in self._changes.items():
+                    for row_id in changes.deletes:
+                        table._delete_slot(table._id_index[row_id])
+                        table._log("delete_row", row_id)
+                if collector is not None and collector.records:
+                    database._wal.append("transaction", "", collector.records)
+            finally:
+                for table, (indexes, text_index) in detached.items():
+                    for column, index in indexes.items():
+                        index.build(table._live_values(column))
+                    table._indexes = indexes
+                    if text_index is not None:
+                        table._text_index = text_index
+                        table._rebuild_text_index()
+                if collector is not None:
+                    for table in self._changes:
+                        table._journal = database._wal
+        self._changes = {}
+
+    def rollback(self):
+        # Hands back the reserved ids nobody has used since
+        for table, changes in self._changes.items():
+            if changes.reserved is not None:
+                with table._lock:
+                    if table._auto_increment_value == changes.reserved[1]:
+                        table._auto_increment_value = changes.reserved[0]
+        self._changes = {}
+
+
 class Table:
-    def __init__(self, name: str, schema: List[Field]):
+    # Deleted rows are only tombstoned; the storage is compacted once this many
+    # tombstones pile up (or a quarter of the slots are dead, whichever is larger)
+    COMPACT_MIN_TOMBSTONES = 1024
+    COMPACT_RATIO = 0.25
+    # Slots per chunk of a segmented save; see segments.py
+    CHUNK_ROWS = 1 << 14
+    # Filled in by the loader of a table whose data hasn't been read yet
+    _DATA_ATTRIBUTES = ("_storage", "_id_index", "_tombstones", "_indexes", "_text_index", "_layout", "_chunks",
+                        "_manifest")
+
+    def __init__(self, name: str, schema: List[Field], storage: str = "rows",
+                 loader: Optional[Callable[['Table'], None]] = None):
         self.name = name
         self.schema = {field.name: field for field in schema}
-        self.rows = []
         self._auto_increment_value = 1
         
         # Add ID field if not present
         if 'id' not in self.schema:
             id_field = Field('id', 'integer', auto_increment=True)
             self.schema = {'id': id_field, **self.schema}
+        self._compile_schema()
+
+        # Changes are applied and journaled under this lock, so a checkpoint
+        # holding it sees the table and the write-ahead log in step
+        self._lock = threading.RLock()
+        self._journal: Optional[WriteAheadLog] = None
+        # Bumped by every change to the data, so derived copies know when they are stale
+        self._version = 0
+        # Column arrays materialized by aggregate(), valid for _arrays_version
+        self._arrays = {}
+        self._arrays_version = -1
+        # Open cursors, repositioned by compact()
+        self._cursors = weakref.WeakSet()
+        # Open snapshots, handed the old data of rows before they change
+        self._snapshots = weakref.WeakSet()
+        # Bumped by every change to the columns. The schema dict is replaced
+        # rather than changed, so a reader holding it sees one version.
+        self._schema_version = 0
+
+        # A loader defers reading the data until the table is first used, see __getattr__
+        self._loader = loader
+        if loader is None:
+            self._init_data(create_storage(storage, self.schema.values()))
+
+    def __getattr__(self, name):
+        # Only reached for attributes that aren't set yet, i.e. the data of a
+        # deferred table. The first thread here loads it under the table lock;
+        # others wait on the lock rather than see a half-built table.
+        if name not in self._DATA_ATTRIBUTES or "_lock" not in self.__dict__:
+            raise AttributeError(f"'Table' object has no attribute '{name}'")
+        with self._lock:
+            loader = self.__dict__.get("_loader")
+            if loader is not None:
+                # Cleared first: the loader reads back what it has set up
+                self._loader = None
+                try:
+                    loader(self)
+                except BaseException:
+                    self._loader = loader
+                    raise
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError(f"'Table' object has no attribute '{name}'") from None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loader is None
+
+    def _init_data(self, storage):
+        self._storage = storage
+        self._id_index: Dict[int, int] = {}
+        self._tombstones: List[int] = []
+        # Secondary indexes by column name
+        self._indexes = {}
+        # Optional inverted index used by find_rows
+        self._text_index: Optional[TrigramIndex] = None
+        self._new_layout()
+        # Id of the segment manifest whose chunk stamps _chunks matches, if any
+        self._manifest: Optional[str] = None
+
+    def _new_layout(self):
+        # Called when slots move or the columns change. A segmented save only
+        # reuses chunk files written for the same layout, and only chunks
+        # whose stamp (the _version of their last change) is unchanged.
+        self._layout = uuid.uuid4().hex
+        self._chunks: Dict[int, int] = {}
+
+    def _touch(self, slot: int):
+        self._chunks[slot // self.CHUNK_ROWS] = self._version
+
+    def _compile_schema(self):
+        # Builds the whole-row validator used by add_row and edit_row
+        checks = []
+        for name, field in self.schema.items():
+            field.compile()
+            checks.append((name, field.validate, field.auto_increment, field.default))
+
+        def validate_row(row: dict):
+            for name, validate, optional, default in checks:
+                value = row.get(name, _MISSING)
+                if value is _MISSING:
+                    if default is not None:
+                        row[name] = default
+                    elif not optional:
+                        raise ValueError(f"Missing value for field {name}")
+                elif not validate(value):
+                    raise ValueError(f"Invalid value for field {name}")
+        self._validate_row = validate_row
+
+    def _log(self, op: str, *args):
+        if self._journal is not None:
+            self._journal.append(op, self.name, *args)
+
+    def _transaction(self) -> Optional[Transaction]:
+        # The transaction this thread has open on the table's database, if any
+        transaction = getattr(_local, "transaction", None)
+        if transaction is None or transaction.database.tables.get(self.name) is not self:
+            return None
+        return transaction
+
+    def _index_ids(self):
+        self._id_index = {row_id: slot for slot, row_id in enumerate(self._storage.column('id'))}
+
+    @property
+    def storage(self) -> str:
+        return self._storage.kind
+
+    @property
+    def rows(self) -> TableRows:
+        return TableRows(self)
+
+    @property
+    def indexes(self) -> Dict[str, str]:
+        return {column: index.kind for column, index in self._indexes.items()}
+
+    @property
+    def text_indexed(self) -> bool:
+        return self._text_index is not None
+
+    @property
+    def row_count(self) -> int:
+        return len(self._storage) - len(self._tombstones)
+
+    def _slot_at(self, position: int) -> int:
+        if position < 0 or position >= self.row_count:
+            raise IndexError("Row ID out of range")
+        tombstones = self._tombstones
+        if not tombstones:
+            return position
+        # Smallest slot that has position + 1 live slots at or before it
+        lo, hi = position, position + len(tombstones)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if mid + 1 - bisect_right(tombstones, mid) > position:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _slot_of(self, row_id) -> int:
+        slot = self._id_index.get(row_id)
+        if slot is None:
+            raise ValueError(f"Row with id {row_id} does not exist")
+        return slot
+
+    def _live_slots(self):
+        if not self._tombstones:
+            return range(len(self._storage))
+        dead = set(self._tombstones)
+        return (slot for slot in range(len(self._storage)) if slot not in dead)
+
+    def _live_values(self, column: str):
+        # (slot, value) pairs of a column, skipping deleted rows
+        values = enumerate(self._storage.column(column))
+        if not self._tombstones:
+            return values
+        dead = set(self._tombstones)
+        return ((slot, value) for slot, value in values if slot not in dead)
+
+    def _append(self, row: Dict[str, Union[int, float, str]]):
+        if row['id'] in self._id_index:
+            raise ValueError(f"Duplicate id {row['id']}")
+        self._storage.append(row)
+        self._version += 1
+        slot = len(self._storage) - 1
+        self._touch(slot)
+        self._id_index[row['id']] = slot
+        for column, index in self._indexes.items():
+            index.add(row.get(column), slot)
+        if self._text_index is not None:
+            self._text_index.add(slot, self._storage.get(slot).values())
+
+    def _preserve(self, slot: int):
+        # Called before a slot changes
+        if self._snapshots:
+            data = self._storage.get(slot)
+            for snapshot in self._snapshots:
+                snapshot._save(slot, data)
+
+    def _delete_slot(self, slot: int):
+        self._preserve(slot)
+        del self._id_index[self._storage.value(slot, 'id')]
+        for column, index in self._indexes.items():
+            index.remove(self._storage.value(slot, column), slot)
+        self._storage.clear(slot)
+        self._version += 1
+        self._touch(slot)
+        insort(self._tombstones, slot)
+        if len(self._tombstones) > max(self.COMPACT_MIN_TOMBSTONES, len(self._storage) * self.COMPACT_RATIO) \
+                and not self._snapshots:
+            self.compact()
+
+    def _edit_slot(self, slot: int, new_data: Dict[str, Union[int, float, str]]):
+        self._preserve(slot)
+        # Preserve the ID
+        new_data['id'] = self._storage.value(slot, 'id')
+        old_values = {column: self._storage.value(slot, column) for column in self._indexes}
+        self._storage.replace(slot, new_data)
+        self._version += 1
+        self._touch(slot)
+        for column, index in self._indexes.items():
+            index.remove(old_values[column], slot)
+            index.add(new_data.get(column), slot)
+        if self._text_index is not None:
+            self._text_index.update(slot, self._storage.get(slot).values())
+            if self._text_index.needs_rebuild:
+                self._rebuild_text_index()
+
+    def compact(self):
+        # Drop tombstoned slots from storage and re-point the id index.
+        # Snapshots address rows by slot, so wait until none is open.
+        if not self._tombstones or self._snapshots:
+            return
+        for cursor in self._cursors:
+            cursor._moved(self._tombstones)
+        self._storage.compact(list(self._live_slots()))
+        self._version += 1
+        self._new_layout()
+        self._tombstones = []
+        self._index_ids()
+        for column, index in self._indexes.items():
+            index.build(enumerate(self._storage.column(column)))
+        if self._text_index is not None:
+            self._rebuild_text_index()
+
+    def _rebuild_text_index(self):
+        self._text_index.build((slot, self._storage.get(slot).values()) for slot in self._live_slots())
+
+    def create_index(self, column: str, kind: str = "hash"):
+        with self._lock:
+            if column not in self.schema:
+                raise ValueError(f"Column {column} does not exist")
+            if column in self._indexes:
+                raise ValueError(f"Column {column} is already indexed")
+            self._build_index(column, kind)
+            self._log("create_index", column, kind)
+
+    def _build_index(self, column: str, kind: str):
+        index = create_index(kind, column)
+        index.build(self._live_values(column))
+        self._indexes[column] = index
+
+    def drop_index(self, column: str):
+        with self._lock:
+            if column not in self._indexes:
+                raise ValueError(f"Column {column} is not indexed")
+            del self._indexes[column]
+            self._log("drop_index", column)
+
+    def create_text_index(self):
+        with self._lock:
+            if self._text_index is not None:
+                raise ValueError("Table already has a text index")
+            self._build_text_index()
+            self._log("create_text_index")
+
+    def _build_text_index(self):
+        self._text_index = TrigramIndex()
+        self._rebuild_text_index()
+
+    def drop_text_index(self):
+        with self._lock:
+            self._text_index = None
+            self._log("drop_text_index")
 
     def add_row(self, row: Dict[str, Union[int, float, str]]):
-        # Handle auto-increment ID
-        if 'id' not in row or row['id'] is None:
-            row['id'] = self._auto_increment_value
-            self._auto_increment_value += 1
-
-        for field_name, field in self.schema.items():
-            if field_name not in row and not field.auto_increment:
-                raise ValueError(f"Missing value for field {field_name}")
-            if field_name in row and not field.validate(row[field_name]):
-                raise ValueError(f"Invalid value for field {field_name}")
-        
-        self.rows.append(Row(row))
+        transaction = self._transaction()
+        if transaction is not None:
+            return transaction._add_row(self, row)
+        with self._lock:
+            # Handle auto-increment ID
+            if 'id' not in row or row['id'] is None:
+                row['id'] = self._auto_increment_value
+            self._validate_row(row)
+            self._append(row)
+            # Keep auto-increment ahead of explicitly supplied ids
+            if isinstance(row['id'], int) and row['id'] >= self._auto_increment_value:
+                self._auto_increment_value = row['id'] + 1
+            self._log("add_row", row)
+
+    def add_rows(self, rows: Union[Iterable[Union[dict, tuple]], Dict[str, list]], batch_size: int = 10000) -> int:
+        # Bulk add_row. rows is an iterable of dicts or of tuples in schema order
+        # (the auto-increment id may be left out), or one dict of column lists.
+        # Each batch is validated a column at a time and goes in whole or not at
+        # all; batches before a failing one stay. Returns the number of rows added.
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+        added = 0
+        if isinstance(rows, dict):
+            count = len(next(iter(rows.values()), ()))
+            if any(len(values) != count for values in rows.values()):
+                raise ValueError("Columns have different lengths")
+            for start in range(0, count, batch_size):
+                batch = {name: list(values[start:start + batch_size]) for name, values in rows.items()}
+                added += self._add_batch(self._columns_from_lists(batch), added)
+            return added
+        iterator = iter(rows)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return added
+            if isinstance(batch[0], dict):
+                columns = self._columns_from_dicts(batch)
+            else:
+                columns = self._columns_from_tuples(batch)
+            added += self._add_batch(columns, added)
+
+    def _columns_from_dicts(self, batch: List[dict]) -> Dict[str, list]:
+        return self._columns_from_lists({name: [row.get(name, _MISSING) for row in batch] for name in self.schema})
+
+    def _columns_from_tuples(self, batch: List[tuple]) -> Dict[str, list]:
+        names = list(self.schema)
+        width = len(batch[0])
+        if width == len(names) - 1 and self.schema['id'].auto_increment:
+            names.remove('id')
+        elif width != len(names):
+            raise ValueError(f"Expected {len(names)} values per row, got {width}")
+        if any(len(row) != width for row in batch):
+            raise ValueError("Rows have different lengths")
+        return self._columns_from_lists(dict(zip(names, map(list, zip(*batch)))))
+
+    def _columns_from_lists(self, columns: Dict[str, list]) -> Dict[str, list]:
+        # Fills in absent columns and checks nothing required is missing
+        count = len(next(iter(columns.values()), ()))
+        result = {}
+        for name, field in self.schema.items():
+            values = columns.get(name)
+            if values is None:
+                values = [field.default if field.default is not None or field.auto_increment else _MISSING] * count
+            if _MISSING in values:
+                if field.default is None and not field.auto_increment:
+                    raise ValueError(f"Missing value for field {name}")
+                values = [field.default if value is _MISSING else value for value in values]
+            result[name] = values
+        return result
+
+    def _add_batch(self, columns: Dict[str, list], offset: int = 0) -> int:
+        count = len(columns['id'])
+        with instrumentation.phase("Table.add_rows.validate"):
+            for name, field in self.schema.items():
+                values = columns[name]
+                if not field.validate_column(values):
+                    position = next(i for i, value in enumerate(values) if not field.validate(value))
+                    raise ValueError(f"Invalid value for field {name} in row {offset + position}")
+        transaction = self._transaction()
+        if transaction is not None:
+            return transaction._add_batch(self, columns)
+
+        with self._lock:
+            # Reserve the ids: a plain range when all are auto-assigned, else the
+            # same sequence a loop of add_row would hand out
+            ids = columns['id']
+            next_id = self._auto_increment_value
+            if ids.count(None) == count:
+                ids = list(range(next_id, next_id + count))
+                next_id += count
+            else:
+                ids = list(ids)
+                for i, row_id in enumerate(ids):
+                    if row_id is None:
+                        ids[i] = row_id = next_id
+                    if isinstance(row_id, int) and row_id >= next_id:
+                        next_id = row_id + 1
+            if len(set(ids)) != count or not self._id_index.keys().isdisjoint(ids):
+                seen = set(self._id_index)
+                for row_id in ids:
+                    if row_id in seen:
+                        raise ValueError(f"Duplicate id {row_id}")
+                    seen.add(row_id)
+            columns['id'] = ids
+
+            first = len(self._storage)
+            self._storage.extend(columns)
+            self._version += 1
+            slots = range(first, first + count)
+            for chunk in range(first // self.CHUNK_ROWS, (first + count - 1) // self.CHUNK_ROWS + 1):
+                self._chunks[chunk] = self._version
+            self._id_index.update(zip(ids, slots))
+            for column, index in self._indexes.items():
+                index.add_many(zip(slots, columns[column]))
+            if self._text_index is not None:
+                for slot, values in zip(slots, zip(*columns.values())):
+                    self._text_index.add(slot, values)
+            self._auto_increment_value = next_id
+            self._log("add_rows", columns)
+        return count
 
     def delete_row(self, row_id: int):
-        if row_id < 0 or row_id >= len(self.rows):
-            raise IndexError("Row ID out of range")
-        self.rows.pop(row_id)
+        with self._lock:
+            slot = self._slot_at(row_id)
+            transaction = self._transaction()
+            if transaction is not None:
+                return transaction._delete(self, self._storage.value(slot, 'id'))
+            self._delete_logged(slot)
 
     def edit_row(self, row_id: int, new_data: Dict[str, Union[int, float, str]]):
-        if row_id < 0 or row_id >= len(self.rows):
-            raise IndexError("Row ID out of range")
-        # Preserve the ID
-        new_data['id'] = self.rows[row_id].data['id']
-        self.rows[row_id] = Row(new_data)
+        with self._lock:
+            slot = self._slot_at(row_id)
+            transaction = self._transaction()
+            if transaction is not None:
+                return transaction._edit(self, self._storage.value(slot, 'id'), new_data)
+            self._edit_logged(slot, new_data)
+
+    def get_by_id(self, row_id) -> Optional[Row]:
+        slot = self._id_index.get(row_id)
+        return None if slot is None else Row(self._storage.get(slot))
+
+    def delete_by_id(self, row_id):
+        transaction = self._transaction()
+        if transaction is not None:
+            return transaction._delete(self, row_id)
+        with self._lock:
+            self._delete_logged(self._slot_of(row_id))
+
+    def edit_by_id(self, row_id, new_data: Dict[str, Union[int, float, str]]):
+        transaction = self._transaction()
+        if transaction is not None:
+            return transaction._edit(self, row_id, new_data)
+        with self._lock:
+            self._edit_logged(self._slot_of(row_id), new_data)
+
+    # The log refers to rows by id, which unlike positions doesn't depend on
+    # what else was deleted before the record is replayed
+    def _delete_logged(self, slot: int):
+        row_id = self._storage.value(slot, 'id')
+        self._delete_slot(slot)
+        self._log("delete_row", row_id)
+
+    def _edit_logged(self, slot: int, new_data: Dict[str, Union[int, float, str]]):
+        new_data['id'] = self._storage.value(slot, 'id')
+        self._validate_row(new_data)
+        self._edit_slot(slot, new_data)
+        self._log("edit_row", new_data['id'], new_data)
 
     def add_column(self, field: Field):
-        if field.name in self.schema:
-            raise ValueError(f"Column {field.name} already exists")
-        self.schema[field.name] = field
-        # Initialize new column with None values
-        for row in self.rows:
-            row.data[field.name] = None
+        if self._transaction() is not None:
+            raise ValueError("Can't change columns inside a transaction")
+        with self._lock:
+            if field.name in self.schema:
+                raise ValueError(f"Column {field.name} already exists")
+            self.schema = {**self.schema, field.name: field}
+            self._schema_version += 1
+            self._compile_schema()
+            # Rows already there read the default
+            self._storage.add_column(field)
+            self._version += 1
+            self._new_layout()
+            if self._text_index is not None:
+                self._text_index.add_universal(field.default)
+            self._log("add_column", field.to_dict())
 
     def delete_column(self, field_name: str):
-        if field_name == 'id':
-            raise ValueError("Cannot delete ID column")
-        if field_name not in self.schema:
-            raise ValueError(f"Column {field_name} does not exist")
-        del self.schema[field_name]
-        # Remove column data from all rows
-        for row in self.rows:
-            if field_name in row.data:
-                del row.data[field_name]
-
-    def find_rows(self, pattern: str) -> List[Row]:
+        if self._transaction() is not None:
+            raise ValueError("Can't change columns inside a transaction")
+        with self._lock:
+            if field_name == 'id':
+                raise ValueError("Cannot delete ID column")
+            if field_name not in self.schema:
+                raise ValueError(f"Column {field_name} does not exist")
+            for snapshot in self._snapshots:
+                snapshot._save_column(field_name, list(self._storage.column(field_name)))
+            self.schema = {name: field for name, field in self.schema.items() if name != field_name}
+            self._schema_version += 1
+            self._compile_schema()
+            self._indexes.pop(field_name, None)
+            self._storage.drop_column(field_name)
+            self._version += 1
+            self._new_layout()
+            self._log("delete_column", field_name)
+
+    def snapshot(self) -> Snapshot:
+        # A consistent view of the rows to read while writers carry on; close
+        # it (or use it as a context manager) when done
+        with self._lock:
+            return Snapshot(self)
+
+    def scan(self, columns: Optional[List[str]] = None, predicate: Optional[Callable[[dict], bool]] = None,
+             batch_size: int = 10000, offset: int = 0, limit: Optional[int] = None,
+             pattern: Optional[str] = None) -> Cursor:
+        # Lazily reads the live rows, see Cursor. columns limits the fields in
+        # each row; predicate gets the full row data; pattern keeps the rows
+        # find_rows would match. offset and limit count rows that pass.
+        if columns is not None:
+            for column in columns:
+                if column not in self.schema:
+                    raise ValueError(f"Column {column} does not exist")
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+        if pattern is None:
+            return Cursor(self, columns, predicate, batch_size, offset, limit)
+        re.compile(pattern)
+        return Cursor(self, columns, predicate, batch_size, offset, limit, lambda: self._pattern_matcher(pattern))
+
+    def _pattern_matcher(self, pattern: str) -> Callable[[int, int], Iterable[int]]:
         regex = re.compile(pattern, re.IGNORECASE)
-        return [row for row in self.rows if any(regex.search(str(value)) for value in row.data.values())]
+        candidates = None if self._text_index is None else self._text_index.candidates(pattern)
+        if candidates is None:
+            return lambda start, stop: self._storage.search(regex, start, stop)
+        # Only rows sharing the pattern's trigrams can match; confirm them with
+        # the regex. Rows appended after the lookup weren't candidates, so
+        # they are searched instead.
+        candidates = sorted(candidates)
+        known = len(self._storage)
+
+        def match(start: int, stop: int) -> List[int]:
+            storage = self._storage
+            found = []
+            for slot in candidates[bisect_left(candidates, start):bisect_left(candidates, min(stop, known))]:
+                data = storage.get(slot)
+                # Deleted rows are cleared
+                if data is not None and any(regex.search(str(value)) for value in data.values()):
+                    found.append(slot)
+            if stop > known:
+                found += storage.search(regex, max(start, known), stop)
+            return found
+        return match
+
+    def find_rows(self, pattern: str, executor=None) -> List[Row]:
+        # executor: a parallel.ScanExecutor to spread large scans over processes
+        if executor is not None:
+            return executor.find_rows(self, pattern)
+        return list(self.scan(pattern=pattern, batch_size=max(1, len(self._storage))))
+
+    def iter_find(self, pattern: str, batch_size: int = 10000) -> Iterator[List[Row]]:
+        # find_rows a batch of slots at a time, so a caller can show matches as
+        # they come or stop early
+        return self.scan(pattern=pattern, batch_size=batch_size).batches()
+
+    def _dead_slots(self, start: int, stop: int) -> set:
+        tombstones = self._tombstones
+        return set(tombstones[bisect_left(tombstones, start):bisect_left(tombstones, stop)])
+
+    def _where_slots(self, column: str, op: str, value) -> List[int]:
+        if column not in self.schema:
+            raise ValueError(f"Column {column} does not exist")
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator {op}")
+        index = self._indexes.get(column)
+        if index is not None:
+            slots = index.lookup(op, value)
+            if slots is not None:
+                slots.sort()
+                return slots
+        return self._scan_slots(column, op, value)
+
+    def _scan_slots(self, column: str, op: str, value) -> List[int]:
+        # Scan the column. Empty cells never satisfy an ordering.
+        if op in ("=", "==", "!="):
+            # Dictionary-encoded columns compare codes instead
+            slots = self._storage.equal_slots(column, value, op != "!=")
+            if slots is not None:
+                if not self._tombstones:
+                    return slots
+                dead = set(self._tombstones)
+                return [slot for slot in slots if slot not in dead]
+        compare = OPERATORS[op]
+        try:
+            if op in ("<", "<=", ">", ">="):
+                return [slot for slot, cell in self._live_values(column) if cell is not None and compare(cell, value)]
+            return [slot for slot, cell in self._live_values(column) if compare(cell, value)]
+        except TypeError:
+            raise _type_mismatch(column, op, value) from None
+
+    def aggregate(self, group_by: Optional[List[str]] = None,
+                  aggs: Optional[Dict[str, Tuple[str, str]]] = None) -> List[Row]:
+        # aggs maps output names to (function, column): count, sum, avg, min or
+        # max, and ("count", "*") for the number of rows. One Row per group of
+        # the group_by columns' values; see aggregate.py
+        import aggregate
+        return aggregate.aggregate(self, group_by, aggs or {"count": ("count", "*")})
+
+    def where(self, column: str, op: str, value, executor=None) -> List[Row]:
+        if executor is not None:
+            return executor.where(self, column, op, value)
+        return [Row(self._storage.get(slot)) for slot in self._where_slots(column, op, value)]
+
+
+class _FrozenTable:
+    # What saving reads of a table: its metadata and a copy of its storage,
+    # taken under the table lock so the file holds one version of the table
+    # while writers carry on
+    def __init__(self, table: Table):
+        # Rows drop the columns deleted since they were last rewritten
+        table._storage.settle()
+        self.name = table.name
+        self.schema = table.schema
+        self.storage = table.storage
+        self.indexes = table.indexes
+        self.text_indexed = table.text_indexed
+        self._auto_increment_value = table._auto_increment_value
+        self._storage = table._storage.copy()
+        self._tombstones = list(table._tombstones)
+        # For segmented saves
+        self.table = table
+        self.CHUNK_ROWS = table.CHUNK_ROWS
+        self._layout = table._layout
+        self._chunks = dict(table._chunks)
+        self._manifest = table._manifest
+
+    _dead_slots = Table._dead_slots
+
 
 class Database:
+    # Rows between two progress callbacks while loading or saving
+    PROGRESS_INTERVAL = 10000
+    # Log size at which the background checkpointer writes a new snapshot
+    CHECKPOINT_SIZE = 64 << 20
+
     def __init__(self):
         self.tables = {}
+        # Guards the table dict; see checkpoint
+        self._lock = threading.RLock()
+        # Set while the database is opened with a write-ahead log
+        self._wal: Optional[WriteAheadLog] = None
+        self._path: Optional[str] = None
+        self._checkpointer: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # One checkpoint at a time: each drops the log records its snapshot holds
+        self._checkpoint_lock = threading.Lock()
 
-    def create_table(self, name: str, schema: List[Field]):
-        if name in self.tables:
-            raise ValueError("Table already exists")
-        self.tables[name] = Table(name, schema)
+    def create_table(self, name: str, schema: List[Field], storage: str = "rows"):
+        with self._lock:
+            if name in self.tables:
+                raise ValueError("Table already exists")
+            table = Table(name, schema, storage)
+            table._journal = self._wal
+            self.tables[name] = table
+            if self._wal is not None:
+                self._wal.append("create_table", name, [field.to_dict() for field in table.schema.values()], storage)
 
     def delete_table(self, name: str):
-        if name not in self.tables:
-            raise ValueError("Table does not exist")
-        del self.tables[name]
-
-    def save_to_disk(self, filepath: str):
-        data = {
-            table_name: {
-                "schema": [
-                    {
-                        "name": field.name,
-                        "type": field.type,
-                        "enum_values": field.enum_values,
-                        "auto_increment": field.auto_increment
-                    }
-                    for field in table.schema.values()
-                ],
-                "rows": [row.data for row in table.rows],
-                "auto_increment_value": table._auto_increment_value
+        with self._lock:
+            if name not in self.tables:
+                raise ValueError("Table does not exist")
+            del self.tables[name]
+            if self._wal is not None:
+                self._wal.append("delete_table", name)
+
+    def snapshot(self) -> Dict[str, Snapshot]:
+        # Snapshots of every table, taken at one moment
+        with ExitStack() as stack:
+            stack.enter_context(self._lock)
+            for table in self.tables.values():
+                stack.enter_context(table._lock)
+            return {name: Snapshot(table) for name, table in self.tables.items()}
+
+    def transaction(self) -> Transaction:
+        # with db.transaction(): applies the row changes made in the block to
+        # every table at once, or none of them if the block raises
+        return Transaction(self)
+
+    def query(self, text: str) -> List[Row]:
+        # SELECT ... FROM ... [WHERE ...] [ORDER BY ...] [LIMIT ...]; see query.py.
+        # Rows hold only the selected columns. EXPLAIN SELECT returns the plan
+        # as rows with a single "plan" column.
+        import query
+        return query.execute(self, text)
+
+    def join(self, left: str, right: str, on: Tuple[str, str], how: str = "inner",
+             algorithm: Optional[str] = None) -> Iterator[Row]:
+        # Rows of left joined to rows of right where left[on[0]] == right[on[1]],
+        # generated lazily; see join.py. how="left" also yields left rows without
+        # a match. algorithm ("hash" or "merge") overrides the planner's choice.
+        import join
+        return join.join(self, left, right, on, how, algorithm)
+
+    def explain(self, text: str) -> str:
+        text = text.strip()
+        if not text.upper().startswith("EXPLAIN"):
+            text = "EXPLAIN " + text
+        return "\n".join(row.data["plan"] for row in self.query(text))
+
+    def open(self, filepath: str, sync_every: int = 1, sync_interval: Optional[float] = None,
+             checkpoint_interval: Optional[float] = None):
+        # Opens a database kept durable by a write-ahead log next to it
+        # (filepath + ".wal"): the snapshot at filepath is loaded, the log is
+        # replayed on top of it and every later change is appended to the log.
+        # Snapshots are always written in the binary format, which records the
+        # last log record they contain; see WriteAheadLog for sync_every and
+        # sync_interval. With checkpoint_interval, a background thread checks
+        # the log that often and checkpoints once it reaches CHECKPOINT_SIZE.
+        self.close()
+        snapshot_lsn = 0
+        if os.path.exists(filepath):
+            if binary_format.is_binary_file(filepath):
+                snapshot_lsn = self._open_binary(filepath).get("metadata", {}).get("wal_lsn", 0)
+            else:
+                self.load_from_disk(filepath)
+        else:
+            self.tables = {}
+
+        wal = WriteAheadLog(filepath + ".wal", sync_every, sync_interval, first_lsn=snapshot_lsn + 1)
+        try:
+            if wal.first_lsn > snapshot_lsn + 1:
+                raise ValueError(f"{wal.path} starts after the snapshot in {filepath}; records are missing")
+            for lsn, op, table_name, args in wal.records():
+                # Records up to the snapshot's are already in it (the process
+                # stopped between writing a snapshot and emptying the log)
+                if lsn > snapshot_lsn:
+                    self._replay(op, table_name, args)
+            if wal.last_lsn < snapshot_lsn:
+                wal.reset(snapshot_lsn + 1)
+        except BaseException:
+            wal.close()
+            raise
+
+        self._wal = wal
+        self._path = filepath
+        for table in self.tables.values():
+            table._journal = wal
+        if checkpoint_interval:
+            self._stop.clear()
+            self._checkpointer = threading.Thread(target=self._checkpoint_periodically, args=(checkpoint_interval,),
+                                                  name="checkpoint", daemon=True)
+            self._checkpointer.start()
+
+    def _replay(self, op: str, table_name: str, args: list):
+        if op == "create_table":
+            schema, storage = args
+            self.create_table(table_name, [Field.from_dict(field) for field in schema], storage)
+            return
+        if op == "delete_table":
+            self.delete_table(table_name)
+            return
+        if op == "transaction":
+            for record in args[0]:
+                self._replay(record[0], record[1], record[2:])
+            return
+        table = self.tables[table_name]
+        if op == "add_row":
+            table.add_row(args[0])
+        elif op == "add_rows":
+            table.add_rows(args[0], batch_size=len(args[0]['id']))
+        elif op == "edit_row":
+            table.edit_by_id(args[0], args[1])
+        elif op == "delete_row":
+            table.delete_by_id(args[0])
+        elif op == "add_column":
+            table.add_column(Field.from_dict(args[0]))
+        elif op == "delete_column":
+            table.delete_column(args[0])
+        elif op == "create_index":
+            table.create_index(args[0], args[1])
+        elif op == "drop_index":
+            table.drop_index(args[0])
+        elif op == "create_text_index":
+            table.create_text_index()
+        elif op == "drop_text_index":
+            table.drop_text_index()
+        else:
+            raise ValueError(f"Unknown log record {op}")
+
+    def checkpoint(self, progress: Optional[Callable[[int, int, float], None]] = None):
+        # Writes a snapshot and drops the log records it holds. The tables are
+        # copied with every table lock held, so the copy contains exactly the
+        # changes logged up to then; changes made while the copy is written
+        # stay in the log. progress is as for save_to_disk.
+        if self._wal is None:
+            raise ValueError("Database was not opened with a write-ahead log")
+        with self._checkpoint_lock:
+            wal = self._wal
+            with instrumentation.phase("Database.save_to_disk.copy"), self._locked():
+                tables = {name: _FrozenTable(table) for name, table in self.tables.items()}
+                lsn, size = wal.position()
+            self._write_file(self._path, "binary", tables, {"wal_lsn": lsn}, progress)
+            wal.discard(lsn, size)
+
+    @contextmanager
+    def _locked(self):
+        # Holds the table dict and every table still, for copying them as of one moment
+        with self._lock, ExitStack() as stack:
+            for table in self.tables.values():
+                stack.enter_context(table._lock)
+            yield
+
+    def _checkpoint_periodically(self, interval: float):
+        while not self._stop.wait(interval):
+            if self._wal.size >= self.CHECKPOINT_SIZE:
+                self.checkpoint()
+
+    def close(self):
+        # Stops logging; changes logged so far are synced and replayed by the next open
+        if self._wal is None:
+            return
+        self._stop.set()
+        if self._checkpointer is not None:
+            self._checkpointer.join()
+            self._checkpointer = None
+        with self._lock:
+            for table in self.tables.values():
+                table._journal = None
+            self._wal.close()
+            self._wal = None
+            self._path = None
+
+    def save_to_disk(self, filepath: str, file_format: Optional[str] = None,
+                     progress: Optional[Callable[[int, int, float], None]] = None):
+        # The format follows the extension unless given: ".dmbs" files use the
+        # binary format, ".dmbm" the segmented one (see segments.py), anything
+        # else JSON. The file is written next to the target and renamed over
+        # it, so a crash never leaves a torn file and a memory-mapped copy that
+        # is still being read stays intact.
+        # Writers only wait while the tables are copied, not while the copy
+        # is written, so saving can run on another thread. This holds for
+        # every format and for checkpoints. progress(rows_written,
+        # bytes_written, rows_per_second) is called along the way; raising from
+        # it abandons the save and leaves the previous file as it was.
+        if self._path is not None and os.path.abspath(filepath) == os.path.abspath(self._path):
+            # The snapshot of a logged database must stay in step with its log
+            self.checkpoint(progress)
+            return
+        import segments
+        if file_format is None:
+            if filepath.endswith(binary_format.EXTENSION):
+                file_format = "binary"
+            else:
+                file_format = "segments" if filepath.endswith(segments.EXTENSION) else "json"
+        if file_format not in ("binary", "segments", "json"):
+            raise ValueError(f"Unknown file format {file_format}")
+        if file_format == "segments":
+            segments.save(self, filepath, progress)
+            return
+        with instrumentation.phase("Database.save_to_disk.copy"), self._locked():
+            tables = {name: _FrozenTable(table) for name, table in self.tables.items()}
+        self._write_file(filepath, file_format, tables, progress=progress)
+
+    def _write_file(self, filepath: str, file_format: str, tables: dict, metadata: Optional[dict] = None,
+                    progress: Optional[Callable[[int, int, float], None]] = None):
+        # Writes _FrozenTable copies
+        report = None
+        if progress is not None:
+            started = time.perf_counter()
+
+            def report(rows: int, written: int):
+                elapsed = time.perf_counter() - started
+                progress(rows, written, rows / elapsed if elapsed > 0 else 0.0)
+        temp_path = filepath + ".tmp"
+        try:
+            with open(temp_path, "wb" if file_format == "binary" else "w") as f:
+                with instrumentation.phase("Database.save_to_disk.serialize"):
+                    if file_format == "binary":
+                        binary_format.write_database(tables, f, metadata, report)
+                    else:
+                        self._write_json(f, tables, report)
+                with instrumentation.phase("Database.save_to_disk.fsync"):
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, filepath)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _write_json(self, f, tables: dict, report: Optional[Callable[[int, int], None]] = None):
+        # Written piece by piece, so the rows are never all in memory as one document
+        f.write("{")
+        written = 0
+        for position, (table_name, table) in enumerate(tables.items()):
+            header = {
+                "schema": [field.to_dict() for field in table.schema.values()],
+                "storage": table.storage,
+                "indexes": [{"column": column, "kind": kind} for column, kind in table.indexes.items()],
+                "text_index": table.text_indexed,
             }
-            for table_name, table in self.tables.items()
-        }
-        with open(filepath, "w") as f:
-            json.dump(data, f, indent=2)
+            f.write(f'{"," if position else ""}\n  {json.dumps(table_name)}: {{\n')
+            for key, value in header.items():
+                f.write(f"    {json.dumps(key)}: {json.dumps(value)},\n")
+            f.write('    "rows": [')
+            separator = "\n      "
+            storage = table._storage
+            for start in range(0, len(storage), self.PROGRESS_INTERVAL):
+                stop = min(start + self.PROGRESS_INTERVAL, len(storage))
+                dead = table._dead_slots(start, stop)
+                batch = [storage.get(slot) for slot in range(start, stop) if slot not in dead]
+                if batch:
+                    f.write(separator + ",\n      ".join(map(json.dumps, batch)))
+                    separator = ",\n      "
+                    written += len(batch)
+                if report is not None:
+                    report(written, f.tell())
+            f.write(f'\n    ],\n    "auto_increment_value": {json.dumps(table._auto_increment_value)}\n  }}')
+        f.write("\n}\n")
 
-    def load_from_disk(self, filepath: str):
-        with open(filepath, "r") as f:
-            data = json.load(f)
-        self.tables = {}
-        for table_name, table_data in data.items():
-            schema = [
-                Field(
-                    name=field["name"],
-                    type_=field["type"],
-                    enum_values=field.get("enum_values"),
-                    auto_increment=field.get("auto_increment", False)
-                )
-                for field in table_data["schema"]
-            ]
-            table = Table(table_name, schema)
-            table._auto_increment_value = table_data.get("auto_increment_value", 1)
-            for row_data in table_data["rows"]:
-                table.rows.append(Row(row_data))
-            self.tables[table_name] = table
+    def replace_tables(self, tables: Dict[str, Table]):
+        # Swaps in tables loaded elsewhere (e.g. by another Database on a
+        # background thread) in one step; like loading, this stops logging
+        self.close()
+        with self._lock:
+            self.tables = tables
+
+    def load_from_disk(self, filepath: str, progress: Optional[Callable[[int, int, float], None]] = None):
+        # Loading replaces the tables, so they no longer follow an open log.
+        # progress may raise to stop loading; the tables are then left as they were.
+        self.close()
+        if binary_format.is_binary_file(filepath):
+            with instrumentation.phase("Database.load_from_disk.map"):
+                self._open_binary(filepath, progress)
+            return
+        import segments
+        if segments.is_manifest(filepath):
+            self.tables = segments.load(filepath, progress)
+            return
+
+        # Streams the JSON file: table headers and rows are parsed one at a time and
+        # appended straight into each table's storage, so the parsed document
+        # never exists in memory as a whole.
+        # progress(rows_loaded, bytes_read, rows_per_second) is called every
+        # PROGRESS_INTERVAL rows and once at the end.
+        tables = {}
+        started = time.perf_counter()
+        loaded = 0
+        # Each row is parsed on its own, so dict-per-row tables share the
+        # column name strings across rows explicitly
+        keys = {}
+
+        def report():
+            elapsed = time.perf_counter() - started
+            progress(loaded, stream.bytes_read, loaded / elapsed if elapsed > 0 else 0.0)
+
+        headers = []
+        with open(filepath, "rb") as f, instrumentation.phase("Database.load_from_disk.parse"):
+            stream = JsonStream(f)
+            for table_name in stream.keys():
+                header = {}
+                table = None
+                pending_rows = []
+                for key in stream.keys():
+                    if key != "rows":
+                        header[key] = stream.value()
+                    elif "schema" not in header:
+                        # Rows ahead of the schema can't be streamed into storage
+                        pending_rows = stream.value()
+                    else:
+                        table = self._table_from_header(table_name, header)
+                        share_keys = table.storage == "rows"
+                        for _ in stream.elements():
+                            row_data = stream.value()
+                            if share_keys:
+                                row_data = {keys.setdefault(key, key): value for key, value in row_data.items()}
+                            table._append(row_data)
+                            loaded += 1
+                            if progress is not None and loaded % self.PROGRESS_INTERVAL == 0:
+                                report()
+                if table is None:
+                    table = self._table_from_header(table_name, header)
+                for row_data in pending_rows:
+                    table._append(row_data)
+                    loaded += 1
+                table._auto_increment_value = header.get("auto_increment_value", 1)
+                headers.append((table, header))
+                tables[table_name] = table
+            if progress is not None:
+                report()
+        # Indexes are built once all rows are in
+        with instrumentation.phase("Database.load_from_disk.indexes"):
+            for table, header in headers:
+                for index in header.get("indexes", []):
+                    table.create_index(index["column"], index["kind"])
+                if header.get("text_index"):
+                    table.create_text_index()
+        self.tables = tables
+
+    def _table_from_header(self, name: str, header: dict) -> Table:
+        schema = [Field.from_dict(field) for field in header["schema"]]
+        return Table(name, schema, header.get("storage", "rows"))
+
+    def _open_binary(self, filepath: str, progress: Optional[Callable[[int, int, float], None]] = None) -> dict:
+        # Maps the file and only reads the footer; each table decodes its
+        # columns from the mapping the first time it is used
+        started = time.perf_counter()
+        mapped = binary_format.MappedFile(filepath)
+        tables = {}
+        for meta in mapped.footer["tables"]:
+            schema = [Field.from_dict(field) for field in meta["schema"]]
+            table = Table(meta["name"], schema, meta["storage"],
+                          loader=lambda table, meta=meta: self._load_mapped_table(table, mapped, meta))
+            table._auto_increment_value = meta["auto_increment_value"]
+            tables[table.name] = table
+        if progress is not None:
+            rows = sum(meta["row_count"] for meta in mapped.footer["tables"])
+            elapsed = time.perf_counter() - started
+            progress(rows, os.path.getsize(filepath), rows / elapsed if elapsed > 0 else 0.0)
+        self.tables = tables
+        return mapped.footer
+
+    @staticmethod
+    def _load_mapped_table(table: Table, mapped: binary_format.MappedFile, meta: dict):
+        # Runs when the table is first used, so its phases come after load_from_disk's
+        with instrumentation.phase("Database.load_from_disk.decode"):
+            table._init_data(mapped.storage(meta, table.schema))
+            table._index_ids()
+        # Not create_index: rebuilding the saved indexes isn't a change to journal
+        with instrumentation.phase("Database.load_from_disk.indexes"):
+            for index in meta["indexes"]:
+                table._build_index(index["column"], index["kind"])
+            if meta["text_index"]:
+                table._build_text_index()
+
+
+instrumentation.register(Table, (
+    "add_row", "add_rows", "edit_row", "delete_row", "edit_by_id", "delete_by_id", "get_by_id",
+    "find_rows", "where", "scan", "aggregate", "add_column", "delete_column", "create_index",
+    "create_text_index", "compact", "snapshot",
+))
+instrumentation.register(Database, (
+    "create_table", "delete_table", "query", "open", "checkpoint", "save_to_disk", "load_from_disk",
+))
@@ -1,17 +1,91 @@
+import os
 import re
 import json
-from typing import List, Dict, Union, Optional
+import queue
+import threading
+import time
+from typing import Callable, List, Dict, Union, Optional
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
 from tkinter.scrolledtext import ScrolledText
 
+import binary_format
+import instrumentation
+import segments
 from database import *
 
 
+class JobCancelled(Exception):
+    pass
+
+
+class BackgroundJob:
+    # A save or load running on a worker thread. work(job) passes
+    # job.progress as the progress callback; the Tk loop polls the fields.
+    # After cancel() the next progress call raises JobCancelled.
+    def __init__(self, title: str, work: Callable[['BackgroundJob'], object]):
+        self.title = title
+        self.rows = 0
+        self.bytes = 0
+        # Set by work when known, for a determinate progress bar
+        self.total_rows: Optional[int] = None
+        self.total_bytes: Optional[int] = None
+        self.result = None
+        self.error: Optional[Exception] = None
+        self.cancelled = False
+        self.done = False
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(work,), name=title.lower(), daemon=True)
+        self._thread.start()
+
+    def _run(self, work):
+        try:
+            self.result = work(self)
+        except JobCancelled:
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+        self.done = True
+
+    def progress(self, rows: int, bytes_done: int, rate: float = 0.0):
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.rows = rows
+        self.bytes = bytes_done
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def fraction(self) -> Optional[float]:
+        if self.total_rows:
+            return min(self.rows / self.total_rows, 1.0)
+        if self.total_bytes:
+            return min(self.bytes / self.total_bytes, 1.0)
+        return None
+
+
 class ModernDatabaseApp:
-    def __init__(self, root, database: Database):
+    # The row grid is virtual: the Treeview only holds items for the rows in
+    # view, refilled from a slice of the table whenever the view scrolls
+    ROW_HEIGHT = 25
+    HEADING_HEIGHT = 25
+    # Rows fetched past each edge of the viewport, so small scrolls reuse them
+    ROW_BUFFER = 50
+    # Searches start once typing pauses this long, run on a worker thread and
+    # are picked up by the Tk loop every SEARCH_POLL_MS
+    SEARCH_DELAY_MS = 250
+    SEARCH_POLL_MS = 50
+    SEARCH_BATCH = 5000
+    # Saves and loads run on a worker thread, polled this often
+    JOB_POLL_MS = 100
+    AUTOSAVE_MS = 5 * 60 * 1000
+
+    def __init__(self, root, database: Database, filepath: Optional[str] = None):
         self.root = root
         self.database = database
+        # File last saved or loaded, which autosave writes to
+        self.filepath = filepath
         
         # Configure the root window
         self.root.geometry("1200x800")
@@ -26,7 +100,7 @@ class ModernDatabaseApp:
         
         # Style configuration
         style = ttk.Style()
-        style.configure('Treeview', rowheight=25)
+        style.configure('Treeview', rowheight=self.ROW_HEIGHT)
         style.configure('TButton', padding=5)
         style.configure('Treeview.Heading', font=('Arial', 9))
         
@@ -47,8 +121,15 @@ class ModernDatabaseApp:
         ttk.Button(self.buttons_frame, text="New Table", command=self.show_create_table_dialog).pack(fill=tk.X, pady=2)
         ttk.Button(self.buttons_frame, text="Delete Table", command=self.delete_table).pack(fill=tk.X, pady=2)
         ttk.Button(self.buttons_frame, text="Show Schema", command=self.show_schema).pack(fill=tk.X, pady=2)
-        ttk.Button(self.buttons_frame, text="Save Database", command=self.save).pack(fill=tk.X, pady=2)
-        ttk.Button(self.buttons_frame, text="Load Database", command=self.load).pack(fill=tk.X, pady=2)
+        self.save_button = ttk.Button(self.buttons_frame, text="Save Database", command=self.save)
+        self.save_button.pack(fill=tk.X, pady=2)
+        self.load_button = ttk.Button(self.buttons_frame, text="Load Database", command=self.load)
+        self.load_button.pack(fill=tk.X, pady=2)
+        ttk.Button(self.buttons_frame, text="Performance", command=self.show_performance).pack(fill=tk.X, pady=2)
+        self.autosave_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.buttons_frame, text=f"Autosave every {self.AUTOSAVE_MS // 60000} min",
+                        variable=self.autosave_var, command=self.toggle_autosave).pack(anchor=tk.W, pady=2)
+        self.autosave_after = None
         
         # Right side - table view
         self.table_frame = ttk.Frame(self.right_frame)
@@ -73,19 +154,58 @@ class ModernDatabaseApp:
         self.search_entry = ttk.Entry(self.search_frame, textvariable=self.search_var)
         self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
         self.search_var.trace('w', self.on_search)
+        self.search_status = ttk.Label(self.search_frame, width=18)
+        self.search_status.pack(side=tk.RIGHT, padx=5)
+        self.search_spinner = ttk.Progressbar(self.search_frame, mode='indeterminate', length=60)
+        # Pending debounce timer and the cancel flag of the running search
+        self.search_after = None
+        self.search_cancel = None
         
+        # Progress of a running save or load, shown below the table while it runs
+        self.job = None
+        self.job_frame = ttk.Frame(self.right_frame)
+        self.job_label = ttk.Label(self.job_frame)
+        self.job_label.pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.job_frame, text="Cancel", command=self.cancel_job).pack(side=tk.RIGHT, padx=5)
+        self.job_progress = ttk.Progressbar(self.job_frame, length=300)
+        self.job_progress.pack(side=tk.RIGHT, padx=5)
+        self.job_status = ttk.Label(self.right_frame)
+        self.job_status.pack(side=tk.BOTTOM, anchor=tk.W, before=self.table_frame)
+
         # Table view
         self.table_view = ttk.Treeview(self.table_frame, selectmode='browse')
         self.table_view.pack(fill=tk.BOTH, expand=True)
         
-        # Scrollbars for table view
-        self.vsb = ttk.Scrollbar(self.table_frame, orient="vertical", command=self.table_view.yview)
+        # Scrollbars for table view; the vertical one moves through the rows
+        # being shown rather than through Treeview items
+        self.vsb = ttk.Scrollbar(self.table_frame, orient="vertical", command=self.on_vertical_scroll)
         self.vsb.pack(side=tk.RIGHT, fill=tk.Y)
         self.hsb = ttk.Scrollbar(self.table_frame, orient="horizontal", command=self.table_view.xview)
         self.hsb.pack(side=tk.BOTTOM, fill=tk.X)
-        self.table_view.configure(yscrollcommand=self.vsb.set, xscrollcommand=self.hsb.set)
+        self.table_view.configure(xscrollcommand=self.hsb.set)
+        self.table_view.bind('<Configure>', lambda event: self.render_rows())
+        self.table_view.bind('<<TreeviewSelect>>', self.on_row_select)
+        self.table_view.bind('<MouseWheel>', self.on_mouse_wheel)
+        self.table_view.bind('<Button-4>', self.on_mouse_wheel)
+        self.table_view.bind('<Button-5>', self.on_mouse_wheel)
+        self.table_view.bind('<Up>', lambda event: self.move_selection(-1))
+        self.table_view.bind('<Down>', lambda event: self.move_selection(1))
+        self.table_view.bind('<Prior>', lambda event: self.scroll_rows(-self.visible_row_count()))
+        self.table_view.bind('<Next>', lambda event: self.scroll_rows(self.visible_row_count()))
+        self.table_view.bind('<Home>', lambda event: self.scroll_rows(-len(self.view_rows)))
+        self.table_view.bind('<End>', lambda event: self.scroll_rows(len(self.view_rows)))
         
         self.current_table = None
+        # Rows being shown (the table's rows or search results) and the first one in view
+        self.view_rows = ()
+        self.first_row = 0
+        # Slice of view_rows around the viewport, starting at window_start
+        self.window_start = 0
+        self.window = []
+        # Treeview item -> id of the row it displays
+        self.row_ids = {}
+        # Kept by id, so the selection survives its row scrolling out of view
+        self.selected_id = None
         self.refresh_table_list()
 
     def show_schema(self):
@@ -111,13 +231,12 @@ class ModernDatabaseApp:
             messagebox.showwarning("Warning", "Please select a table first")
             return
             
-        selection = self.table_view.selection()
-        if not selection:
+        if self.selected_id is None or self.current_table.get_by_id(self.selected_id) is None:
             messagebox.showwarning("Warning", "Please select a row to edit")
             return
             
-        row_id = self.table_view.index(selection[0])
-        row_data = self.current_table.rows[row_id].data
+        row_id = self.selected_id
+        row_data = self.current_table.get_by_id(row_id).data
         
         dialog = EditRowDialog(self.root, self.current_table, row_id, row_data)
         self.root.wait_window(dialog)
@@ -151,6 +270,8 @@ class ModernDatabaseApp:
             return
         table_name = self.table_list.item(selection[0])['text']
         self.current_table = self.database.tables[table_name]
+        self.first_row = 0
+        self.selected_id = None
         self.refresh_table_view()
 
     def refresh_table_list(self):
@@ -159,40 +280,127 @@ class ModernDatabaseApp:
             self.table_list.insert('', 'end', text=table_name)
 
     def refresh_table_view(self):
+        self.cancel_search()
         if not self.current_table:
             self.table_view['columns'] = ()
-            for item in self.table_view.get_children():
-                self.table_view.delete(item)
+            self.show_rows(())
             return
             
-        # Configure columns
-        self.table_view['columns'] = tuple(self.current_table.schema.keys())
-        self.table_view['show'] = 'headings'
-        
-        for col in self.current_table.schema.keys():
-            field = self.current_table.schema[col]
-            # Create a compact header format
-            if field.type == 'enum':
-                enum_values = ', '.join(field.enum_values)
-                if len(enum_values) > 20:  # Truncate long enum lists
-                    enum_values = enum_values[:17] + "..."
-                header_text = f"{col} [{field.type}: {enum_values}]"
+        with instrumentation.phase("ModernDatabaseApp.refresh_table_view.columns"):
+            # Configure columns
+            self.table_view['columns'] = tuple(self.current_table.schema.keys())
+            self.table_view['show'] = 'headings'
+
+            for col in self.current_table.schema.keys():
+                field = self.current_table.schema[col]
+                # Create a compact header format
+                if field.type == 'enum':
+                    enum_values = ', '.join(field.enum_values)
+                    if len(enum_values) > 20:  # Truncate long enum lists
+                        enum_values = enum_values[:17] + "..."
+                    header_text = f"{col} [{field.type}: {enum_values}]"
+                else:
+                    header_text = f"{col} [{field.type}]"
+
+                self.table_view.heading(col, text=header_text)
+                # Set minimum width based on content and type
+                min_width = max(len(header_text) * 8, 100)
+                self.table_view.column(col, width=min_width, minwidth=min_width)
+
+        with instrumentation.phase("ModernDatabaseApp.refresh_table_view.rows"):
+            self.show_rows(self.current_table.rows)
+
+    def show_rows(self, rows):
+        # rows is any sequence of Row supporting len() and slicing
+        self.view_rows = rows
+        self.window_start = 0
+        self.window = []
+        self.render_rows()
+
+    def visible_row_count(self) -> int:
+        return max(1, (self.table_view.winfo_height() - self.HEADING_HEIGHT) // self.ROW_HEIGHT)
+
+    def fetch_rows(self, start: int, stop: int) -> List[Row]:
+        stop = min(stop, len(self.view_rows))
+        if start < self.window_start or stop > self.window_start + len(self.window):
+            self.window_start = max(0, start - self.ROW_BUFFER)
+            self.window = self.view_rows[self.window_start:stop + self.ROW_BUFFER]
+        offset = start - self.window_start
+        return self.window[offset:offset + stop - start]
+
+    def render_rows(self):
+        # Refills the fixed set of Treeview items from the rows now in view;
+        # the cost depends on the viewport height, not on the number of rows
+        total = len(self.view_rows)
+        visible = self.visible_row_count()
+        self.first_row = max(0, min(self.first_row, total - visible))
+        with instrumentation.phase("ModernDatabaseApp.render_rows.fetch"):
+            rows = self.fetch_rows(self.first_row, self.first_row + visible)
+        items = self.table_view.get_children()
+        if len(items) > len(rows):
+            self.table_view.delete(*items[len(rows):])
+        columns = list(self.current_table.schema.keys()) if self.current_table else []
+        self.row_ids = {}
+        selected = None
+        for i, row in enumerate(rows):
+            values = [str(row.data.get(field, '')) for field in columns]
+            if i < len(items):
+                item = items[i]
+                self.table_view.item(item, values=values)
             else:
-                header_text = f"{col} [{field.type}]"
-                
-            self.table_view.heading(col, text=header_text)
-            # Set minimum width based on content and type
-            min_width = max(len(header_text) * 8, 100)
-            self.table_view.column(col, width=min_width, minwidth=min_width)
-        
-        # Clear existing items
-        for item in self.table_view.get_children():
-            self.table_view.delete(item)
-        
-        # Add rows
-        for row in self.current_table.rows:
-            values = [str(row.data.get(field, '')) for field in self.current_table.schema.keys()]
-            self.table_view.insert('', 'end', values=values)
+                item = self.table_view.insert('', 'end', values=values)
+            self.row_ids[item] = row.data['id']
+            if row.data['id'] == self.selected_id:
+                selected = item
+        if selected is not None:
+            self.table_view.selection_set(selected)
+        elif self.table_view.selection():
+            self.table_view.selection_remove(*self.table_view.selection())
+        if total:
+            self.vsb.set(self.first_row / total, (self.first_row + len(rows)) / total)
+        else:
+            self.vsb.set(0, 1)
+
+    def scroll_rows(self, count: int):
+        self.first_row += count
+        self.render_rows()
+        return "break"
+
+    def on_vertical_scroll(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.first_row = int(float(amount) * len(self.view_rows))
+            self.render_rows()
+        elif unit == 'pages':
+            self.scroll_rows(int(amount) * self.visible_row_count())
+        else:
+            self.scroll_rows(int(amount))
+
+    def on_mouse_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            return self.scroll_rows(-3)
+        return self.scroll_rows(3)
+
+    def on_row_select(self, event):
+        # Items scrolled out of view drop their selection; that isn't the user deselecting
+        selection = self.table_view.selection()
+        if selection and selection[0] in self.row_ids:
+            self.selected_id = self.row_ids[selection[0]]
+
+    def move_selection(self, step: int):
+        # Arrow keys past the first/last item in view scroll the grid
+        items = self.table_view.get_children()
+        if not items:
+            return "break"
+        selection = self.table_view.selection()
+        index = items.index(selection[0]) + step if selection else 0
+        if index < 0 or index >= len(items):
+            self.scroll_rows(step)
+            items = self.table_view.get_children()
+            index = max(0, min(index, len(items) - 1))
+        self.selected_id = self.row_ids[items[index]]
+        self.table_view.selection_set(items[index])
+        self.table_view.focus(items[index])
+        return "break"
 
     def add_row(self):
         if not self.current_table:
@@ -206,14 +414,13 @@ class ModernDatabaseApp:
         if not self.current_table:
             messagebox.showwarning("Warning", "Please select a table first")
             return
-        selection = self.table_view.selection()
-        if not selection:
+        if self.selected_id is None or self.current_table.get_by_id(self.selected_id) is None:
             messagebox.showwarning("Warning", "Please select a row to delete")
             return
         if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete the selected row?"):
-            row_id = self.table_view.index(selection[0])
             try:
-                self.current_table.delete_row(row_id)
+                self.current_table.delete_by_id(self.selected_id)
+                self.selected_id = None
                 self.refresh_table_view()
             except Exception as e:
                 messagebox.showerror("Error", str(e))
@@ -235,49 +442,220 @@ class ModernDatabaseApp:
         self.refresh_table_view()
 
     def on_search(self, *args):
-        if not self.current_table or not self.search_var.get():
+        # Restart the debounce timer on every keystroke
+        if self.search_after is not None:
+            self.root.after_cancel(self.search_after)
+        self.search_after = self.root.after(self.SEARCH_DELAY_MS, self.start_search)
+
+    def start_search(self):
+        self.search_after = None
+        search_text = self.search_var.get()
+        if not self.current_table or not search_text:
             self.refresh_table_view()
             return
-            
-        search_text = self.search_var.get()
-        matching_rows = self.current_table.find_rows(search_text)
-        
-        # Clear existing items
-        for item in self.table_view.get_children():
-            self.table_view.delete(item)
-        
-        # Add matching rows
-        for row in matching_rows:
-            values = [str(row.data.get(field, '')) for field in self.current_table.schema.keys()]
-            self.table_view.insert('', 'end', values=values)
+        self.cancel_search()
+        try:
+            re.compile(search_text)
+        except re.error:
+            self.search_status.config(text="Invalid pattern")
+            return
+
+        cancel = threading.Event()
+        results = queue.Queue()
+        table = self.current_table
+
+        def search():
+            try:
+                for rows in table.iter_find(search_text, self.SEARCH_BATCH):
+                    if cancel.is_set():
+                        return
+                    results.put(rows)
+            except Exception as e:
+                results.put(e)
+            results.put(None)
+
+        self.search_cancel = cancel
+        threading.Thread(target=search, name="search", daemon=True).start()
+        self.first_row = 0
+        self.show_rows([])
+        self.search_status.config(text="Searching...")
+        self.search_spinner.pack(side=tk.RIGHT)
+        self.search_spinner.start(10)
+        self.root.after(self.SEARCH_POLL_MS, self.poll_search, cancel, results)
+
+    def poll_search(self, cancel: threading.Event, results: queue.Queue):
+        # Moves whatever the worker found so far into the view
+        if cancel.is_set():
+            return
+        found = len(self.view_rows)
+        done = False
+        while not done:
+            try:
+                rows = results.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(rows, Exception):
+                messagebox.showerror("Error", f"Search failed: {rows}")
+                done = True
+            elif rows is None:
+                done = True
+            else:
+                self.view_rows.extend(rows)
+        if len(self.view_rows) != found:
+            self.render_rows()
+        if done:
+            self.stop_spinner()
+            self.search_cancel = None
+            self.search_status.config(text=f"{len(self.view_rows):,} matches")
+        else:
+            self.search_status.config(text=f"Searching... {len(self.view_rows):,}")
+            self.root.after(self.SEARCH_POLL_MS, self.poll_search, cancel, results)
+
+    def cancel_search(self):
+        if self.search_cancel is not None:
+            self.search_cancel.set()
+            self.search_cancel = None
+        self.stop_spinner()
+        self.search_status.config(text="")
+
+    def stop_spinner(self):
+        self.search_spinner.stop()
+        self.search_spinner.pack_forget()
+
+    def show_performance(self):
+        PerformanceDialog(self.root)
 
     def save(self):
         filepath = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON Files", "*.json")],
+            filetypes=[("JSON Files", "*.json"), ("Binary Database Files", "*.dmbs"),
+                       ("Segmented Database Files", "*.dmbm")],
             title="Save Database"
         )
         if filepath:
-            try:
-                self.database.save_to_disk(filepath)
-                messagebox.showinfo("Success", "Database saved successfully!")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save database: {str(e)}")
+            self.start_save(filepath)
+
+    def start_save(self, filepath: str, autosave: bool = False):
+        database = self.database
+
+        def work(job: BackgroundJob):
+            # Counting here decodes tables not read yet off the Tk thread
+            job.total_rows = sum(table.row_count for table in list(database.tables.values()))
+            database.save_to_disk(filepath, progress=job.progress)
+
+        def finish(job: BackgroundJob):
+            if job.error is not None:
+                if autosave:
+                    self.job_status.config(text=f"Autosave failed: {job.error}")
+                else:
+                    messagebox.showerror("Error", f"Failed to save database: {str(job.error)}")
+            elif job.cancelled:
+                self.job_status.config(text="Save cancelled")
+            else:
+                self.filepath = filepath
+                if autosave:
+                    self.job_status.config(text=f"Autosaved at {time.strftime('%H:%M:%S')}")
+                else:
+                    self.job_status.config(text="")
+                    messagebox.showinfo("Success", "Database saved successfully!")
+
+        self.start_job(BackgroundJob("Autosaving" if autosave else "Saving", work), finish)
 
     def load(self):
         filepath = filedialog.askopenfilename(
-            filetypes=[("JSON Files", "*.json")],
+            filetypes=[("Database Files", "*.json *.dmbs *.dmbm"), ("JSON Files", "*.json"),
+                       ("Binary Database Files", "*.dmbs"), ("Segmented Database Files", "*.dmbm")],
             title="Load Database"
         )
         if filepath:
-            try:
-                self.database.load_from_disk(filepath)
-                self.refresh_table_list()
+            self.start_load(filepath)
+
+    def start_load(self, filepath: str):
+        # Loads into a Database of its own, so the tables on screen stay
+        # usable meanwhile and are swapped for the loaded ones in one step
+        def work(job: BackgroundJob):
+            streamed = not binary_format.is_binary_file(filepath) and not segments.is_manifest(filepath)
+            if streamed:
+                job.total_bytes = os.path.getsize(filepath)
+            loaded = Database()
+            loaded.load_from_disk(filepath, job.progress)
+            # Binary tables decode on first use; do that here too
+            rows = 0
+            for table in loaded.tables.values():
+                rows += table.row_count
+                job.progress(rows, job.bytes)
+            return loaded.tables
+
+        def finish(job: BackgroundJob):
+            if job.error is not None:
+                messagebox.showerror("Error", f"Failed to load database: {str(job.error)}")
+            elif job.cancelled:
+                self.job_status.config(text="Load cancelled")
+            else:
+                self.cancel_search()
+                self.database.replace_tables(job.result)
+                self.filepath = filepath
                 self.current_table = None
+                self.refresh_table_list()
                 self.refresh_table_view()
+                self.job_status.config(text="")
                 messagebox.showinfo("Success", "Database loaded successfully!")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load database: {str(e)}")
+
+        self.start_job(BackgroundJob("Loading", work), finish)
+
+    def start_job(self, job: BackgroundJob, finish: Callable[[BackgroundJob], None]):
+        # One save or load at a time
+        self.job = job
+        self.save_button.config(state=tk.DISABLED)
+        self.load_button.config(state=tk.DISABLED)
+        self.job_status.config(text="")
+        self.job_label.config(text=f"{job.title}...")
+        self.job_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=(5, 0), before=self.job_status)
+        self.root.after(self.JOB_POLL_MS, self.poll_job, job, finish)
+
+    def poll_job(self, job: BackgroundJob, finish: Callable[[BackgroundJob], None]):
+        if not job.done:
+            fraction = job.fraction
+            if fraction is None:
+                if str(self.job_progress['mode']) != 'indeterminate':
+                    self.job_progress.config(mode='indeterminate')
+                    self.job_progress.start(10)
+            else:
+                self.job_progress.stop()
+                self.job_progress.config(mode='determinate', value=fraction * 100)
+            self.job_label.config(text=f"{job.title}... {job.rows:,} rows, {job.bytes / 2 ** 20:,.1f} MB")
+            self.root.after(self.JOB_POLL_MS, self.poll_job, job, finish)
+            return
+        self.job = None
+        self.job_progress.stop()
+        self.job_progress.config(mode='determinate', value=0)
+        self.job_frame.pack_forget()
+        self.save_button.config(state=tk.NORMAL)
+        self.load_button.config(state=tk.NORMAL)
+        finish(job)
+
+    def cancel_job(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.job_label.config(text=f"{self.job.title}... cancelling")
+
+    def toggle_autosave(self):
+        if self.autosave_after is not None:
+            self.root.after_cancel(self.autosave_after)
+            self.autosave_after = None
+        if not self.autosave_var.get():
+            return
+        if self.filepath is None:
+            messagebox.showinfo("Autosave", "Save the database once to choose the file autosave writes to.")
+            self.autosave_var.set(False)
+            return
+        self.autosave_after = self.root.after(self.AUTOSAVE_MS, self.autosave)
+
+    def autosave(self):
+        # A save still running when the timer fires is left to finish
+        self.autosave_after = self.root.after(self.AUTOSAVE_MS, self.autosave)
+        if self.job is None and self.filepath is not None:
+            self.start_save(self.filepath, autosave=True)
 
 
 class CreateTableDialog(tk.Toplevel):
@@ -295,6 +673,12 @@ class CreateTableDialog(tk.Toplevel):
         self.name_entry = ttk.Entry(name_frame)
         self.name_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         
+        # Storage layout
+        ttk.Label(name_frame, text="Storage:").pack(side=tk.LEFT)
+        self.storage_var = tk.StringVar(value="rows")
+        ttk.Combobox(name_frame, textvariable=self.storage_var, values=("rows", "columnar"),
+                     state="readonly", width=10).pack(side=tk.LEFT, padx=5)
+        
         # Columns frame
         columns_frame = ttk.Frame(self)
         columns_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -348,7 +732,7 @@ class CreateTableDialog(tk.Toplevel):
                 return
         
         try:
-            self.database.create_table(table_name, schema)
+            self.database.create_table(table_name, schema, self.storage_var.get())
             self.destroy()
         except Exception as e:
             messagebox.showerror("Error", str(e))
@@ -574,7 +958,7 @@ class EditRowDialog(tk.Toplevel):
                 return
         
         try:
-            self.table.edit_row(self.row_id, row_data)
+            self.table.edit_by_id(self.row_id, row_data)
             self.destroy()
         except Exception as e:
             messagebox.showerror("Error", str(e))
@@ -595,4 +979,85 @@ class SchemaDialog(tk.Toplevel):
         text_widget.configure(state='disabled')
         
         # Close button
-        ttk.Button(self, text="Close", command=self.destroy).pack(pady=5)
\ No newline at end of file
+        ttk.Button(self, text="Close", command=self.destroy).pack(pady=5)
+
+
+class PerformanceDialog(tk.Toplevel):
+    # Live view of instrumentation.stats(), refreshed every REFRESH_MS
+    REFRESH_MS = 1000
+    COLUMNS = ("operation", "count", "total ms", "p50 ms", "p99 ms", "max ms")
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Performance")
+        self.geometry("760x480")
+
+        controls = ttk.Frame(self)
+        controls.pack(fill=tk.X, padx=10, pady=5)
+        self.enabled_var = tk.BooleanVar(value=instrumentation.enabled())
+        ttk.Checkbutton(controls, text="Collect statistics", variable=self.enabled_var,
+                        command=self.toggle).pack(side=tk.LEFT)
+        ttk.Button(controls, text="Reset", command=self.reset).pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(controls, text="Profile next").pack(side=tk.LEFT, padx=(20, 2))
+        self.count_var = tk.IntVar(value=20)
+        ttk.Spinbox(controls, from_=1, to=10000, width=6, textvariable=self.count_var).pack(side=tk.LEFT)
+        ttk.Label(controls, text="operations with").pack(side=tk.LEFT, padx=2)
+        self.mode_var = tk.StringVar(value=instrumentation.PROFILE_MODES[0])
+        ttk.Combobox(controls, textvariable=self.mode_var, values=instrumentation.PROFILE_MODES,
+                     state="readonly", width=10).pack(side=tk.LEFT)
+        ttk.Button(controls, text="Start...", command=self.profile).pack(side=tk.LEFT, padx=5)
+        self.status = ttk.Label(self)
+        self.status.pack(fill=tk.X, padx=10)
+
+        self.view = ttk.Treeview(self, columns=self.COLUMNS, show='headings')
+        for column in self.COLUMNS:
+            self.view.heading(column, text=column)
+            self.view.column(column, width=300 if column == "operation" else 80,
+                             anchor=tk.W if column == "operation" else tk.E)
+        self.view.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        ttk.Button(self, text="Close", command=self.destroy).pack(pady=5)
+        self.refresh()
+
+    def toggle(self):
+        if self.enabled_var.get():
+            instrumentation.enable()
+        else:
+            instrumentation.disable()
+
+    def reset(self):
+        instrumentation.reset()
+        self.refresh()
+
+    def profile(self):
+        cprofile = self.mode_var.get() == "cprofile"
+        filepath = filedialog.asksaveasfilename(
+            parent=self,
+            defaultextension=".prof" if cprofile else ".txt",
+            filetypes=[("cProfile Files", "*.prof")] if cprofile else [("Collapsed Stacks", "*.txt")],
+            title="Save Profile"
+        )
+        if not filepath:
+            return
+        try:
+            instrumentation.profile_next(self.count_var.get(), filepath, self.mode_var.get())
+        except (ValueError, tk.TclError) as e:
+            messagebox.showerror("Error", str(e), parent=self)
+            return
+        self.enabled_var.set(True)
+
+    def refresh(self):
+        if not self.winfo_exists():
+            return
+        self.view.delete(*self.view.get_children())
+        for name, stat in instrumentation.stats().items():
+            self.view.insert('', 'end', values=(
+                name, stat["count"], f"{stat['total'] * 1000:.1f}", f"{stat['p50'] * 1000:.2f}",
+                f"{stat['p99'] * 1000:.2f}", f"{stat['max'] * 1000:.2f}"))
+        self.status.configure(text="Profiling..." if instrumentation.profiling() else "")
+        self.after(self.REFRESH_MS, self.refresh)
+
+
+instrumentation.register(ModernDatabaseApp, (
+    "refresh_table_list", "refresh_table_view", "render_rows", "on_table_select", "start_search", "poll_search",
+))
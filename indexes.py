@@ -0,0 +1,300 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+_key = itemgetter(0)
+
+
+class HashIndex:
+    # value -> slots holding it; answers equality only
+    kind = "hash"
+    operators = ("=", "==")
+
+    def __init__(self, column: str):
+        self.column = column
+        self._buckets: Dict[object, Set[int]] = {}
+
+    def build(self, entries: Iterable[Tuple[int, object]]):
+        self._buckets = {}
+        for slot, value in entries:
+            self.add(value, slot)
+
+    def add(self, value, slot: int):
+        bucket = self._buckets.get(value)
+        if bucket is None:
+            self._buckets[value] = {slot}
+        else:
+            bucket.add(slot)
+
+    def add_many(self, entries: Iterable[Tuple[int, object]]):
+        for slot, value in entries:
+            self.add(value, slot)
+
+    def remove(self, value, slot: int):
+        bucket = self._buckets.get(value)
+        if bucket is not None:
+            bucket.discard(slot)
+            if not bucket:
+                del self._buckets[value]
+
+    def lookup(self, op: str, value) -> Optional[List[int]]:
+        if op not in self.operators:
+            return None
+        return list(self._buckets.get(value, ()))
+
+    def estimate(self, op: str, value) -> Optional[int]:
+        if op not in self.operators:
+            return None
+        return len(self._buckets.get(value, ()))
+
+
+class SortedIndex:
+    # (value, slot) pairs kept in order; answers equality and range lookups.
+    # None is not orderable, so empty cells are left out of the index.
+    kind = "sorted"
+    operators = ("=", "==", "<", "<=", ">", ">=")
+
+    def __init__(self, column: str):
+        self.column = column
+        self._entries: List[Tuple[object, int]] = []
+
+    def build(self, entries: Iterable[Tuple[int, object]]):
+        self._entries = sorted((value, slot) for slot, value in entries if value is not None)
+
+    def add(self, value, slot: int):
+        if value is not None:
+            insort(self._entries, (value, slot))
+
+    def add_many(self, entries: Iterable[Tuple[int, object]]):
+        # Sorting the appended run is cheaper than one insort per entry
+        self._entries.extend((value, slot) for slot, value in entries if value is not None)
+        self._entries.sort()
+
+    def remove(self, value, slot: int):
+        if value is None:
+            return
+        i = bisect_left(self._entries, (value, slot))
+        if i < len(self._entries) and self._entries[i] == (value, slot):
+            del self._entries[i]
+
+    def _bounds(self, op: str, value) -> Tuple[int, int]:
+        try:
+            return self._search(op, value)
+        except TypeError:
+            raise ValueError(f"Type mismatch: can't compare {self.column} {op} {value!r}") from None
+
+    def _search(self, op: str, value) -> Tuple[int, int]:
+        entries = self._entries
+        if op in ("=", "=="):
+            return bisect_left(entries, value, key=_key), bisect_right(entries, value, key=_key)
+        if op == "<":
+            return 0, bisect_left(entries, value, key=_key)
+        if op == "<=":
+            return 0, bisect_right(entries, value, key=_key)
+        if op == ">":
+            return bisect_right(entries, value, key=_key), len(entries)
+        return bisect_left(entries, value, key=_key), len(entries)
+
+    def lookup(self, op: str, value) -> Optional[List[int]]:
+        if op not in self.operators or value is None:
+            return None
+        lo, hi = self._bounds(op, value)
+        return [slot for _, slot in self._entries[lo:hi]]
+
+    def estimate(self, op: str, value) -> Optional[int]:
+        # Number of slots lookup() would return, without building the list
+        if op not in self.operators or value is None:
+            return None
+        lo, hi = self._bounds(op, value)
+        return hi - lo
+
+    def __len__(self):
+        return len(self._entries)
+
+    def ordered(self, descending: bool = False) -> Iterator[int]:
+        # Slots by value; equal values stay in slot order either way
+        entries = self._entries
+        if not descending:
+            for _, slot in entries:
+                yield slot
+            return
+        hi = len(entries)
+        while hi > 0:
+            lo = bisect_left(entries, entries[hi - 1][0], 0, hi, key=_key)
+            for _, slot in entries[lo:hi]:
+                yield slot
+            hi = lo
+
+
+def fold_case(text: str) -> str:
+    # casefold() agrees with re.IGNORECASE for every ASCII character except 'i',
+    # which the regex engine also matches against the Turkish dotted/dotless i
+    return text.casefold().replace("\u0131", "i").replace("i\u0307", "i")
+
+
+def required_literals(pattern: str) -> Optional[List[str]]:
+    # ASCII runs that every match of the pattern must contain, or None when the
+    # pattern uses alternation or groups and can't be decomposed this simply.
+    # Dropping a character is always safe (it only weakens the filter), so
+    # anything not obviously literal just ends the current run.
+    literals = []
+    current = []
+
+    def flush():
+        if current:
+            literals.append("".join(current))
+            current.clear()
+
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c in "|()":
+            return None
+        if c == "\\":
+            if i + 1 >= len(pattern):
+                return None
+            c = pattern[i + 1]
+            i += 2
+            if c in "xuUN" or c.isdigit():
+                # Numeric character escapes and backreferences
+                return None
+            if c.isalnum() or c == "_":
+                # Character class or assertion
+                flush()
+                continue
+        elif c == "[":
+            flush()
+            i += 1
+            if i < len(pattern) and pattern[i] == "^":
+                i += 1
+            if i < len(pattern) and pattern[i] == "]":
+                i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            if i >= len(pattern):
+                return None
+            i += 1
+            continue
+        elif c in ".^$":
+            flush()
+            i += 1
+            continue
+        elif c in "*?{":
+            # The previous character may occur zero times
+            if current:
+                current.pop()
+            flush()
+            if c == "{":
+                end = pattern.find("}", i)
+                if end == -1:
+                    break
+                i = end + 1
+            else:
+                i += 1
+            continue
+        elif c == "+":
+            flush()
+            i += 1
+            continue
+        else:
+            i += 1
+        if c.isascii():
+            current.append(c)
+        else:
+            flush()
+    flush()
+    return [fold_case(literal) for literal in literals]
+
+
+class TrigramIndex:
+    # Inverted index from every 3-character substring of a row's cells to the
+    # slots containing it. It only narrows candidates; find_rows still runs the
+    # regex on them, so postings may go stale: deleted slots are filtered by
+    # the table and edited slots simply gain new postings until the next rebuild.
+    kind = "trigram"
+
+    def __init__(self):
+        self._postings: Dict[str, array] = {}
+        # Trigrams every row is known to contain (e.g. "None" of a newly added column)
+        self._universal: Set[str] = set()
+        self._size = 0
+        self._stale = 0
+
+    @staticmethod
+    def trigrams(values: Iterable) -> Set[str]:
+        grams = set()
+        for value in values:
+            text = fold_case(str(value))
+            grams.update(text[i:i + 3] for i in range(len(text) - 2))
+        return grams
+
+    def build(self, entries: Iterable[Tuple[int, Iterable]]):
+        self._postings = {}
+        self._universal = set()
+        self._size = 0
+        self._stale = 0
+        for slot, values in entries:
+            self.add(slot, values)
+
+    def add(self, slot: int, values: Iterable):
+        postings = self._postings
+        for gram in self.trigrams(values):
+            posting = postings.get(gram)
+            if posting is None:
+                postings[gram] = array("i", (slot,))
+            else:
+                posting.append(slot)
+        self._size += 1
+
+    def update(self, slot: int, values: Iterable):
+        # The old postings stay behind as false positives
+        self.add(slot, values)
+        self._size -= 1
+        self._stale += 1
+
+    def add_universal(self, value):
+        self._universal.update(self.trigrams((value,)))
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return self._stale > max(1024, self._size)
+
+    def candidates(self, pattern: str) -> Optional[Set[int]]:
+        # Slots that may match, or None when the pattern gives nothing to filter on
+        literals = required_literals(pattern)
+        if literals is None:
+            return None
+        grams = set()
+        for literal in literals:
+            grams.update(literal[i:i + 3] for i in range(len(literal) - 2))
+        grams -= self._universal
+        if not grams:
+            return None
+        postings = []
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            # Re-checking a few candidates with the regex is cheaper than
+            # walking a much longer posting list
+            if len(posting) > 64 * len(result):
+                break
+            result.intersection_update(posting)
+        return result
+
+
+INDEX_TYPES = {
+    HashIndex.kind: HashIndex,
+    SortedIndex.kind: SortedIndex,
+}
+
+
+def create_index(kind: str, column: str):
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {kind}")
+    return INDEX_TYPES[kind](column)
@@ -0,0 +1,251 @@
+import cProfile
+import functools
+import math
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+# Opt-in counters and latency histograms for the operations of Database,
+# Table and the GUI. Modules register the methods worth measuring; enable()
+# wraps them and disable() puts the originals back, so while disabled calls
+# run the original functions and cost nothing extra. Phases inside a few
+# long operations (saving, loading, refreshing the grid) are timed through
+# phase(), which is a shared no-op context while disabled.
+#
+# Latencies go into buckets a quarter of a power of two wide (from one
+# microsecond up), so the percentiles are bucket upper bounds, at most 19%
+# above the true value.
+BUCKETS_PER_OCTAVE = 4
+PROFILE_MODES = ("cprofile", "sampling")
+
+_registered: List[tuple] = []
+# (class, name) -> original function, while enabled
+_originals: Dict[tuple, object] = {}
+_enabled = False
+_lock = threading.Lock()
+_stats: Dict[str, '_Stat'] = {}
+_NULL = nullcontext()
+_depth = threading.local()
+_profiler: Optional['_Profiler'] = None
+
+
+class _Stat:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = Counter()
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        micros = seconds * 1e6
+        self.buckets[int(math.log2(micros) * BUCKETS_PER_OCTAVE) + 1 if micros > 1 else 0] += 1
+
+    def percentile(self, fraction: float) -> float:
+        rank = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** (bucket / BUCKETS_PER_OCTAVE) / 1e6, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+            "histogram": {2 ** (bucket / BUCKETS_PER_OCTAVE) / 1e6: count
+                          for bucket, count in sorted(self.buckets.items())},
+        }
+
+
+def record(name: str, seconds: float):
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = _Stat()
+        stat.add(seconds)
+
+
+def stats() -> Dict[str, dict]:
+    # name -> count, total/mean/p50/p99/max seconds and the histogram as
+    # {bucket upper bound in seconds: count}. Phases are named "operation.phase".
+    with _lock:
+        return {name: stat.summary() for name, stat in sorted(_stats.items())}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+@contextmanager
+def _timed_phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def phase(name: str):
+    # with phase("Database.save_to_disk.serialize"): ...
+    return _timed_phase(name) if _enabled else _NULL
+
+
+def _wrap(label: str, function):
+    @functools.wraps(function)
+    def measured(*args, **kwargs):
+        depth = getattr(_depth, "value", 0)
+        _depth.value = depth + 1
+        profiler = _profiler if depth == 0 else None
+        if profiler is not None and not profiler.start():
+            profiler = None
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(label, time.perf_counter() - started)
+            _depth.value = depth
+            if profiler is not None:
+                profiler.stop()
+    return measured
+
+
+def _patch(cls, names, prefix: str):
+    for name in names:
+        function = cls.__dict__[name]
+        _originals[(cls, name)] = function
+        setattr(cls, name, _wrap(f"{prefix}.{name}", function))
+
+
+def register(cls, names, prefix: Optional[str] = None):
+    # Measures cls.<name> for each name while instrumentation is enabled
+    prefix = prefix or cls.__name__
+    _registered.append((cls, tuple(names), prefix))
+    if _enabled:
+        _patch(cls, names, prefix)
+
+
+def enable():
+    global _enabled
+    if _enabled:
+        return
+    for cls, names, prefix in _registered:
+        _patch(cls, names, prefix)
+    _enabled = True
+
+
+def disable():
+    global _enabled, _profiler
+    if not _enabled:
+        return
+    for (cls, name), function in _originals.items():
+        setattr(cls, name, function)
+    _originals.clear()
+    _enabled = False
+    if _profiler is not None:
+        _profiler.finish()
+
+
+class _Profiler:
+    # Profiles the next `count` outermost measured operations, one at a time:
+    # calls starting on other threads while one is profiled run unprofiled
+    def __init__(self, count: int, path: str, mode: str, interval: float):
+        self.remaining = count
+        self.path = path
+        self.mode = mode
+        self.interval = interval
+        self.profile = cProfile.Profile() if mode == "cprofile" else None
+        self.stacks = Counter()
+        self._sampling: Optional[threading.Event] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._active = False
+        self._finished = False
+
+    def start(self) -> bool:
+        # False if another call holds the profiler or the count is used up
+        with self._lock:
+            if self._active or self._finished or self.remaining <= 0:
+                return False
+            self._active = True
+        if self.profile is not None:
+            self.profile.enable()
+            return True
+        self._sampling = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, args=(threading.get_ident(), self._sampling),
+                                         name="profile sampler", daemon=True)
+        self._sampler.start()
+        return True
+
+    def _sample(self, thread_id: int, done: threading.Event):
+        while not done.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+        else:
+            self._sampling.set()
+            self._sampler.join()
+        with self._lock:
+            self._active = False
+            self.remaining -= 1
+            done = self.remaining <= 0
+        if done:
+            self.finish()
+
+    def finish(self):
+        # cProfile output is for pstats / snakeviz; sampled stacks are written
+        # one per line with their sample count (the flame graph input format)
+        global _profiler
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        if _profiler is self:
+            _profiler = None
+        if self.profile is not None:
+            self.profile.dump_stats(self.path)
+        else:
+            with open(self.path, "w") as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+
+def profile_next(count: int, path: str, mode: str = "cprofile", interval: float = 0.001):
+    # Captures a profile of the next count measured operations into path;
+    # enables instrumentation if it is off
+    global _profiler
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode}")
+    if count < 1:
+        raise ValueError("count must be positive")
+    enable()
+    _profiler = _Profiler(count, path, mode, interval)
+
+
+def profiling() -> bool:
+    return _profiler is not None
@@ -0,0 +1,194 @@
+from itertools import islice
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from database import Row, Table
+from indexes import HashIndex, SortedIndex
+
+# Database.join: equi-joins of two tables on one column each.
+#
+# A hash join reads one side into a dict of value -> slots and probes it with
+# the other side's values. The id column and hash-indexed columns already are
+# such a dict, so nothing has to be built for them. When both columns have a
+# sorted index, the sides are merged in index order instead. Empty cells never
+# match.
+#
+# Result rows hold every column of both tables as "table.column". They are
+# produced a batch at a time with both tables locked, so a batch never sees a
+# half-applied change. A table that changes between two batches ends the join
+# with a RuntimeError, like a dict changed while it is iterated.
+
+JOIN_TYPES = ("inner", "left")
+ALGORITHMS = ("hash", "merge")
+# Result pairs computed per hold of the table locks
+BATCH_ROWS = 1000
+
+
+def _existing_lookup(table: Table, column: str) -> Optional[Callable]:
+    # value -> slots through a hash the table already keeps, or None
+    if column == "id":
+        id_index = table._id_index
+
+        def lookup(value):
+            slot = id_index.get(value)
+            return None if slot is None else (slot,)
+        return lookup
+    index = table._indexes.get(column)
+    if isinstance(index, HashIndex):
+        buckets = index._buckets
+
+        def lookup(value):
+            bucket = buckets.get(value)
+            # Sets don't keep slot order
+            return sorted(bucket) if bucket is not None and len(bucket) > 1 else bucket
+        return lookup
+    return None
+
+
+def _built_lookup(table: Table, column: str) -> Callable:
+    buckets = {}
+    for slot, value in table._live_values(column):
+        if value is not None:
+            bucket = buckets.get(value)
+            if bucket is None:
+                buckets[value] = [slot]
+            else:
+                bucket.append(slot)
+    return buckets.get
+
+
+def _hash_pairs(probe: Table, probe_column: str, build: Table, build_column: str,
+                outer: bool) -> Iterator[Tuple[int, Optional[int]]]:
+    # (probe slot, build slot) pairs in probe order; with outer, unmatched
+    # probe rows pair with None
+    lookup = _existing_lookup(build, build_column) or _built_lookup(build, build_column)
+    for slot, value in probe._live_values(probe_column):
+        matches = None if value is None else lookup(value)
+        if matches:
+            for match in matches:
+                yield slot, match
+        elif outer:
+            yield slot, None
+
+
+def _sorted_entries(table: Table, column: str) -> List[Tuple[object, int]]:
+    # (value, slot) of the non-empty cells, by value and then slot
+    index = table._indexes.get(column)
+    if isinstance(index, SortedIndex):
+        return index._entries
+    return sorted((value, slot) for slot, value in table._live_values(column) if value is not None)
+
+
+def _merge_pairs(left: Table, left_column: str, right: Table, right_column: str,
+                 outer: bool) -> Iterator[Tuple[int, Optional[int]]]:
+    # (left slot, right slot) pairs by join value
+    left_entries = _sorted_entries(left, left_column)
+    right_entries = _sorted_entries(right, right_column)
+    j, right_count = 0, len(right_entries)
+    i, left_count = 0, len(left_entries)
+    while i < left_count:
+        value = left_entries[i][0]
+        while j < right_count and right_entries[j][0] < value:
+            j += 1
+        end = j
+        while end < right_count and right_entries[end][0] == value:
+            end += 1
+        # Every left row with this value pairs with the run right_entries[j:end]
+        while i < left_count and left_entries[i][0] == value:
+            slot = left_entries[i][1]
+            if end > j:
+                for _, match in right_entries[j:end]:
+                    yield slot, match
+            elif outer:
+                yield slot, None
+            i += 1
+        j = end
+    if outer and len(left_entries) < left.row_count:
+        # Empty cells aren't in the order; they match nothing
+        for slot, value in left._live_values(left_column):
+            if value is None:
+                yield slot, None
+
+
+def _plan(left: Table, left_column: str, right: Table, right_column: str, how: str,
+          algorithm: Optional[str]) -> Tuple[str, Callable[[], Iterator]]:
+    # (description, function producing (left slot, right slot) pairs)
+    outer = how == "left"
+    if algorithm is None:
+        left_index = left._indexes.get(left_column)
+        right_index = right._indexes.get(right_column)
+        sorted_both = isinstance(left_index, SortedIndex) and isinstance(right_index, SortedIndex)
+        algorithm = "merge" if sorted_both else "hash"
+    if algorithm == "merge":
+        return "merge", lambda: _merge_pairs(left, left_column, right, right_column, outer)
+    # Build on the side a hash already exists for, else on the smaller one.
+    # A left join has to probe with the left side to see its unmatched rows.
+    build_left = False
+    if not outer:
+        left_ready = _existing_lookup(left, left_column) is not None
+        right_ready = _existing_lookup(right, right_column) is not None
+        if left_ready != right_ready:
+            build_left = left_ready
+        else:
+            build_left = left.row_count < right.row_count
+    if build_left:
+        return "hash, built on the left", lambda: (
+            (slot, match) for match, slot in _hash_pairs(right, right_column, left, left_column, False))
+    return "hash, built on the right", lambda: _hash_pairs(left, left_column, right, right_column, outer)
+
+
+def _rows(database, left: Table, right: Table, pairs: Callable[[], Iterator]) -> Iterator[Row]:
+    left_columns = list(left.schema)
+    right_columns = list(right.schema)
+    left_keys = [f"{left.name}.{column}" for column in left_columns]
+    right_keys = [f"{right.name}.{column}" for column in right_columns]
+    empty_right = dict.fromkeys(right_keys)
+    versions = None
+    source = None
+    while True:
+        # The database lock first, as checkpoint takes it, so two joins or a
+        # join and a checkpoint never wait on each other's table locks
+        with database._lock, left._lock, right._lock:
+            if versions is None:
+                versions = (left._version, right._version)
+                source = pairs()
+            elif versions != (left._version, right._version):
+                raise RuntimeError("Table changed during join")
+            left_get, right_get = left._storage.get, right._storage.get
+            batch = []
+            for left_slot, right_slot in islice(source, BATCH_ROWS):
+                data = dict(zip(left_keys, map(left_get(left_slot).get, left_columns)))
+                if right_slot is None:
+                    data.update(empty_right)
+                else:
+                    data.update(zip(right_keys, map(right_get(right_slot).get, right_columns)))
+                batch.append(Row(data))
+        if not batch:
+            return
+        yield from batch
+
+
+def join(database, left_name: str, right_name: str, on: Tuple[str, str], how: str = "inner",
+         algorithm: Optional[str] = None) -> Iterator[Row]:
+    for name in (left_name, right_name):
+        if name not in database.tables:
+            raise ValueError(f"Table {name} does not exist")
+    if left_name == right_name:
+        raise ValueError("Can't join a table with itself")
+    left, right = database.tables[left_name], database.tables[right_name]
+    left_column, right_column = on
+    for table, column in ((left, left_column), (right, right_column)):
+        if column not in table.schema:
+            raise ValueError(f"Column {column} does not exist in table {table.name}")
+    if how not in JOIN_TYPES:
+        raise ValueError(f"Unknown join type {how}")
+    if algorithm is not None and algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown join algorithm {algorithm}")
+    _, pairs = _plan(left, left_column, right, right_column, how, algorithm)
+    return _rows(database, left, right, pairs)
+
+
+def describe(database, left_name: str, right_name: str, on: Tuple[str, str], how: str = "inner",
+             algorithm: Optional[str] = None) -> str:
+    # The strategy join() would use
+    left, right = database.tables[left_name], database.tables[right_name]
+    return _plan(left, on[0], right, on[1], how, algorithm)[0]
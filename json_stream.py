@@ -0,0 +1,96 @@
+import codecs
+import json
+import re
+from typing import BinaryIO, Iterator
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class JsonStream:
+    # Pull-style reader that walks a JSON document one value at a time, so a
+    # caller can descend into big objects/arrays without parsing them whole.
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, f: BinaryIO):
+        self._file = f
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self.bytes_read = 0
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._file.read(self.CHUNK_SIZE)
+        self.bytes_read += len(chunk)
+        if not chunk:
+            self._eof = True
+        self._buffer = self._buffer[self._pos:] + self._decoder.decode(chunk, final=self._eof)
+        self._pos = 0
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or not self._fill():
+                return
+
+    def peek(self) -> str:
+        self._skip_whitespace()
+        return self._buffer[self._pos:self._pos + 1]
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found {found or 'end of file'!r} in JSON stream")
+        self._pos += 1
+
+    def value(self):
+        # Parses the next complete value. A value that ends exactly at the end of
+        # the buffer may be cut short (e.g. a number), so it is re-read after refilling.
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def keys(self) -> Iterator[str]:
+        # Iterates an object's keys; the caller must consume each key's value
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError("Expected an object key in JSON stream")
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self._pos += 1
+            else:
+                self.expect("}")
+                return
+
+    def elements(self) -> Iterator[None]:
+        # Iterates an array; the caller must consume one value per step
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ",":
+                self._pos += 1
+            else:
+                self.expect("]")
+                return
@@ -1,16 +1,45 @@
-import tkinter as tk
+import argparse
 
 from database import Database
-from db_gui import ModernDatabaseApp
+from protocol import DEFAULT_PORT
 
 if __name__ == "__main__":
-    # Create the main window
-    root = tk.Tk()
-    root.title("Modern Database Manager")
-    
-    # Initialize database and GUI
+    parser = argparse.ArgumentParser(description="Modern Database Manager")
+    parser.add_argument("database", nargs="?", help="JSON or binary (.dmbs) database file to open")
+    parser.add_argument("--wal", action="store_true",
+                        help="log every change next to the database file and replay it on the next start")
+    parser.add_argument("--serve", action="store_true",
+                        help="serve the database to other processes (see client.py) instead of opening the GUI")
+    parser.add_argument("--host", default="127.0.0.1", help="address to serve on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port to serve on")
+    parser.add_argument("--socket", help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--threads", type=int, default=4, help="threads running long requests while serving")
+    args = parser.parse_args()
+    if args.wal and not args.database:
+        parser.error("--wal needs a database file")
+
+    # Initialize database
     database = Database()
-    app = ModernDatabaseApp(root, database)
-    
-    # Start the application event loop
-    root.mainloop()
\ No newline at end of file
+    if args.wal:
+        database.open(args.database, checkpoint_interval=5.0)
+    elif args.database:
+        # Binary files are memory-mapped, so this returns before any table is decoded
+        database.load_from_disk(args.database)
+
+    if args.serve:
+        import server
+        where = args.socket or f"{args.host}:{args.port}"
+        print(f"Serving {args.database or 'an empty database'} on {where}", flush=True)
+        server.serve(database, args.host, args.port, args.socket, args.threads)
+    else:
+        import tkinter as tk
+        from db_gui import ModernDatabaseApp
+
+        # Create the main window
+        root = tk.Tk()
+        root.title("Modern Database Manager")
+        app = ModernDatabaseApp(root, database, args.database)
+
+        # Start the application event loop
+        root.mainloop()
+    database.close()
@@ -0,0 +1,146 @@
+import os
+import re
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+import binary_format
+from database import OPERATORS, Field, Row, Table, _type_mismatch
+from storage import ColumnarStorage
+
+# Scans split a table into chunks of live rows that worker processes evaluate
+# in parallel. The table is exported once per version into a shared memory
+# block laid out like a binary database file; tasks only carry the block's
+# name and their row range, and workers map the block's columns in place.
+
+# Block name -> (block, storage) in a worker; only the latest block is kept
+_attached: Dict[str, tuple] = {}
+
+
+def _storage(name: str) -> ColumnarStorage:
+    entry = _attached.get(name)
+    if entry is None:
+        _attached.clear()
+        block = shared_memory.SharedMemory(name=name)
+        mapped = binary_format.MappedFile.from_buffer(block.buf, name)
+        meta = mapped.footer["tables"][0]
+        length = meta["row_count"]
+        columns = {}
+        for field_meta in meta["schema"]:
+            field = Field.from_dict(field_meta)
+            columns[field.name] = mapped.column(field, meta["columns"][field.name], length)
+        entry = _attached[name] = (block, ColumnarStorage.from_columns(columns, length))
+    return entry[1]
+
+
+def _search_chunk(name: str, start: int, stop: int, pattern: str) -> List[int]:
+    return _storage(name).search(re.compile(pattern, re.IGNORECASE), start, stop)
+
+
+def _where_chunk(name: str, start: int, stop: int, condition: tuple) -> List[int]:
+    column, op, value = condition
+    compare = OPERATORS[op]
+    cells = _storage(name)._columns[column].values(start, stop)
+    try:
+        if op in ("<", "<=", ">", ">="):
+            return [position for position, cell in enumerate(cells, start)
+                    if cell is not None and compare(cell, value)]
+        return [position for position, cell in enumerate(cells, start) if compare(cell, value)]
+    except TypeError:
+        raise _type_mismatch(column, op, value) from None
+
+
+def _release(block: shared_memory.SharedMemory):
+    block.close()
+    block.unlink()
+
+
+class ScanExecutor:
+    # Tables with fewer live rows than threshold are scanned in-process
+    THRESHOLD = 200_000
+    # Smallest chunk handed to a worker
+    CHUNK_ROWS = 50_000
+
+    def __init__(self, workers: Optional[int] = None, threshold: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.threshold = self.THRESHOLD if threshold is None else threshold
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Table -> (version, block, finalizer) of its latest export
+        self._exports = weakref.WeakKeyDictionary()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for _, _, finalizer in list(self._exports.values()):
+            finalizer()
+        self._exports.clear()
+
+    def _parallel(self, table: Table) -> bool:
+        return self.workers > 1 and table.row_count >= self.threshold
+
+    def _export(self, table: Table) -> Optional[str]:
+        # Name of a block holding the table's current data, or None when a
+        # column can't be mapped (values the typed encodings don't hold)
+        cached = self._exports.get(table)
+        if cached is not None:
+            if cached[0] == table._version:
+                return cached[1].name
+            cached[2]()
+            del self._exports[table]
+        buffer = BytesIO()
+        binary_format.write_database({table.name: table}, buffer)
+        data = buffer.getbuffer()
+        meta = binary_format.MappedFile.from_buffer(data).footer["tables"][0]
+        if any(column["encoding"] == "json" for column in meta["columns"].values()):
+            return None
+        block = shared_memory.SharedMemory(create=True, size=len(data))
+        block.buf[:len(data)] = data
+        self._exports[table] = (table._version, block, weakref.finalize(table, _release, block))
+        return block.name
+
+    def _run(self, table: Table, task, argument) -> Optional[List[Row]]:
+        # Chunks are submitted in row order and their results joined in that
+        # order, so rows come back as a sequential scan returns them
+        with table._lock:
+            name = self._export(table)
+            if name is None:
+                return None
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers)
+            count = table.row_count
+            chunk = max(self.CHUNK_ROWS, -(-count // (self.workers * 4)))
+            futures = [self._pool.submit(task, name, start, min(start + chunk, count), argument)
+                       for start in range(0, count, chunk)]
+            rows = table.rows
+            return [rows[position] for future in futures for position in future.result()]
+
+    def find_rows(self, table: Table, pattern: str) -> List[Row]:
+        re.compile(pattern)
+        text_index = table._text_index
+        # A trigram lookup beats scanning in parallel
+        if self._parallel(table) and (text_index is None or text_index.candidates(pattern) is None):
+            rows = self._run(table, _search_chunk, pattern)
+            if rows is not None:
+                return rows
+        return table.find_rows(pattern)
+
+    def where(self, table: Table, column: str, op: str, value) -> List[Row]:
+        if column not in table.schema:
+            raise ValueError(f"Column {column} does not exist")
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator {op}")
+        index = table._indexes.get(column)
+        if self._parallel(table) and (index is None or op not in index.operators):
+            rows = self._run(table, _where_chunk, (column, op, value))
+            if rows is not None:
+                return rows
+        return table.where(column, op, value)
@@ -0,0 +1,187 @@
+import struct
+from typing import List, Tuple
+
+# Wire format shared by server.py and client.py. Every message is a frame:
+#   length   uint32, bytes after this field
+#   id       uint32, chosen by the client and echoed in the response
+#   status   uint8, responses only: OK or ERROR
+#   body     one encoded value
+# A request body is [op, table or None, [arguments]]; an OK response holds
+# the result and an ERROR response the message. Clients may send any number
+# of requests before reading responses (pipelining); a connection's requests
+# run in the order sent.
+#
+# Values are tagged: N None, T/F booleans, i int64, n larger ints as decimal
+# text, d float64, s UTF-8 string, b bytes, l list, m dict, the last four
+# prefixed by a uint32 length or item count.
+OK = 0
+ERROR = 1
+# Largest frame either side accepts
+MAX_FRAME = 1 << 30
+DEFAULT_PORT = 7878
+
+_LENGTH = struct.Struct("<I")
+_REQUEST = struct.Struct("<II")
+_RESPONSE = struct.Struct("<IIB")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_INT_MIN = -(1 << 63)
+_INT_MAX = (1 << 63) - 1
+
+
+def _encode_int(value: int, out: bytearray):
+    if _INT_MIN <= value <= _INT_MAX:
+        out += b"i"
+        out += _INT.pack(value)
+    else:
+        text = str(value).encode("ascii")
+        out += b"n"
+        out += _LENGTH.pack(len(text))
+        out += text
+
+
+def _encode_float(value: float, out: bytearray):
+    out += b"d"
+    out += _FLOAT.pack(value)
+
+
+def _encode_str(value: str, out: bytearray):
+    data = value.encode("utf-8")
+    out += b"s"
+    out += _LENGTH.pack(len(data))
+    out += data
+
+
+def _encode_bytes(value: bytes, out: bytearray):
+    out += b"b"
+    out += _LENGTH.pack(len(value))
+    out += value
+
+
+def _encode_list(value, out: bytearray):
+    out += b"l"
+    out += _LENGTH.pack(len(value))
+    for item in value:
+        _ENCODERS[type(item)](item, out)
+
+
+def _encode_dict(value: dict, out: bytearray):
+    out += b"m"
+    out += _LENGTH.pack(len(value))
+    for key, item in value.items():
+        _ENCODERS[type(key)](key, out)
+        _ENCODERS[type(item)](item, out)
+
+
+_ENCODERS = {
+    type(None): lambda value, out: out.extend(b"N"),
+    bool: lambda value, out: out.extend(b"T" if value else b"F"),
+    int: _encode_int,
+    float: _encode_float,
+    str: _encode_str,
+    bytes: _encode_bytes,
+    list: _encode_list,
+    tuple: _encode_list,
+    dict: _encode_dict,
+}
+
+
+def encode(value, out: bytearray):
+    try:
+        _ENCODERS[type(value)](value, out)
+    except KeyError as e:
+        raise ValueError(f"Can't send a value of type {e.args[0].__name__}") from None
+
+
+def decode(data, offset: int = 0):
+    # Returns (value, offset just past it)
+    tag = data[offset]
+    offset += 1
+    if tag == 0x69:  # i
+        return _INT.unpack_from(data, offset)[0], offset + 8
+    if tag == 0x73:  # s
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += 4
+        return str(data[offset:offset + length], "utf-8"), offset + length
+    if tag == 0x64:  # d
+        return _FLOAT.unpack_from(data, offset)[0], offset + 8
+    if tag == 0x4E:  # N
+        return None, offset
+    if tag == 0x6D:  # m
+        (count,) = _LENGTH.unpack_from(data, offset)
+        offset += 4
+        result = {}
+        for _ in range(count):
+            key, offset = decode(data, offset)
+            result[key], offset = decode(data, offset)
+        return result, offset
+    if tag == 0x6C:  # l
+        (count,) = _LENGTH.unpack_from(data, offset)
+        offset += 4
+        result = []
+        for _ in range(count):
+            item, offset = decode(data, offset)
+            result.append(item)
+        return result, offset
+    if tag == 0x54:  # T
+        return True, offset
+    if tag == 0x46:  # F
+        return False, offset
+    if tag == 0x6E:  # n
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += 4
+        return int(str(data[offset:offset + length], "ascii")), offset + length
+    if tag == 0x62:  # b
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += 4
+        return bytes(data[offset:offset + length]), offset + length
+    raise ValueError(f"Unknown value tag {tag:#x}")
+
+
+def request(request_id: int, op: str, table, args, out: bytearray):
+    # Appends one request frame to out
+    start = len(out)
+    out += _REQUEST.pack(0, request_id)
+    encode([op, table, args], out)
+    _LENGTH.pack_into(out, start, len(out) - start - 4)
+
+
+def response(request_id: int, status: int, value, out: bytearray):
+    start = len(out)
+    out += _RESPONSE.pack(0, request_id, status)
+    try:
+        encode(value, out)
+    except ValueError as e:
+        del out[start:]
+        out += _RESPONSE.pack(0, request_id, ERROR)
+        encode(str(e), out)
+    _LENGTH.pack_into(out, start, len(out) - start - 4)
+
+
+def split_frames(buffer) -> Tuple[List[bytes], int]:
+    # The complete frames at the start of buffer (each without its length
+    # prefix) and the number of bytes they take up
+    frames = []
+    offset = 0
+    with memoryview(buffer) as view:
+        while len(buffer) - offset >= 4:
+            (length,) = _LENGTH.unpack_from(buffer, offset)
+            if length > MAX_FRAME:
+                raise ValueError(f"Frame of {length} bytes is larger than {MAX_FRAME}")
+            if len(buffer) - offset - 4 < length:
+                break
+            frames.append(bytes(view[offset + 4:offset + 4 + length]))
+            offset += 4 + length
+    return frames, offset
+
+
+def parse_request(frame) -> Tuple[int, str, object, list]:
+    (request_id,) = _LENGTH.unpack_from(frame, 0)
+    (op, table, args), _ = decode(frame, 4)
+    return request_id, op, table, args
+
+
+def parse_response(frame) -> Tuple[int, int, object]:
+    request_id, status = struct.unpack_from("<IB", frame, 0)
+    value, _ = decode(frame, 5)
+    return request_id, status, value
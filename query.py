@@ -0,0 +1,529 @@
+import heapq
+import re
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from database import OPERATORS, Row, Table, _type_mismatch
+
+# A small SELECT dialect over Database tables:
+#
+#   [EXPLAIN] SELECT * | column, ... FROM table
+#       [WHERE condition] [ORDER BY column [ASC|DESC], ...] [LIMIT n [OFFSET m]]
+#
+# Conditions compare a column with a literal (=, ==, !=, <>, <, <=, >, >=,
+# IS [NOT] NULL) and combine with AND, OR, NOT and parentheses. Comparisons
+# behave like Table.where: an empty cell never satisfies an ordering.
+# ORDER BY puts empty cells last when ascending and first when descending.
+#
+# The parsed Select is the logical plan. The planner turns it into a tree of
+# physical operators that pass slots between them and only read the columns
+# they need; the row dicts are built once, by the final projection.
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>-?\d+\.\d*(?:[eE][-+]?\d+)?|-?\d*\.\d+(?:[eE][-+]?\d+)?|-?\d+(?:[eE][-+]?\d+)?)
+      | '(?P<string>(?:[^']|'')*)'
+      | "(?P<quoted>(?:[^"]|"")*)"
+      | (?P<op><=|>=|<>|!=|==|[=<>(),*])
+      | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+
+KEYWORDS = {"SELECT", "FROM", "WHERE", "AND", "OR", "NOT", "ORDER", "BY", "ASC", "DESC",
+            "LIMIT", "OFFSET", "IS", "NULL", "EXPLAIN", "TRUE", "FALSE"}
+
+# Cost of handling one row when scanning, and when fetching it through an
+# index (random access into storage plus sorting the slots back in order)
+SCAN_COST = 1.0
+LOOKUP_COST = 2.0
+# Cost per row of computing its sort key and ordering it
+SORT_COST = 0.5
+
+
+def _tokenize(text: str) -> List[Tuple[str, object]]:
+    tokens = []
+    pos = 0
+    text = text.rstrip().rstrip(";")
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None or match.end() == pos:
+            raise ValueError(f"Syntax error at {text[pos:pos + 20]!r}")
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == "number":
+            number = match.group("number")
+            tokens.append(("literal", float(number) if any(c in number for c in ".eE") else int(number)))
+        elif kind == "string":
+            tokens.append(("literal", match.group("string").replace("''", "'")))
+        elif kind == "quoted":
+            # Double quotes name a column, as in SQL
+            tokens.append(("name", match.group("quoted").replace('""', '"')))
+        elif kind == "op":
+            tokens.append(("op", match.group("op")))
+        else:
+            word = match.group("word")
+            if word.upper() in KEYWORDS:
+                tokens.append(("keyword", word.upper()))
+            else:
+                tokens.append(("name", word))
+    return tokens
+
+
+class Comparison:
+    def __init__(self, column: str, op: str, value):
+        self.column = column
+        self.op = op
+        self.value = value
+
+    def __str__(self):
+        if self.value is None and self.op in ("=", "==", "!="):
+            return f"{self.column} IS {'NOT ' if self.op == '!=' else ''}NULL"
+        return f"{self.column} {self.op} {self.value!r}"
+
+
+class BoolOp:
+    def __init__(self, op: str, terms: list):
+        self.op = op
+        self.terms = terms
+
+    def __str__(self):
+        if self.op == "NOT":
+            return f"NOT ({self.terms[0]})"
+        return f" {self.op} ".join(f"({term})" if isinstance(term, BoolOp) else str(term) for term in self.terms)
+
+
+class Select:
+    # Logical plan of a statement
+    def __init__(self, table: str, columns: Optional[List[str]], where=None,
+                 order_by: Optional[List[Tuple[str, bool]]] = None, limit: Optional[int] = None,
+                 offset: int = 0, explain: bool = False):
+        self.table = table
+        # None selects every column
+        self.columns = columns
+        self.where = where
+        # (column, descending) pairs
+        self.order_by = order_by or []
+        self.limit = limit
+        self.offset = offset
+        self.explain = explain
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self, kind: str, value=None) -> bool:
+        if self.pos >= len(self.tokens):
+            return False
+        token_kind, token_value = self.tokens[self.pos]
+        return token_kind == kind and (value is None or token_value == value)
+
+    def accept(self, kind: str, value=None):
+        if self.peek(kind, value):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, kind: str, value=None):
+        if not self.peek(kind, value):
+            found = self.tokens[self.pos][1] if self.pos < len(self.tokens) else "end of query"
+            raise ValueError(f"Expected {value or kind} but found {found!r}")
+        self.pos += 1
+        return self.tokens[self.pos - 1][1]
+
+    def integer(self) -> int:
+        value = self.expect("literal")
+        if not isinstance(value, int) or value < 0:
+            raise ValueError(f"Expected a non-negative integer but found {value!r}")
+        return value
+
+    def statement(self) -> Select:
+        explain = self.accept("keyword", "EXPLAIN")
+        self.expect("keyword", "SELECT")
+        if self.accept("op", "*"):
+            columns = None
+        else:
+            columns = [self.expect("name")]
+            while self.accept("op", ","):
+                columns.append(self.expect("name"))
+        self.expect("keyword", "FROM")
+        select = Select(self.expect("name"), columns, explain=explain)
+        if self.accept("keyword", "WHERE"):
+            select.where = self.disjunction()
+        if self.accept("keyword", "ORDER"):
+            self.expect("keyword", "BY")
+            while True:
+                column = self.expect("name")
+                descending = self.accept("keyword", "DESC")
+                if not descending:
+                    self.accept("keyword", "ASC")
+                select.order_by.append((column, descending))
+                if not self.accept("op", ","):
+                    break
+        if self.accept("keyword", "LIMIT"):
+            select.limit = self.integer()
+            if self.accept("keyword", "OFFSET"):
+                select.offset = self.integer()
+        if self.pos < len(self.tokens):
+            raise ValueError(f"Unexpected {self.tokens[self.pos][1]!r} at the end of the query")
+        return select
+
+    def disjunction(self):
+        terms = [self.conjunction()]
+        while self.accept("keyword", "OR"):
+            terms.append(self.conjunction())
+        return terms[0] if len(terms) == 1 else BoolOp("OR", terms)
+
+    def conjunction(self):
+        terms = [self.negation()]
+        while self.accept("keyword", "AND"):
+            terms.append(self.negation())
+        return terms[0] if len(terms) == 1 else BoolOp("AND", terms)
+
+    def negation(self):
+        if self.accept("keyword", "NOT"):
+            return BoolOp("NOT", [self.negation()])
+        if self.accept("op", "("):
+            condition = self.disjunction()
+            self.expect("op", ")")
+            return condition
+        return self.comparison()
+
+    def literal(self):
+        if self.accept("keyword", "NULL"):
+            return None
+        if self.accept("keyword", "TRUE"):
+            return True
+        if self.accept("keyword", "FALSE"):
+            return False
+        return self.expect("literal")
+
+    def comparison(self) -> Comparison:
+        if self.peek("name"):
+            column = self.expect("name")
+            if self.accept("keyword", "IS"):
+                negated = self.accept("keyword", "NOT")
+                self.expect("keyword", "NULL")
+                return Comparison(column, "!=" if negated else "=", None)
+            op = self.expect("op")
+            if op not in OPERATORS and op != "<>":
+                raise ValueError(f"Unsupported operator {op}")
+            return Comparison(column, "!=" if op == "<>" else op, self.literal())
+        # literal op column
+        value = self.literal()
+        op = self.expect("op")
+        flipped = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "<>": "!="}.get(op, op)
+        if flipped not in OPERATORS:
+            raise ValueError(f"Unsupported operator {op}")
+        return Comparison(self.expect("name"), flipped, value)
+
+
+def parse(text: str) -> Select:
+    return _Parser(text).statement()
+
+
+def _conjuncts(condition) -> list:
+    if condition is None:
+        return []
+    if isinstance(condition, BoolOp) and condition.op == "AND":
+        return [term for part in condition.terms for term in _conjuncts(part)]
+    return [condition]
+
+
+def _columns_of(condition) -> set:
+    if isinstance(condition, Comparison):
+        return {condition.column}
+    return set().union(*(_columns_of(term) for term in condition.terms))
+
+
+def _compile(condition, table: Table) -> Callable[[int], bool]:
+    # Predicate over a slot that reads only the columns it compares
+    value_at = table._storage.value
+    if isinstance(condition, Comparison):
+        column, op, value = condition.column, condition.op, condition.value
+        compare = OPERATORS[op]
+        ordering = op in ("<", "<=", ">", ">=")
+
+        def check(slot):
+            cell = value_at(slot, column)
+            try:
+                return (cell is not None or not ordering) and compare(cell, value)
+            except TypeError:
+                raise _type_mismatch(column, op, value) from None
+        return check
+    checks = [_compile(term, table) for term in condition.terms]
+    if condition.op == "NOT":
+        return lambda slot: not checks[0](slot)
+    if condition.op == "AND":
+        return lambda slot: all(check(slot) for check in checks)
+    return lambda slot: any(check(slot) for check in checks)
+
+
+class _Descending:
+    # Sort key wrapper that reverses the order of the wrapped key
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+_first = itemgetter(0)
+
+
+def _sort_key(table: Table, order_by: List[Tuple[str, bool]]) -> Callable[[int], tuple]:
+    value_at = table._storage.value
+
+    def key(slot):
+        parts = []
+        for column, descending in order_by:
+            value = value_at(slot, column)
+            # Empty cells sort after every value
+            part = (False, value) if value is not None else (True, 0)
+            parts.append(_Descending(part) if descending else part)
+        return tuple(parts)
+    return key
+
+
+# Physical operators. Each produces slots (the projection produces rows),
+# and describes itself and its input for EXPLAIN.
+
+class _Operator:
+    child: Optional['_Operator'] = None
+
+    def describe(self) -> str:
+        raise NotImplementedError
+
+    def explain(self, depth: int = 0) -> List[str]:
+        lines = ["  " * depth + self.describe()]
+        if self.child is not None:
+            lines += self.child.explain(depth + 1)
+        return lines
+
+
+class _Scan(_Operator):
+    # Walks the live slots; pushed-down comparisons are checked a column at a
+    # time, starting from the first one over a single column's values
+    def __init__(self, table: Table, terms: list):
+        self.table = table
+        self.terms = terms
+
+    def describe(self):
+        condition = f" filter {' AND '.join(map(str, self.terms))}" if self.terms else ""
+        return f"Scan {self.table.name} ({self.table.row_count:,} rows){condition}"
+
+    def slots(self) -> Iterator[int]:
+        table = self.table
+        if not self.terms:
+            return iter(table._live_slots())
+        first, rest = self.terms[0], self.terms[1:]
+        if isinstance(first, Comparison):
+            slots = iter(table._scan_slots(first.column, first.op, first.value))
+        else:
+            slots = filter(_compile(first, table), table._live_slots())
+        for term in rest:
+            slots = filter(_compile(term, table), slots)
+        return slots
+
+
+class _IndexLookup(_Operator):
+    def __init__(self, table: Table, term: Comparison, estimate: int):
+        self.table = table
+        self.term = term
+        self.estimate = estimate
+
+    def describe(self):
+        kind = self.table._indexes[self.term.column].kind
+        return f"IndexLookup {self.table.name}.{self.term} ({kind} index, {self.estimate:,} rows)"
+
+    def slots(self) -> Iterator[int]:
+        slots = self.table._indexes[self.term.column].lookup(self.term.op, self.term.value)
+        slots.sort()
+        return iter(slots)
+
+
+class _IndexOrder(_Operator):
+    # Produces slots already sorted by a column through its sorted index, so
+    # ORDER BY ... LIMIT stops after the first rows that pass the filter
+    def __init__(self, table: Table, column: str, descending: bool):
+        self.table = table
+        self.column = column
+        self.descending = descending
+
+    def describe(self):
+        return f"IndexOrder {self.table.name}.{self.column} {'DESC' if self.descending else 'ASC'} (sorted index)"
+
+    def slots(self) -> Iterator[int]:
+        return self.table._indexes[self.column].ordered(self.descending)
+
+
+class _Filter(_Operator):
+    def __init__(self, child: _Operator, table: Table, terms: list):
+        self.child = child
+        self.table = table
+        self.terms = terms
+
+    def describe(self):
+        return f"Filter {' AND '.join(map(str, self.terms))}"
+
+    def slots(self) -> Iterator[int]:
+        slots = self.child.slots()
+        for term in self.terms:
+            slots = filter(_compile(term, self.table), slots)
+        return slots
+
+
+class _Sort(_Operator):
+    def __init__(self, child: _Operator, table: Table, order_by: List[Tuple[str, bool]], top: Optional[int]):
+        self.child = child
+        self.table = table
+        self.order_by = order_by
+        # Only this many rows are needed: keep them in a heap instead of sorting everything
+        self.top = top
+
+    def describe(self):
+        keys = ", ".join(f"{column} {'DESC' if descending else 'ASC'}" for column, descending in self.order_by)
+        return f"TopK {self.top:,} by {keys}" if self.top is not None else f"Sort by {keys}"
+
+    def slots(self) -> Iterator[int]:
+        if len(self.order_by) == 1:
+            return self._slots_by_column(*self.order_by[0])
+        key = _sort_key(self.table, self.order_by)
+        if self.top is not None:
+            return iter(heapq.nsmallest(self.top, self.child.slots(), key=key))
+        return iter(sorted(self.child.slots(), key=key))
+
+    def _slots_by_column(self, column: str, descending: bool) -> Iterator[int]:
+        # Setting empty cells aside lets the cell itself be the sort key
+        value_at = self.table._storage.value
+        present, empty = [], []
+        for slot in self.child.slots():
+            value = value_at(slot, column)
+            if value is None:
+                empty.append(slot)
+            else:
+                present.append((value, slot))
+        top, key = self.top, _first
+        if descending:
+            ordered = heapq.nlargest(top, present, key=key) if top is not None else \
+                sorted(present, key=key, reverse=True)
+            slots = empty + [slot for _, slot in ordered]
+        else:
+            ordered = heapq.nsmallest(top, present, key=key) if top is not None else sorted(present, key=key)
+            slots = [slot for _, slot in ordered] + empty
+        return iter(slots if top is None else slots[:top])
+
+
+class _Limit(_Operator):
+    def __init__(self, child: _Operator, limit: Optional[int], offset: int):
+        self.child = child
+        self.limit = limit
+        self.offset = offset
+
+    def describe(self):
+        offset = f" offset {self.offset:,}" if self.offset else ""
+        return f"Limit {self.limit:,}{offset}" if self.limit is not None else f"Offset {self.offset:,}"
+
+    def slots(self) -> Iterator[int]:
+        stop = None if self.limit is None else self.offset + self.limit
+        return islice(self.child.slots(), self.offset, stop)
+
+
+class _Project(_Operator):
+    def __init__(self, child: _Operator, table: Table, columns: List[str]):
+        self.child = child
+        self.table = table
+        self.columns = columns
+
+    def describe(self):
+        return f"Project {', '.join(self.columns)}"
+
+    def rows(self) -> List[Row]:
+        value_at = self.table._storage.value
+        columns = self.columns
+        return [Row({column: value_at(slot, column) for column in columns}) for slot in self.child.slots()]
+
+
+def _estimate(table: Table, term) -> Optional[int]:
+    if not isinstance(term, Comparison):
+        return None
+    index = table._indexes.get(term.column)
+    if index is None:
+        return None
+    try:
+        return index.estimate(term.op, term.value)
+    except TypeError:
+        # e.g. an unhashable literal or one that doesn't order against the column
+        return None
+
+
+def plan(select: Select, table: Table) -> _Project:
+    for column in (select.columns or []) + [column for column, _ in select.order_by] + \
+            sorted(_columns_of(select.where) if select.where is not None else ()):
+        if column not in table.schema:
+            raise ValueError(f"Column {column} does not exist")
+    terms = _conjuncts(select.where)
+    total = table.row_count
+    needed = None if select.limit is None else select.limit + select.offset
+
+    # Access path: a full scan, or the cheapest index lookup on one of the
+    # AND-ed comparisons; the other terms are checked on what it returns
+    best_term, best_estimate = None, None
+    for term in terms:
+        estimate = _estimate(table, term)
+        if estimate is not None and (best_estimate is None or estimate < best_estimate):
+            best_term, best_estimate = term, estimate
+    scan_cost = total * SCAN_COST
+    if best_term is not None and best_estimate * LOOKUP_COST < scan_cost:
+        source = _IndexLookup(table, best_term, best_estimate)
+        rest = [term for term in terms if term is not best_term]
+        node = _Filter(source, table, rest) if rest else source
+        matches = best_estimate
+        cost = best_estimate * LOOKUP_COST
+    else:
+        node = _Scan(table, terms)
+        matches = total
+        cost = scan_cost
+
+    if select.order_by:
+        # Walking a sorted index in order skips the sort entirely and, with a
+        # LIMIT, stops early. Rows the filter rejects still cost a lookup each,
+        # so estimate how many must be walked from the terms' selectivity.
+        column, descending = select.order_by[0]
+        index = table._indexes.get(column)
+        if len(select.order_by) == 1 and index is not None and hasattr(index, "ordered") \
+                and len(index) == total:
+            selectivity = 1.0
+            for term in terms:
+                estimate = _estimate(table, term)
+                if estimate is not None and total:
+                    selectivity *= estimate / total
+            walked = total if needed is None else min(total, needed / max(selectivity, 1.0 / max(total, 1)))
+            sort_cost = matches * SORT_COST
+            if walked * LOOKUP_COST < cost + sort_cost:
+                node = _IndexOrder(table, column, descending)
+                node = _Filter(node, table, terms) if terms else node
+                select = Select(select.table, select.columns, select.where, [], select.limit, select.offset)
+        if select.order_by:
+            node = _Sort(node, table, select.order_by, needed)
+    if select.limit is not None or select.offset:
+        node = _Limit(node, select.limit, select.offset)
+    return _Project(node, table, select.columns or list(table.schema))
+
+
+def execute(database, text: str) -> List[Row]:
+    select = parse(text)
+    if select.table not in database.tables:
+        raise ValueError(f"Table {select.table} does not exist")
+    table = database.tables[select.table]
+    with table._lock:
+        root = plan(select, table)
+        if select.explain:
+            return [Row({"plan": line}) for line in root.explain()]
+        return root.rows()
@@ -0,0 +1,172 @@
+import json
+import os
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import binary_format
+import instrumentation
+from database import Field, Table, _FrozenTable
+
+# Segmented databases: a small JSON manifest plus a directory of binary files
+# (filepath + ".segments"), one per chunk of Table.CHUNK_ROWS slots of each
+# table. A save only writes the chunks changed since they were last saved to
+# this manifest, then replaces the manifest in one rename; files the new
+# manifest no longer names are removed afterwards. A crash at any point
+# leaves the previous manifest and every file it names intact.
+# Chunk stamps are table versions, which only mean something to the session
+# that wrote them: each manifest has an id, and a table only reuses the
+# chunks of the manifest it was loaded from or last saved to.
+EXTENSION = ".dmbm"
+FORMAT = "dmbs-segments"
+_PREFIX = json.dumps({"format": FORMAT})[:-1]
+
+
+def is_manifest(filepath: str) -> bool:
+    with open(filepath, "rb") as f:
+        return f.read(len(_PREFIX)).decode("utf-8", "replace") == _PREFIX
+
+
+def _directory(filepath: str) -> str:
+    return filepath + ".segments"
+
+
+def _read_manifest(filepath: str) -> dict:
+    with open(filepath, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"{filepath} is not a segmented database manifest")
+    return manifest
+
+
+def _sync_directory(path: str):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def save(database, filepath: str, progress: Optional[Callable[[int, int, float], None]] = None) -> int:
+    # Returns the number of chunk files written. progress(rows, bytes_written,
+    # rows_per_second) is called after each chunk, counting the rows of
+    # unchanged chunks too; raising from it leaves the previous manifest.
+    directory = _directory(filepath)
+    os.makedirs(directory, exist_ok=True)
+    previous = {}
+    previous_id = None
+    if os.path.exists(filepath) and is_manifest(filepath):
+        old_manifest = _read_manifest(filepath)
+        previous = old_manifest["tables"]
+        previous_id = old_manifest.get("id")
+
+    manifest = {"format": FORMAT, "id": uuid.uuid4().hex, "tables": {}}
+    written = 0
+    rows = 0
+    bytes_written = 0
+    started = time.perf_counter()
+    # The chunks are written from copies of the tables taken with every lock
+    # held, so the manifest describes one moment while writers carry on
+    with instrumentation.phase("Database.save_to_disk.copy"), database._locked():
+        tables = {name: _FrozenTable(table) for name, table in database.tables.items()}
+    with instrumentation.phase("Database.save_to_disk.chunks"):
+        for name, table in tables.items():
+            old = previous.get(name)
+            reuse = old is not None and previous_id is not None and table._manifest == previous_id \
+                and old["layout"] == table._layout
+            old_chunks = old["chunks"] if reuse else []
+            chunks = []
+            for number in range(-(-len(table._storage) // table.CHUNK_ROWS)):
+                stamp = table._chunks.get(number, 0)
+                start = number * table.CHUNK_ROWS
+                stop = min(start + table.CHUNK_ROWS, len(table._storage))
+                if number < len(old_chunks) and old_chunks[number]["stamp"] == stamp:
+                    chunks.append(old_chunks[number])
+                else:
+                    chunk = {"file": f"{uuid.uuid4().hex}{binary_format.EXTENSION}", "stamp": stamp}
+                    with open(os.path.join(directory, chunk["file"]), "wb") as f:
+                        binary_format.write_slots(table, start, stop, f)
+                        f.flush()
+                        os.fsync(f.fileno())
+                        bytes_written += os.fstat(f.fileno()).st_size
+                    written += 1
+                    chunks.append(chunk)
+                if progress is not None:
+                    rows += stop - start - len(table._dead_slots(start, stop))
+                    elapsed = time.perf_counter() - started
+                    progress(rows, bytes_written, rows / elapsed if elapsed > 0 else 0.0)
+            manifest["tables"][name] = {
+                "schema": [field.to_dict() for field in table.schema.values()],
+                "storage": table.storage,
+                "indexes": [{"column": column, "kind": kind} for column, kind in table.indexes.items()],
+                "text_index": table.text_indexed,
+                "auto_increment_value": table._auto_increment_value,
+                "layout": table._layout,
+                "chunk_rows": table.CHUNK_ROWS,
+                "chunks": chunks,
+            }
+
+    _sync_directory(directory)
+
+    temp_path = filepath + ".tmp"
+    with instrumentation.phase("Database.save_to_disk.manifest"):
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, filepath)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        _sync_directory(os.path.dirname(os.path.abspath(filepath)))
+    for table in tables.values():
+        table.table._manifest = manifest["id"]
+
+    used = {chunk["file"] for meta in manifest["tables"].values() for chunk in meta["chunks"]}
+    for file_name in os.listdir(directory):
+        if file_name.endswith(binary_format.EXTENSION) and file_name not in used:
+            os.remove(os.path.join(directory, file_name))
+    return written
+
+
+def load(filepath: str, progress: Optional[Callable[[int, int, float], None]] = None) -> Dict[str, Table]:
+    started = time.perf_counter()
+    manifest = _read_manifest(filepath)
+    directory = _directory(filepath)
+    tables = {}
+    loaded = 0
+    bytes_read = 0
+    for name, meta in manifest["tables"].items():
+        table = Table(name, [Field.from_dict(field) for field in meta["schema"]], meta["storage"])
+        sizes: List[int] = []
+        for chunk in meta["chunks"]:
+            path = os.path.join(directory, chunk["file"])
+            mapped = binary_format.MappedFile(path)
+            (chunk_meta,) = mapped.footer["tables"]
+            storage = mapped.storage(chunk_meta, table.schema)
+            table._storage.extend({column: list(storage.column(column)) for column in table.schema})
+            sizes.append(len(storage))
+            loaded += len(storage)
+            bytes_read += os.path.getsize(path)
+            if progress is not None:
+                elapsed = time.perf_counter() - started
+                progress(loaded, bytes_read, loaded / elapsed if elapsed > 0 else 0.0)
+        table._index_ids()
+        table._auto_increment_value = meta["auto_increment_value"]
+        with instrumentation.phase("Database.load_from_disk.indexes"):
+            for index in meta["indexes"]:
+                table._build_index(index["column"], index["kind"])
+            if meta["text_index"]:
+                table._build_text_index()
+        # Chunks that held deleted rows come back shorter, which moves every
+        # later slot; the next save then has to write the table afresh
+        if meta.get("chunk_rows") == table.CHUNK_ROWS and all(size == table.CHUNK_ROWS for size in sizes[:-1]):
+            table._layout = meta["layout"]
+            table._chunks = {number: chunk["stamp"] for number, chunk in enumerate(meta["chunks"])}
+            table._version = max(table._chunks.values(), default=0)
+            table._manifest = manifest.get("id")
+        tables[name] = table
+    return tables
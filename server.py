@@ -0,0 +1,218 @@
+import asyncio
+import os
+import signal
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import protocol
+from database import Database, Field
+
+# Serves a Database to other processes over TCP or a Unix socket, speaking
+# the frames of protocol.py. One event loop owns every connection. Short
+# requests run on the loop as they are read; everything read from a socket
+# in one go is answered in one write, so pipelined requests share syscalls.
+# Requests that can take long (scans, queries, saving, and writes when the
+# database keeps a log) run on a thread pool so other connections aren't
+# stalled; a connection's requests still run one at a time in the order sent.
+#
+# A "batch" request carries a list of [op, table, arguments] and answers
+# with one [status, result] per entry; with atomic set its row changes run
+# in one transaction and the first failure fails the whole batch.
+
+# Operations run on the thread pool
+SLOW = frozenset({
+    "find_rows", "where", "aggregate", "query", "explain", "join", "rows", "save_to_disk", "load_from_disk",
+    "checkpoint", "compact", "create_index", "create_text_index", "add_column", "delete_column",
+})
+# Operations that write to the log; with one open they also run on the thread
+# pool, so an fsync doesn't stall the loop and concurrent writers share one
+JOURNALED = frozenset({
+    "add_row", "add_rows", "edit_row", "delete_row", "edit_by_id", "delete_by_id", "create_table",
+    "delete_table", "drop_index", "drop_text_index",
+})
+
+
+def _rows(rows) -> list:
+    return [row.data for row in rows]
+
+
+def _describe(table) -> dict:
+    return {
+        "schema": [field.to_dict() for field in table.schema.values()],
+        "storage": table.storage,
+        "indexes": table.indexes,
+        "text_index": table.text_indexed,
+    }
+
+
+def _add_row(table, row):
+    table.add_row(row)
+    return row["id"]
+
+
+def _rows_slice(table, start, stop):
+    return _rows(table.rows[start:stop])
+
+
+def _get_by_id(table, row_id):
+    row = table.get_by_id(row_id)
+    return None if row is None else row.data
+
+
+TABLE_OPERATIONS = {
+    "describe": _describe,
+    "row_count": lambda table: table.row_count,
+    "rows": _rows_slice,
+    "add_row": _add_row,
+    "add_rows": lambda table, rows: table.add_rows(rows),
+    "edit_row": lambda table, position, data: table.edit_row(position, data),
+    "delete_row": lambda table, position: table.delete_row(position),
+    "get_by_id": _get_by_id,
+    "edit_by_id": lambda table, row_id, data: table.edit_by_id(row_id, data),
+    "delete_by_id": lambda table, row_id: table.delete_by_id(row_id),
+    "find_rows": lambda table, pattern: _rows(table.find_rows(pattern)),
+    "where": lambda table, column, op, value: _rows(table.where(column, op, value)),
+    "aggregate": lambda table, group_by, aggs: _rows(table.aggregate(group_by, aggs and {
+        name: tuple(spec) for name, spec in aggs.items()})),
+    "add_column": lambda table, field: table.add_column(Field.from_dict(field)),
+    "delete_column": lambda table, name: table.delete_column(name),
+    "create_index": lambda table, column, kind: table.create_index(column, kind),
+    "drop_index": lambda table, column: table.drop_index(column),
+    "create_text_index": lambda table: table.create_text_index(),
+    "drop_text_index": lambda table: table.drop_text_index(),
+    "compact": lambda table: table.compact(),
+}
+
+DATABASE_OPERATIONS = {
+    "tables": lambda db: {name: _describe(table) for name, table in list(db.tables.items())},
+    "create_table": lambda db, name, schema, storage: db.create_table(
+        name, [Field.from_dict(field) for field in schema], storage),
+    "delete_table": lambda db, name: db.delete_table(name),
+    "query": lambda db, text: _rows(db.query(text)),
+    "explain": lambda db, text: db.explain(text),
+    "join": lambda db, left, right, on, how, algorithm: _rows(db.join(left, right, tuple(on), how, algorithm)),
+    "save_to_disk": lambda db, filepath, file_format: db.save_to_disk(filepath, file_format),
+    "checkpoint": lambda db: db.checkpoint(),
+}
+
+
+def _error(e: Exception) -> str:
+    return str(e) if isinstance(e, ValueError) else f"{type(e).__name__}: {e}"
+
+
+class Server:
+    def __init__(self, database: Database, host: str = "127.0.0.1", port: int = protocol.DEFAULT_PORT,
+                 path: Optional[str] = None, threads: int = 4):
+        # path: serve on this Unix socket instead of host:port
+        self.database = database
+        self.host = host
+        self.port = port
+        self.path = path
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix="server")
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def execute(self, op: str, table: Optional[str], args: list):
+        if op == "batch":
+            return self._batch(*args)
+        if table is None:
+            handler = DATABASE_OPERATIONS.get(op)
+            if handler is None:
+                raise ValueError(f"Unknown operation {op}")
+            return handler(self.database, *args)
+        handler = TABLE_OPERATIONS.get(op)
+        if handler is None:
+            raise ValueError(f"Unknown operation {op}")
+        target = self.database.tables.get(table)
+        if target is None:
+            raise ValueError(f"Table {table} does not exist")
+        return handler(target, *args)
+
+    def _batch(self, requests: list, atomic: bool = False) -> list:
+        if atomic:
+            with self.database.transaction():
+                return [[protocol.OK, self.execute(*request)] for request in requests]
+        results = []
+        for request in requests:
+            try:
+                results.append([protocol.OK, self.execute(*request)])
+            except Exception as e:
+                results.append([protocol.ERROR, _error(e)])
+        return results
+
+    def _slow(self, op: str, args: list) -> bool:
+        slow = SLOW | JOURNALED if self.database._wal is not None else SLOW
+        if op == "batch":
+            return any(request[0] in slow for request in args[0])
+        return op in slow
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        buffer = bytearray()
+        try:
+            while True:
+                data = await reader.read(1 << 16)
+                if not data:
+                    break
+                buffer += data
+                frames, consumed = protocol.split_frames(buffer)
+                del buffer[:consumed]
+                out = bytearray()
+                for frame in frames:
+                    request_id = None
+                    try:
+                        request_id, op, table, args = protocol.parse_request(frame)
+                        if self._slow(op, args):
+                            result = await loop.run_in_executor(self._executor, self.execute, op, table, args)
+                        else:
+                            result = self.execute(op, table, args)
+                        protocol.response(request_id, protocol.OK, result, out)
+                    except Exception as e:
+                        if request_id is None:
+                            raise
+                        protocol.response(request_id, protocol.ERROR, _error(e), out)
+                if out:
+                    writer.write(out)
+                    await writer.drain()
+        except (ConnectionError, ValueError, IndexError, TypeError, struct.error):
+            # A peer that went away or sent something unreadable loses its connection
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        if self.path is not None:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._server = await asyncio.start_unix_server(self._handle, self.path)
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        async with self._server:
+            await stop.wait()
+        self._executor.shutdown()
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def address(self):
+        # (host, port) or the socket path once started
+        if self.path is not None:
+            return self.path
+        return self._server.sockets[0].getsockname()[:2]
+
+
+def serve(database: Database, host: str = "127.0.0.1", port: int = protocol.DEFAULT_PORT,
+          path: Optional[str] = None, threads: int = 4):
+    # Blocks until SIGINT or SIGTERM
+    asyncio.run(Server(database, host, port, path, threads).serve_forever())
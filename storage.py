@@ -0,0 +1,830 @@
+from array import array
+from itertools import compress
+from operator import gt, not_, or_
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+# Distinct values a string column may have before it stops being
+# dictionary-encoded (columnar) or interned (rows); 0 turns both off.
+# Enum and char columns are always dictionary-encoded in columnar storage.
+DICTIONARY_LIMIT = 1 << 16
+# Column types whose repeated values are worth sharing
+INTERNED_TYPES = ("enum", "char", "string", "email")
+# Values interned at a time when adding many rows, so a column with mostly
+# distinct values is given up on early
+_INTERN_CHUNK = 4096
+
+
+class RowStorage:
+    # Classic layout: every record is its own dict.
+    # Adding or dropping a column doesn't touch the dicts: until the rows are
+    # next rewritten (compact or settle), reads fill in the defaults of added
+    # columns and leave out dropped ones.
+    kind = "rows"
+
+    def __init__(self, fields: Iterable):
+        self._rows: List[dict] = []
+        # Added column -> default, for rows older than the column
+        self._defaults: Dict[str, object] = {}
+        # Keys rows may still hold for dropped columns
+        self._dropped = set()
+        # Column -> {value: value}, so equal strings in many rows are one
+        # object (and compare by identity). Enums start from their declared
+        # values; a column is dropped from here once it has too many values.
+        self._interned: Dict[str, dict] = {}
+        for field in fields:
+            self._intern_field(field)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _intern_field(self, field):
+        if DICTIONARY_LIMIT and field.type in INTERNED_TYPES:
+            self._interned[field.name] = {value: value for value in field.enum_values or ()}
+
+    def _intern(self, data: dict):
+        full = None
+        for name, table in self._interned.items():
+            value = data.get(name)
+            if type(value) is str:
+                data[name] = table.setdefault(value, value)
+                if len(table) > DICTIONARY_LIMIT:
+                    full = name
+        if full is not None:
+            del self._interned[full]
+
+    def _intern_values(self, name: str, values: list) -> list:
+        table = self._interned[name]
+        setdefault = table.setdefault
+        interned = []
+        for start in range(0, len(values), _INTERN_CHUNK):
+            if len(table) > DICTIONARY_LIMIT:
+                del self._interned[name]
+                interned.extend(values[start:])
+                break
+            interned.extend([setdefault(value, value) if type(value) is str else value
+                             for value in values[start:start + _INTERN_CHUNK]])
+        return interned
+
+    def append(self, data: dict):
+        if self._interned:
+            self._intern(data)
+        self._rows.append(data)
+
+    def extend(self, columns: Dict[str, list]):
+        names = list(columns)
+        lists = [self._intern_values(name, values) if name in self._interned else values
+                 for name, values in columns.items()]
+        self._rows.extend(dict(zip(names, values)) for values in zip(*lists))
+
+    def _current(self, data: Optional[dict]) -> Optional[dict]:
+        # A row as the present columns have it
+        if data is None or not (self._defaults or self._dropped):
+            return data
+        dropped = self._dropped
+        current = {key: value for key, value in data.items() if key not in dropped} if dropped else dict(data)
+        for name, default in self._defaults.items():
+            if name not in current:
+                current[name] = default
+        return current
+
+    def get(self, slot: int) -> dict:
+        return self._current(self._rows[slot])
+
+    def value(self, slot: int, name: str):
+        return self._rows[slot].get(name, self._defaults.get(name))
+
+    def replace(self, slot: int, data: dict):
+        if self._interned:
+            self._intern(data)
+        self._rows[slot] = data
+
+    def clear(self, slot: int):
+        # Releases a deleted slot; it stays in place until compact()
+        self._rows[slot] = None
+
+    def compact(self, slots: List[int]):
+        rows = self._rows
+        current = self._current
+        self._rows = [current(rows[slot]) for slot in slots]
+        self._defaults = {}
+        self._dropped = set()
+
+    def settle(self):
+        # Writes pending column changes into the rows. Every row gets a new
+        # dict, so readers still holding one keep seeing one version of it.
+        if self._defaults or self._dropped:
+            self.compact(range(len(self._rows)))
+
+    def copy(self) -> 'RowStorage':
+        # For reading while this storage keeps changing. Row dicts are
+        # replaced rather than changed in place, so they are shared.
+        storage = RowStorage.__new__(RowStorage)
+        storage._rows = self._rows[:]
+        storage._defaults = dict(self._defaults)
+        storage._dropped = set(self._dropped)
+        storage._interned = {}
+        return storage
+
+    def add_column(self, field):
+        if field.name in self._dropped:
+            # Old rows may hold values of the dropped column by that name
+            self.settle()
+        self._defaults[field.name] = field.default
+        self._interned.pop(field.name, None)
+        self._intern_field(field)
+
+    def drop_column(self, name: str):
+        self._defaults.pop(name, None)
+        self._dropped.add(name)
+        self._interned.pop(name, None)
+
+    def equal_slots(self, name: str, value, equal: bool = True) -> Optional[List[int]]:
+        # Only dictionary-encoded columns have a faster way than comparing values
+        return None
+
+    def column(self, name: str) -> Iterator:
+        default = self._defaults.get(name)
+        return (None if data is None else data.get(name, default) for data in self._rows)
+
+    def values(self, name: str, start: int, stop: int) -> Iterator:
+        # Values of slots start..stop-1
+        default = self._defaults.get(name)
+        return (None if data is None else data.get(name, default) for data in self._rows[start:stop])
+
+    def records(self) -> Iterator[dict]:
+        return map(self._current, self._rows)
+
+    def search(self, regex, start: int = 0, stop: Optional[int] = None) -> List[int]:
+        current = self._current
+        return [slot for slot, data in enumerate(self._rows[start:stop], start)
+                if data is not None and any(regex.search(str(value)) for value in current(data).values())]
+
+
+def as_bytes(buffer) -> memoryview:
+    # array.frombytes() only takes byte-formatted buffers
+    return memoryview(buffer).cast("B")
+
+
+class _Column:
+    # Base for typed columns. None is tracked in a byte mask that is only
+    # allocated once the first None shows up.
+    # Columns opened from a binary file sit directly on read-only memoryviews
+    # of the mapped file and are copied into arrays on their first write.
+    _blank = 0
+    _readonly = False
+
+    def __init__(self):
+        self._data = self._new_data()
+        self._nulls: Optional[bytearray] = None
+
+    @classmethod
+    def mapped(cls, data: memoryview, nulls: Optional[memoryview]):
+        column = cls.__new__(cls)
+        column._data = data
+        column._nulls = nulls
+        column._readonly = True
+        return column
+
+    def _new_data(self):
+        raise NotImplementedError
+
+    def _own(self):
+        data = self._new_data()
+        data.frombytes(as_bytes(self._data))
+        self._data = data
+        if self._nulls is not None:
+            self._nulls = bytearray(self._nulls)
+        self._readonly = False
+
+    def copy(self) -> '_Column':
+        # For reading while this column keeps changing; mapped columns are
+        # read-only and shared as they are
+        column = self.__class__.__new__(self.__class__)
+        column.__dict__.update(self.__dict__)
+        if not self._readonly:
+            column._data = self._data[:]
+            if self._nulls is not None:
+                column._nulls = bytearray(self._nulls)
+        return column
+
+    def _encode(self, value):
+        return value
+
+    def _decode(self, raw):
+        return raw
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        decode = self._decode
+        if self._nulls is None:
+            for raw in self._data:
+                yield decode(raw)
+        else:
+            for raw, null in zip(self._data, self._nulls):
+                yield None if null else decode(raw)
+
+    def get(self, slot: int):
+        if self._nulls is not None and self._nulls[slot]:
+            return None
+        return self._decode(self._data[slot])
+
+    def append(self, value):
+        if self._readonly:
+            self._own()
+        if value is None:
+            if self._nulls is None:
+                self._nulls = bytearray(len(self._data))
+            self._data.append(self._blank)
+            self._nulls.append(1)
+        else:
+            # Encoded first: encoding may replace _data with a wider array
+            raw = self._encode(value)
+            self._data.append(raw)
+            if self._nulls is not None:
+                self._nulls.append(0)
+
+    def extend(self, values: list):
+        if self._readonly:
+            self._own()
+        encode = self._encode
+        if None in values:
+            if self._nulls is None:
+                self._nulls = bytearray(len(self._data))
+            self._nulls.extend(value is None for value in values)
+            blank = self._blank
+            raw = [blank if value is None else encode(value) for value in values]
+        else:
+            if self._nulls is not None:
+                self._nulls.extend(bytes(len(values)))
+            raw = values if type(self)._encode is _Column._encode else list(map(encode, values))
+        self._data.extend(raw)
+
+    def truncate(self, length: int):
+        # Drops every slot from length on; undoes a failed extend
+        if self._readonly:
+            self._own()
+        del self._data[length:]
+        if self._nulls is not None:
+            del self._nulls[length:]
+
+    def set(self, slot: int, value):
+        if self._readonly:
+            self._own()
+        if value is None:
+            if self._nulls is None:
+                self._nulls = bytearray(len(self._data))
+            self._data[slot] = self._blank
+            self._nulls[slot] = 1
+        else:
+            self._data[slot] = self._encode(value)
+            if self._nulls is not None:
+                self._nulls[slot] = 0
+
+    def pop(self, slot: int):
+        if self._readonly:
+            self._own()
+        self._data.pop(slot)
+        if self._nulls is not None:
+            self._nulls.pop(slot)
+
+    def take(self, slots: List[int]):
+        # Keeps only the given slots, in the given order
+        data = self._data
+        self._data = self._new_data()
+        self._data.extend(data[slot] for slot in slots)
+        if self._nulls is not None:
+            nulls = self._nulls
+            self._nulls = bytearray(nulls[slot] for slot in slots)
+        self._readonly = False
+
+    def extend_nulls(self, count: int):
+        # Used when a column is added to a table that already has rows
+        if self._readonly:
+            self._own()
+        self._data.frombytes(bytes(self._data.itemsize * count))
+        if self._nulls is None:
+            self._nulls = bytearray(len(self._data) - count)
+        self._nulls.extend(b"\x01" * count)
+
+    def extend_value(self, count: int, value):
+        # count copies of value, filled in C rather than one append at a time
+        if value is None:
+            self.extend_nulls(count)
+            return
+        if self._readonly:
+            self._own()
+        raw = self._encode(value)
+        self._data.extend(array(self._data.typecode, [raw]) * count)
+        if self._nulls is not None:
+            self._nulls.extend(bytes(count))
+
+    def values(self, start: int, stop: int) -> Iterator:
+        # Values of slots start..stop-1
+        decode = self._decode
+        data = self._data[start:stop]
+        if self._nulls is None:
+            return map(decode, data)
+        return (None if null else decode(raw) for raw, null in zip(data, self._nulls[start:stop]))
+
+    def mark(self, regex, mask: bytearray, start: int = 0):
+        # Sets mask[i] for every slot start + i whose value matches; slots already marked are skipped
+        null_matches = regex.search("None") is not None
+        search = regex.search
+        for slot, value in enumerate(self.values(start, start + len(mask))):
+            if mask[slot]:
+                continue
+            if value is None:
+                if null_matches:
+                    mask[slot] = 1
+            elif search(str(value)):
+                mask[slot] = 1
+
+
+class IntegerColumn(_Column):
+    def _new_data(self):
+        return array("q")
+
+
+class RealColumn(_Column):
+    _blank = 0.0
+
+    def _new_data(self):
+        return array("d")
+
+
+# Codes each dictionary code typecode can hold
+_CODE_CAPACITY = {"B": 1 << 8, "H": 1 << 16, "i": 1 << 31}
+
+
+def code_type(count: int) -> str:
+    # Narrowest typecode for count distinct values
+    return next(typecode for typecode, capacity in _CODE_CAPACITY.items() if count <= capacity)
+
+
+class DictionaryColumn(_Column):
+    # Values are stored as codes into a per-column dictionary; enum columns
+    # start with their declared values as the dictionary. Codes take one
+    # byte until the dictionary outgrows that, then two, then four.
+    # A column with a limit (string columns) is full once it holds more
+    # distinct values than that; the storage then turns it into a StringColumn.
+    def __init__(self, values: Optional[List[str]] = None, limit: Optional[int] = None):
+        self._values: List[str] = []
+        self._codes: Dict[str, int] = {}
+        for value in values or ():
+            if value not in self._codes:
+                self._codes[value] = len(self._values)
+                self._values.append(value)
+        self._typecode = code_type(len(self._values))
+        self.limit = limit
+        super().__init__()
+
+    @classmethod
+    def mapped(cls, data: memoryview, nulls: Optional[memoryview], values: List[str] = (),
+               limit: Optional[int] = None):
+        column = super().mapped(data, nulls)
+        column._values = list(values)
+        column._codes = {value: code for code, value in enumerate(column._values)}
+        column._typecode = data.format
+        column.limit = limit
+        return column
+
+    def _new_data(self):
+        return array(self._typecode)
+
+    def copy(self) -> 'DictionaryColumn':
+        # The dictionary list is copied so the copy's stays as it was; the
+        # code lookup is only used for writes and is shared
+        column = super().copy()
+        column._values = list(self._values)
+        return column
+
+    @property
+    def typecode(self) -> str:
+        # Array typecode of the codes
+        return self._typecode
+
+    @property
+    def full(self) -> bool:
+        return self.limit is not None and len(self._values) > self.limit
+
+    def _encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            if not isinstance(value, str):
+                raise TypeError(f"expected str, got {type(value).__name__}")
+            code = len(self._values)
+            if code == _CODE_CAPACITY[self._typecode]:
+                self._widen()
+            self._values.append(value)
+            self._codes[value] = code
+        return code
+
+    def _widen(self):
+        if self._readonly:
+            self._own()
+        self._typecode = code_type(len(self._values) + 1)
+        self._data = array(self._typecode, self._data)
+
+    def _decode(self, raw):
+        return self._values[raw]
+
+    def to_strings(self) -> 'StringColumn':
+        column = StringColumn()
+        column.extend(list(self))
+        return column
+
+    def equal_slots(self, value, equal: bool = True) -> List[int]:
+        # Slots holding value or, with equal False, anything else (None
+        # included), found by comparing codes rather than strings
+        slots = range(len(self._data))
+        nulls = self._nulls
+        if value is None:
+            if nulls is None:
+                return [] if equal else list(slots)
+            return list(compress(slots, nulls if equal else map(not_, nulls)))
+        code = self._codes.get(value)
+        if code is None:
+            # Not in the dictionary, so no slot holds it
+            return [] if equal else list(slots)
+        hits = map(code.__eq__ if equal else code.__ne__, self._data)
+        if nulls is not None and code == self._blank:
+            # Empty slots hold the blank code too
+            hits = map(gt if equal else or_, hits, nulls)
+        return list(compress(slots, hits))
+
+    def mark(self, regex, mask: bytearray, start: int = 0):
+        # Run the regex once per distinct value instead of once per row,
+        # unless the range has fewer rows than that
+        if len(mask) < len(self._values):
+            super().mark(regex, mask, start)
+            return
+        codes = {code for code, value in enumerate(self._values) if regex.search(value)}
+        null_matches = regex.search("None") is not None
+        if not codes and not null_matches:
+            return
+        nulls = None if self._nulls is None else self._nulls[start:start + len(mask)]
+        for slot, code in enumerate(self._data[start:start + len(mask)]):
+            if nulls is not None and nulls[slot]:
+                if null_matches:
+                    mask[slot] = 1
+            elif code in codes:
+                mask[slot] = 1
+
+
+class StringColumn(_Column):
+    # UTF-8 bytes live in one shared heap; each slot keeps its start/end offsets.
+    # Rewritten or deleted values leave garbage that is reclaimed once it
+    # outweighs the live bytes.
+    def __init__(self):
+        super().__init__()
+        self._ends = array("q")
+        self._heap = bytearray()
+        self._garbage = 0
+
+    @classmethod
+    def mapped(cls, data: memoryview, nulls: Optional[memoryview], ends: memoryview = None, heap: memoryview = None):
+        column = super().mapped(data, nulls)
+        column._ends = ends
+        column._heap = heap
+        column._garbage = 0
+        return column
+
+    def _new_data(self):
+        return array("q")
+
+    def _own(self):
+        ends = self._new_data()
+        ends.frombytes(as_bytes(self._ends))
+        self._ends = ends
+        self._heap = bytearray(self._heap)
+        super()._own()
+
+    def copy(self) -> 'StringColumn':
+        # The copy gets its own heap: writing the copy to a file exports its
+        # buffer, and an exported bytearray can't grow under appends
+        column = super().copy()
+        if not self._readonly:
+            column._ends = self._ends[:]
+            column._heap = bytearray(self._heap)
+        return column
+
+    def _store(self, value) -> int:
+        if not isinstance(value, str):
+            raise TypeError(f"expected str, got {type(value).__name__}")
+        encoded = value.encode("utf-8")
+        start = len(self._heap)
+        self._heap += encoded
+        return start
+
+    def __iter__(self):
+        heap = self._heap
+        nulls = self._nulls
+        for slot, (start, end) in enumerate(zip(self._data, self._ends)):
+            if nulls is not None and nulls[slot]:
+                yield None
+            else:
+                yield str(heap[start:end], "utf-8")
+
+    def values(self, start: int, stop: int) -> Iterator:
+        heap = self._heap
+        nulls = None if self._nulls is None else self._nulls[start:stop]
+        for i, (a, b) in enumerate(zip(self._data[start:stop], self._ends[start:stop])):
+            if nulls is not None and nulls[i]:
+                yield None
+            else:
+                yield str(heap[a:b], "utf-8")
+
+    def get(self, slot: int):
+        if self._nulls is not None and self._nulls[slot]:
+            return None
+        return str(self._heap[self._data[slot]:self._ends[slot]], "utf-8")
+
+    def append(self, value):
+        if self._readonly:
+            self._own()
+        if value is None:
+            start = end = 0
+        else:
+            start = self._store(value)
+            end = len(self._heap)
+        self._data.append(start)
+        self._ends.append(end)
+        if value is None:
+            if self._nulls is None:
+                self._nulls = bytearray(len(self._data) - 1)
+            self._nulls.append(1)
+        elif self._nulls is not None:
+            self._nulls.append(0)
+
+    def extend(self, values: list):
+        if self._readonly:
+            self._own()
+        heap = self._heap
+        starts = self._data
+        ends = self._ends
+        nulls = self._nulls
+        if nulls is None and None in values:
+            nulls = self._nulls = bytearray(len(starts))
+        for value in values:
+            start = len(heap)
+            if value is None:
+                nulls.append(1)
+            else:
+                if not isinstance(value, str):
+                    raise TypeError(f"expected str, got {type(value).__name__}")
+                heap += value.encode("utf-8")
+                if nulls is not None:
+                    nulls.append(0)
+            starts.append(start)
+            ends.append(len(heap))
+
+    def truncate(self, length: int):
+        if self._readonly:
+            self._own()
+        heap_length = max(self._ends[:length], default=0)
+        del self._ends[length:]
+        # A new heap rather than cutting this one, whose buffer may be exported
+        self._heap = self._heap[:heap_length]
+        super().truncate(length)
+
+    def set(self, slot: int, value):
+        if self._readonly:
+            self._own()
+        old = self._ends[slot] - self._data[slot]
+        if value is None:
+            start = end = 0
+            if self._nulls is None:
+                self._nulls = bytearray(len(self._data))
+            self._nulls[slot] = 1
+        else:
+            start = self._store(value)
+            end = len(self._heap)
+            if self._nulls is not None:
+                self._nulls[slot] = 0
+        self._data[slot] = start
+        self._ends[slot] = end
+        self._garbage += old
+        self._maybe_vacuum()
+
+    def pop(self, slot: int):
+        if self._readonly:
+            self._own()
+        self._garbage += self._ends[slot] - self._data[slot]
+        self._ends.pop(slot)
+        super().pop(slot)
+        self._maybe_vacuum()
+
+    def take(self, slots: List[int]):
+        heap = bytearray()
+        starts = self._new_data()
+        ends = self._new_data()
+        for slot in slots:
+            starts.append(len(heap))
+            heap += self._heap[self._data[slot]:self._ends[slot]]
+            ends.append(len(heap))
+        if self._nulls is not None:
+            nulls = self._nulls
+            self._nulls = bytearray(nulls[slot] for slot in slots)
+        self._data, self._ends, self._heap = starts, ends, heap
+        self._garbage = 0
+        self._readonly = False
+
+    def extend_nulls(self, count: int):
+        if self._readonly:
+            self._own()
+        self._ends.frombytes(bytes(self._ends.itemsize * count))
+        super().extend_nulls(count)
+
+    def extend_value(self, count: int, value):
+        # Every copy points at the same bytes of the heap
+        if value is None:
+            self.extend_nulls(count)
+            return
+        if self._readonly:
+            self._own()
+        start = self._store(value)
+        self._data.extend(array("q", [start]) * count)
+        self._ends.extend(array("q", [len(self._heap)]) * count)
+        if self._nulls is not None:
+            self._nulls.extend(bytes(count))
+
+    def _maybe_vacuum(self):
+        if self._garbage <= 4096 or self._garbage * 2 < len(self._heap):
+            return
+        heap = bytearray()
+        for slot, (start, end) in enumerate(zip(self._data, self._ends)):
+            self._data[slot] = len(heap)
+            heap += self._heap[start:end]
+            self._ends[slot] = len(heap)
+        self._heap = heap
+        self._garbage = 0
+
+
+def create_column(field) -> _Column:
+    if field.type == "integer":
+        return IntegerColumn()
+    if field.type == "real":
+        return RealColumn()
+    if field.type in ("char", "enum"):
+        return DictionaryColumn(field.enum_values if field.type == "enum" else None)
+    if DICTIONARY_LIMIT:
+        return DictionaryColumn(limit=DICTIONARY_LIMIT)
+    return StringColumn()
+
+
+class ColumnarStorage:
+    # One typed container per field; rows only exist as dicts when asked for
+    kind = "columnar"
+
+    def __init__(self, fields: Iterable):
+        self._columns: Dict[str, _Column] = {field.name: create_column(field) for field in fields}
+        self._length = 0
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, _Column], length: int):
+        storage = cls.__new__(cls)
+        storage._columns = columns
+        storage._length = length
+        return storage
+
+    def __len__(self):
+        return self._length
+
+    def _promote(self):
+        # String columns that outgrew their dictionary hold plain strings from now on
+        for name, column in self._columns.items():
+            if isinstance(column, DictionaryColumn) and column.full:
+                self._columns[name] = column.to_strings()
+
+    def _truncate(self, length: int):
+        # Undoes a failed append or extend, whichever column it failed in
+        for column in self._columns.values():
+            if len(column) > length:
+                column.truncate(length)
+
+    def append(self, data: dict):
+        try:
+            for name, column in self._columns.items():
+                column.append(data.get(name))
+        except Exception as e:
+            self._truncate(self._length)
+            if isinstance(e, (TypeError, OverflowError)):
+                raise ValueError(f"Invalid value for field {name}: {e}") from e
+            raise
+        self._length += 1
+        self._promote()
+
+    def extend(self, columns: Dict[str, list]):
+        # All columns grow by the same number of values, or none does
+        length = self._length
+        count = len(next(iter(columns.values())))
+        try:
+            for name, column in self._columns.items():
+                values = columns[name]
+                if isinstance(column, DictionaryColumn) and column.limit is not None and \
+                        len(column._values) + len(values) > column.limit:
+                    # Promote before encoding values that would overflow the dictionary
+                    fresh = set(values) - column._codes.keys()
+                    fresh.discard(None)
+                    if len(column._values) + len(fresh) > column.limit:
+                        column = self._columns[name] = column.to_strings()
+                column.extend(values)
+        except Exception as e:
+            self._truncate(length)
+            if isinstance(e, (TypeError, OverflowError)):
+                raise ValueError(f"Invalid value for field {name}: {e}") from e
+            raise
+        self._length += count
+
+    def get(self, slot: int) -> dict:
+        if slot < 0 or slot >= self._length:
+            raise IndexError("Row ID out of range")
+        return {name: column.get(slot) for name, column in self._columns.items()}
+
+    def value(self, slot: int, name: str):
+        column = self._columns.get(name)
+        return None if column is None else column.get(slot)
+
+    def replace(self, slot: int, data: dict):
+        old = self.get(slot)
+        try:
+            for name, column in self._columns.items():
+                column.set(slot, data.get(name))
+        except (TypeError, OverflowError) as e:
+            for restore_name, column in self._columns.items():
+                column.set(slot, old[restore_name])
+                if restore_name == name:
+                    break
+            raise ValueError(f"Invalid value for field {name}: {e}") from e
+        self._promote()
+
+    def clear(self, slot: int):
+        for column in self._columns.values():
+            column.set(slot, None)
+
+    def compact(self, slots: List[int]):
+        for column in self._columns.values():
+            column.take(slots)
+        self._length = len(slots)
+
+    def settle(self):
+        # Column changes take effect at once here
+        pass
+
+    def copy(self) -> 'ColumnarStorage':
+        return ColumnarStorage.from_columns({name: column.copy() for name, column in self._columns.items()},
+                                            self._length)
+
+    def add_column(self, field):
+        column = create_column(field)
+        column.extend_value(self._length, field.default)
+        self._columns[field.name] = column
+
+    def drop_column(self, name: str):
+        self._columns.pop(name, None)
+
+    def equal_slots(self, name: str, value, equal: bool = True) -> Optional[List[int]]:
+        # Slots whose value equals (or, with equal False, differs from) value,
+        # or None if the column has no faster way than comparing each value
+        column = self._columns.get(name)
+        if not isinstance(column, DictionaryColumn):
+            return None
+        try:
+            return column.equal_slots(value, equal)
+        except TypeError:
+            # An unhashable value can't be looked up in the dictionary
+            return None
+
+    def column(self, name: str) -> Iterator:
+        return iter(self._columns[name])
+
+    def values(self, name: str, start: int, stop: int) -> Iterator:
+        return self._columns[name].values(start, stop)
+
+    def records(self) -> Iterator[dict]:
+        names = list(self._columns)
+        for values in zip(*self._columns.values()):
+            yield dict(zip(names, values))
+
+    def search(self, regex, start: int = 0, stop: Optional[int] = None) -> List[int]:
+        stop = self._length if stop is None else min(stop, self._length)
+        mask = bytearray(max(0, stop - start))
+        # Cheap dictionary-encoded columns first so later columns can skip their hits
+        columns = sorted(self._columns.values(), key=lambda column: not isinstance(column, DictionaryColumn))
+        for column in columns:
+            column.mark(regex, mask, start)
+        return [slot for slot, hit in enumerate(mask, start) if hit]
+
+
+STORAGE_TYPES = {
+    RowStorage.kind: RowStorage,
+    ColumnarStorage.kind: ColumnarStorage,
+}
+
+
+def create_storage(kind: str, fields: Iterable) -> Union[RowStorage, ColumnarStorage]:
+    if kind not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage type {kind}")
+    return STORAGE_TYPES[kind](fields)
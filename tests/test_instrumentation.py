@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+
+import instrumentation
+from database import Database, Field
+
+
+@pytest.fixture
+def table():
+    db = Database()
+    db.create_table("people", [Field("name", "string"), Field("age", "integer")], "columnar")
+    db.tables["people"].add_rows({"name": [f"n{i}" for i in range(20_000)], "age": list(range(20_000))})
+    yield db.tables["people"]
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def samplers():
+    return [thread for thread in threading.enumerate() if thread.name == "profile sampler"]
+
+
+@pytest.mark.parametrize("mode", ["cprofile", "sampling"])
+def test_concurrent_calls_share_the_profile_count(table, tmp_path, mode):
+    path = tmp_path / "profile.out"
+    instrumentation.profile_next(2, str(path), mode=mode)
+    barrier = threading.Barrier(4)
+
+    def work():
+        barrier.wait()
+        for _ in range(20):
+            table.where("age", ">", 10_000)
+
+    workers = [threading.Thread(target=work) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert not instrumentation.profiling()
+    assert not samplers()
+    assert path.stat().st_size > 0
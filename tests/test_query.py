@@ -0,0 +1,45 @@
+import pytest
+
+from database import Database, Field
+from parallel import ScanExecutor
+
+
+@pytest.fixture(params=["rows", "columnar"])
+def db(request):
+    db = Database()
+    db.create_table("people", [Field("name", "string"), Field("age", "integer")], request.param)
+    db.tables["people"].add_rows({"name": ["Ann", "Bob", "Cid"], "age": [30, 40, 50]})
+    return db
+
+
+@pytest.mark.parametrize("text", [
+    "SELECT * FROM people WHERE name > 5",
+    "SELECT * FROM people WHERE age > 'x'",
+    "SELECT * FROM people WHERE age >= 30 AND name < 3",
+    "SELECT name FROM people WHERE 5 <= name ORDER BY age",
+])
+@pytest.mark.parametrize("index", [None, "sorted"])
+def test_mismatched_comparison_is_a_value_error(db, text, index):
+    if index is not None:
+        db.tables["people"].create_index("age", index)
+        db.tables["people"].create_index("name", index)
+    with pytest.raises(ValueError, match="Type mismatch"):
+        db.query(text)
+
+
+@pytest.mark.parametrize("column, value", [("name", 5), ("age", "x")])
+def test_mismatched_where_is_a_value_error(db, column, value):
+    with pytest.raises(ValueError, match="Type mismatch"):
+        db.tables["people"].where(column, ">", value)
+
+
+@pytest.mark.parametrize("column, value", [("name", 5), ("age", "x")])
+def test_mismatched_parallel_where_is_a_value_error(db, column, value):
+    with ScanExecutor(workers=2, threshold=0) as executor:
+        with pytest.raises(ValueError, match=f"Type mismatch: can't compare {column} >"):
+            executor.where(db.tables["people"], column, ">", value)
+
+
+def test_mismatched_equality_matches_nothing(db):
+    assert db.query("SELECT * FROM people WHERE age = 'x'") == []
+    assert len(db.query("SELECT * FROM people WHERE name != 5")) == 3
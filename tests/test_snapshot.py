@@ -0,0 +1,87 @@
+import random
+import threading
+import time
+
+import pytest
+
+from database import Database, Field, Table
+
+SCHEMA = [Field("name", "string"), Field("age", "integer"), Field("score", "real")]
+
+
+@pytest.fixture(params=["rows", "columnar"])
+def table(request, monkeypatch):
+    # Compact after a few deletes so it keeps coming due while snapshots are open
+    monkeypatch.setattr(Table, "COMPACT_MIN_TOMBSTONES", 16)
+    db = Database()
+    db.create_table("people", SCHEMA, request.param)
+    db.tables["people"].add_rows({"name": [f"n{i}" for i in range(2000)], "age": [i % 90 for i in range(2000)],
+                                  "score": [float(i % 90) for i in range(2000)]})
+    return db.tables["people"]
+
+
+def test_snapshot_never_sees_a_half_applied_edit(table):
+    # Writers change age and score together; readers must never see them differ
+    stop = time.perf_counter() + 1.0
+    torn = []
+    reads = []
+    errors = []
+
+    def write(seed: int):
+        rng = random.Random(seed)
+        try:
+            while time.perf_counter() < stop:
+                action = rng.random()
+                try:
+                    if action < 0.6:
+                        age = rng.randint(18, 90)
+                        table.edit_by_id(rng.randrange(1, table._auto_increment_value),
+                                         {"name": "edited", "age": age, "score": float(age)})
+                    elif action < 0.8:
+                        table.add_row({"name": "added", "age": 30, "score": 30.0})
+                    else:
+                        table.delete_by_id(rng.randrange(1, table._auto_increment_value))
+                except ValueError:
+                    # Picked a deleted row
+                    pass
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            while time.perf_counter() < stop:
+                with table.snapshot() as snapshot:
+                    seen = [row.data for row in snapshot]
+                    expected = len(snapshot)
+                ids = [data["id"] for data in seen]
+                if len(seen) != expected or len(set(ids)) != len(ids):
+                    torn.append(seen)
+                torn.extend(data for data in seen if data["score"] != float(data["age"]))
+                reads.append(len(seen))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(seed,)) for seed in range(2)]
+    threads += [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert reads
+    assert not torn
+
+
+def test_compaction_waits_for_open_snapshots(table):
+    before = [row.data for row in table.rows]
+    snapshot = table.snapshot()
+    for row_id in range(1, 1001):
+        table.delete_by_id(row_id)
+    # Well past the threshold, but the snapshot still addresses rows by slot
+    assert len(table._tombstones) == 1000
+    assert [row.data for row in snapshot] == before
+    snapshot.close()
+    table.delete_by_id(1001)
+    assert not table._tombstones
+    assert table.row_count == 999
+    assert table.get_by_id(1002).data["name"] == "n1001"
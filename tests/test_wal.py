@@ -0,0 +1,37 @@
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+from database import Database
+from benchmarks.wal import expected_state
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("seed, writes", [(1, 50), (2, 2000), (3, 6000)])
+def test_recovers_every_acknowledged_write_after_sigkill(tmp_path, seed, writes):
+    filepath = str(tmp_path / "db.dmbs")
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.wal", "child", filepath, str(seed)],
+                               cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    acknowledged = 0
+    try:
+        while acknowledged < writes:
+            assert process.stdout.readline() == "ok\n"
+            acknowledged += 1
+    finally:
+        process.send_signal(signal.SIGKILL)
+        process.wait()
+    # Writes acknowledged between the last read and the kill still count
+    acknowledged += sum(line == "ok\n" for line in process.stdout)
+    process.stdout.close()
+
+    db = Database()
+    db.open(filepath)
+    recovered = [row.data for row in db.tables["people"].rows]
+    db.close()
+    # Either the kill landed between logging a write and acknowledging it,
+    # or the log holds exactly the acknowledged writes; never part of a frame
+    assert recovered in (expected_state(seed, acknowledged), expected_state(seed, acknowledged + 1))
@@ -0,0 +1,212 @@
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Iterator, Optional, Tuple
+
+# Log layout: a header with the LSN (log sequence number) of the first record,
+# then one frame per record: payload length, CRC32 of the payload, payload.
+# The payload is a compact JSON array [opcode, table, *arguments].
+MAGIC = b"DMBSWAL1"
+_HEADER = struct.Struct("<8sQ")
+_FRAME = struct.Struct("<II")
+
+OPERATIONS = (
+    "create_table", "delete_table",
+    "add_row", "edit_row", "delete_row",
+    "add_column", "delete_column",
+    "create_index", "drop_index", "create_text_index", "drop_text_index",
+    "add_rows", "transaction",
+)
+_OPCODES = {name: code for code, name in enumerate(OPERATIONS)}
+
+
+def _scan(f) -> Tuple[int, int, int]:
+    # Returns (first LSN, number of intact records, byte length of the intact part).
+    # A torn or corrupt frame ends the log: everything after it was never acknowledged.
+    header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return 1, 0, 0
+    magic, first_lsn = _HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError(f"{f.name} is not a write-ahead log")
+    count = 0
+    good = _HEADER.size
+    while True:
+        frame = f.read(_FRAME.size)
+        if len(frame) < _FRAME.size:
+            break
+        length, crc = _FRAME.unpack(frame)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        count += 1
+        good += _FRAME.size + length
+    return first_lsn, count, good
+
+
+class WriteAheadLog:
+    # Append-only log of Database changes.
+    #
+    # Every record is handed to the OS as soon as it is appended, so it survives
+    # the process being killed. fsync (surviving power loss) is batched:
+    #   sync_every=1  append() returns once the record is on disk; concurrent
+    #                 writers share a single fsync (group commit)
+    #   sync_every=N  fsync after every N records without waiting for it
+    #   sync_every=0  never fsync on append
+    # sync_interval additionally fsyncs pending records from a background thread.
+    def __init__(self, path: str, sync_every: int = 1, sync_interval: Optional[float] = None,
+                 first_lsn: int = 1):
+        self.path = path
+        self.sync_every = sync_every
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._syncing = False
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                first_lsn, count, good = _scan(f)
+            self._fd = os.open(path, os.O_RDWR)
+            if good < _HEADER.size:
+                os.ftruncate(self._fd, 0)
+                os.write(self._fd, _HEADER.pack(MAGIC, first_lsn))
+                good = _HEADER.size
+            elif good < os.path.getsize(path):
+                os.ftruncate(self._fd, good)
+            os.lseek(self._fd, good, os.SEEK_SET)
+        else:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.write(self._fd, _HEADER.pack(MAGIC, first_lsn))
+            count = 0
+            good = _HEADER.size
+        self.first_lsn = first_lsn
+        self._next_lsn = first_lsn + count
+        self._durable_lsn = self._next_lsn - 1
+        self._size = good
+
+        self._stop = threading.Event()
+        self._flusher = None
+        if sync_interval:
+            self._flusher = threading.Thread(target=self._flush_periodically, args=(sync_interval,),
+                                             name="wal-sync", daemon=True)
+            self._flusher.start()
+
+    @property
+    def last_lsn(self) -> int:
+        return self._next_lsn - 1
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def records(self) -> Iterator[Tuple[int, str, str, list]]:
+        # Yields (lsn, operation, table, arguments) for every intact record
+        with open(self.path, "rb") as f:
+            f.seek(_HEADER.size)
+            lsn = self.first_lsn
+            while lsn < self._next_lsn:
+                length, _ = _FRAME.unpack(f.read(_FRAME.size))
+                opcode, table, *args = json.loads(f.read(length))
+                yield lsn, OPERATIONS[opcode], table, args
+                lsn += 1
+
+    def append(self, op: str, table: str, *args) -> int:
+        payload = json.dumps([_OPCODES[op], table, *args], separators=(",", ":")).encode("utf-8")
+        frame = _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            os.write(self._fd, frame)
+            lsn = self._next_lsn
+            self._next_lsn += 1
+            self._size += len(frame)
+            if self.sync_every > 1 and lsn - self._durable_lsn >= self.sync_every:
+                self._sync_locked()
+            elif self.sync_every == 1:
+                self._wait_durable(lsn)
+        return lsn
+
+    def _wait_durable(self, lsn: int):
+        # Group commit: the first waiter fsyncs everything written so far while
+        # later writers queue up behind it and are usually covered by that fsync
+        while self._durable_lsn < lsn:
+            if self._syncing:
+                self._synced.wait()
+            else:
+                self._sync_locked()
+
+    def _sync_locked(self):
+        self._syncing = True
+        target = self._next_lsn - 1
+        self._lock.release()
+        try:
+            os.fsync(self._fd)
+        finally:
+            self._lock.acquire()
+            self._syncing = False
+        self._durable_lsn = max(self._durable_lsn, target)
+        self._synced.notify_all()
+
+    def sync(self):
+        with self._lock:
+            while self._syncing:
+                self._synced.wait()
+            if self._durable_lsn < self._next_lsn - 1:
+                self._sync_locked()
+
+    def _flush_periodically(self, interval: float):
+        while not self._stop.wait(interval):
+            self.sync()
+
+    def reset(self, first_lsn: int):
+        # Starts an empty log after a checkpoint; the swap is atomic, so a crash
+        # leaves either the old log or the new empty one
+        temp_path = self.path + ".tmp"
+        fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.write(fd, _HEADER.pack(MAGIC, first_lsn))
+        os.fsync(fd)
+        with self._lock:
+            while self._syncing:
+                self._synced.wait()
+            os.replace(temp_path, self.path)
+            os.close(self._fd)
+            self._fd = fd
+            self.first_lsn = first_lsn
+            self._next_lsn = first_lsn
+            self._durable_lsn = first_lsn - 1
+            self._size = _HEADER.size
+
+    def position(self) -> Tuple[int, int]:
+        # (last LSN, log size in bytes) at one moment, for discard()
+        with self._lock:
+            return self._next_lsn - 1, self._size
+
+    def discard(self, lsn: int, size: int):
+        # Drops the records up to lsn, which end at byte size, once a snapshot
+        # holds them. Records appended since are copied into the new log, which
+        # is swapped in atomically like in reset().
+        temp_path = self.path + ".tmp"
+        fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.write(fd, _HEADER.pack(MAGIC, lsn + 1))
+        with self._lock:
+            while self._syncing:
+                self._synced.wait()
+            with open(self.path, "rb") as f:
+                f.seek(size)
+                tail = f.read(self._size - size)
+            os.write(fd, tail)
+            os.fsync(fd)
+            os.replace(temp_path, self.path)
+            os.close(self._fd)
+            self._fd = fd
+            self.first_lsn = lsn + 1
+            self._durable_lsn = self._next_lsn - 1
+            self._size = _HEADER.size + len(tail)
+
+    def close(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.sync()
+        with self._lock:
+            os.close(self._fd)
+            self._fd = -1